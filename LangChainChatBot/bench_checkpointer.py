@@ -0,0 +1,127 @@
+"""
+checkpointer 基准测试：InMemorySaver vs SQLiteCheckpointer
+
+在每个子进程中用 GenericFakeChatModel 跑 N 个独立会话（每个会话一轮对话），
+统计 checkpoint 写入（put）与读取（get_tuple）的延迟，以及进程 RSS。
+
+用法：
+    python bench_checkpointer.py --threads 10000
+"""
+import argparse
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def rss_mb() -> float:
+    """当前 RSS（MB），非 Linux 平台退回峰值 RSS"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_mode(mode: str, threads: int, db_path: str) -> dict:
+    from langchain.agents import create_agent
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from sqlite_checkpointer import SQLiteCheckpointer
+
+    if mode == "memory":
+        saver = InMemorySaver()
+    else:
+        saver = SQLiteCheckpointer(db_path, keep_last=5, maintenance_interval=None)
+
+    put_latencies: list[float] = []
+    original_put = saver.put
+
+    def timed_put(*args, **kwargs):
+        start = time.perf_counter()
+        result = original_put(*args, **kwargs)
+        put_latencies.append(time.perf_counter() - start)
+        return result
+
+    saver.put = timed_put
+
+    replies = (AIMessage(content=f"回复 {i}：" + "今天天气不错。" * 20) for i in itertools.count())
+    agent = create_agent(model=GenericFakeChatModel(messages=replies), tools=[], checkpointer=saver)
+
+    baseline = rss_mb()
+    start = time.perf_counter()
+    for i in range(threads):
+        agent.invoke(
+            {"messages": [HumanMessage(content=f"会话 {i} 的问题")]},
+            {"configurable": {"thread_id": f"thread-{i}"}},
+        )
+    elapsed = time.perf_counter() - start
+    rss_after = rss_mb()
+
+    get_latencies = []
+    for i in range(0, threads, max(1, threads // 1000)):
+        t0 = time.perf_counter()
+        saver.get_tuple({"configurable": {"thread_id": f"thread-{i}"}})
+        get_latencies.append(time.perf_counter() - t0)
+
+    if mode == "sqlite":
+        saver.close()
+
+    return {
+        "mode": mode,
+        "threads": threads,
+        "total_s": round(elapsed, 2),
+        "put_p50_us": round(percentile(put_latencies, 50) * 1e6, 1),
+        "put_p99_us": round(percentile(put_latencies, 99) * 1e6, 1),
+        "get_p50_us": round(percentile(get_latencies, 50) * 1e6, 1),
+        "get_p99_us": round(percentile(get_latencies, 99) * 1e6, 1),
+        "rss_growth_mb": round(rss_after - baseline, 1),
+        "db_mb": round(os.path.getsize(db_path) / 1024 / 1024, 1) if mode == "sqlite" else 0,
+    }
+
+
+def main(threads: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench_checkpoints.db")
+        for mode in ("memory", "sqlite"):
+            # 每种模式在独立子进程中运行，避免 RSS 互相影响
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--threads", str(threads), "--db", db_path],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{result['mode']:<7} threads={result['threads']} total={result['total_s']}s "
+                f"put p50/p99={result['put_p50_us']}/{result['put_p99_us']}us "
+                f"get p50/p99={result['get_p50_us']}/{result['get_p99_us']}us "
+                f"RSS +{result['rss_growth_mb']}MB db={result['db_mb']}MB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=10000, help="会话数")
+    parser.add_argument("--worker", choices=["memory", "sqlite"], help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(run_mode(args.worker, args.threads, args.db)))
+    else:
+        main(args.threads)
@@ -0,0 +1,87 @@
+"""
+多轮对话基准测试：每轮重发完整历史 vs checkpointer 保存历史、每轮只发新消息
+
+使用 GenericFakeChatModel 代替真实模型，按脚本跑 N 轮对话，统计每轮
+传给 agent.invoke 的输入序列化字节数和耗时。
+
+用法：
+    python bench_history.py --turns 50
+"""
+import argparse
+import itertools
+import time
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+SYSTEM = SystemMessage(content="你叫小猪，是一名智能助手。请在对话中保持温和、有耐心的语气。")
+serde = JsonPlusSerializer()
+
+
+def fake_model() -> GenericFakeChatModel:
+    # 每次调用都返回一条新的 AIMessage，避免重复的消息 id 被 add_messages 合并
+    replies = (AIMessage(content=f"第 {i} 轮回复：" + "今天天气不错，适合出门散步。" * 4) for i in itertools.count())
+    return GenericFakeChatModel(messages=replies)
+
+
+def payload_bytes(inputs: dict) -> int:
+    return len(serde.dumps_typed(inputs)[1])
+
+
+def run_full_history(turns: int) -> list[tuple[int, float]]:
+    """重构前 run.py 的做法：本地维护 messages，每轮把完整历史传给 agent"""
+    agent = create_agent(model=fake_model(), tools=[], system_prompt="你是一名乐于助人的智能助手。")
+    messages = [SYSTEM]
+    results = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"这是第 {turn} 个问题，请简单回答。"))
+        inputs = {"messages": messages}
+        size = payload_bytes(inputs)
+        start = time.perf_counter()
+        response = agent.invoke(inputs)
+        results.append((size, time.perf_counter() - start))
+        messages.append(response["messages"][-1])
+    return results
+
+
+def run_checkpointer(turns: int) -> list[tuple[int, float]]:
+    """当前 run.py 的做法：历史保存在 checkpointer 中，每轮只发送新消息"""
+    agent = create_agent(
+        model=fake_model(),
+        tools=[],
+        system_prompt="你是一名乐于助人的智能助手。",
+        checkpointer=MemorySaver(),
+    )
+    config = {"configurable": {"thread_id": "bench"}}
+    pending = [SYSTEM]
+    results = []
+    for turn in range(turns):
+        inputs = {"messages": pending + [HumanMessage(content=f"这是第 {turn} 个问题，请简单回答。")]}
+        pending = []
+        size = payload_bytes(inputs)
+        start = time.perf_counter()
+        agent.invoke(inputs, config)
+        results.append((size, time.perf_counter() - start))
+    return results
+
+
+def summarize(name: str, results: list[tuple[int, float]]):
+    sizes = [size for size, _ in results]
+    times = [elapsed for _, elapsed in results]
+    print(f"\n{name}")
+    print(f"  总输入字节: {sum(sizes):>10,}   总耗时: {sum(times) * 1000:8.1f}ms")
+    for turn in sorted({0, 9, 24, len(results) - 1}):
+        if turn < len(results):
+            print(f"  第 {turn + 1:>3} 轮: 输入 {sizes[turn]:>8,} 字节  耗时 {times[turn] * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=50, help="对话轮数")
+    args = parser.parse_args()
+
+    summarize("完整历史模式（旧）", run_full_history(args.turns))
+    summarize("checkpointer 模式（新）", run_checkpointer(args.turns))
@@ -0,0 +1,125 @@
+"""
+并行工具调用基准：逐个调用（旧提示词）vs 同一条消息中并行调用，不同并发上限
+
+问题"北京、上海、深圳的天气和今天的新闻"需要 3 次 get_weather 和 1 次 web_search。
+用假工具模拟耗时（get_weather 同步 sleep，web_search 同步/异步双实现）、用假模型模拟每次模型调用的延迟：
+- 逐个调用：按旧提示词每条 AI 消息只发起一个工具调用，共 5 次模型调用
+- 并行：一条 AI 消息发起全部 4 个调用，共 2 次模型调用，ToolConcurrencyMiddleware 限制并发数
+invoke（同步工具在线程池中执行）与 ainvoke（异步工具作为协程执行）分别统计。
+
+用法：
+    python bench_parallel_tools.py --weather-latency 0.5 --search-latency 0.8 --model-latency 0.3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from tool_concurrency import ToolConcurrencyMiddleware
+
+CALLS = [
+    ("get_weather", {"loc": "北京"}),
+    ("get_weather", {"loc": "上海"}),
+    ("get_weather", {"loc": "深圳"}),
+    ("web_search", {"query": "今天的新闻"}),
+]
+
+
+class SlowFakeModel(GenericFakeChatModel):
+    """每次调用前等待 latency 秒的假模型"""
+
+    latency: float = 0.0
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super()._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return super()._generate(*args, **kwargs)
+
+
+def make_tools(weather_latency: float, search_latency: float) -> list[StructuredTool]:
+    def get_weather(loc: str) -> str:
+        """查询城市天气（只有同步实现）"""
+        time.sleep(weather_latency)
+        return f"{loc}：晴，21°C"
+
+    def web_search(query: str) -> str:
+        """搜索新闻"""
+        time.sleep(search_latency)
+        return f"{query}：……"
+
+    async def aweb_search(query: str) -> str:
+        """搜索新闻"""
+        await asyncio.sleep(search_latency)
+        return f"{query}：……"
+
+    return [
+        StructuredTool.from_function(func=get_weather),
+        StructuredTool.from_function(func=web_search, coroutine=aweb_search, name="web_search"),
+    ]
+
+
+def scripted_replies(parallel: bool) -> list[AIMessage]:
+    calls = [{"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(CALLS)]
+    if parallel:
+        replies = [AIMessage(content="", tool_calls=calls)]
+    else:
+        replies = [AIMessage(content="", tool_calls=[call]) for call in calls]
+    return replies + [AIMessage(content="北京、上海、深圳都是晴天；今天的新闻……")]
+
+
+def run_once(args, parallel: bool, limit: int, use_async: bool) -> tuple[float, int]:
+    model = SlowFakeModel(messages=iter(scripted_replies(parallel)), latency=args.model_latency)
+    middleware = ToolConcurrencyMiddleware(max_concurrency=limit)
+    agent = create_agent(
+        model=model,
+        tools=make_tools(args.weather_latency, args.search_latency),
+        middleware=[middleware],
+    )
+    inputs = {"messages": [("user", "北京、上海、深圳的天气和今天的新闻")]}
+    start = time.perf_counter()
+    result = asyncio.run(agent.ainvoke(inputs)) if use_async else agent.invoke(inputs)
+    elapsed = time.perf_counter() - start
+    # 结果顺序与调用顺序一致
+    tool_ids = [m.tool_call_id for m in result["messages"] if m.type == "tool"]
+    assert tool_ids == [f"call_{i}" for i in range(len(CALLS))], tool_ids
+    return elapsed, middleware.stats()["max_in_flight"]
+
+
+def main(args):
+    modes = [("逐个调用", False, len(CALLS))] + [(f"并行 上限{n}", True, n) for n in args.limits]
+    print(
+        f"{len(CALLS)} 个工具调用：get_weather {args.weather_latency}s ×3，web_search {args.search_latency}s，"
+        f"每次模型调用 {args.model_latency}s，每种模式 {args.runs} 轮"
+    )
+    print(f"{'模式':<14}{'invoke(s)':>12}{'ainvoke(s)':>12}{'最大并发':>10}")
+    for label, parallel, limit in modes:
+        row = []
+        peak = 0
+        for use_async in (False, True):
+            timings = []
+            for _ in range(args.runs):
+                elapsed, peak = run_once(args, parallel, limit, use_async)
+                timings.append(elapsed)
+            row.append(statistics.median(timings))
+        print(f"{label:<14}{row[0]:>12.2f}{row[1]:>12.2f}{peak:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weather-latency", type=float, default=0.5)
+    parser.add_argument("--search-latency", type=float, default=0.8)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 2, 4], help="并行模式的并发上限")
+    parser.add_argument("--runs", type=int, default=3)
+    main(parser.parse_args())
@@ -2,11 +2,13 @@ import os
 from dotenv import load_dotenv
 load_dotenv(override=True)
 from langchain.agents import create_agent
-from langchain.agents.middleware import HumanInTheLoopMiddleware
 from langchain_openai import ChatOpenAI
 from langchain_community.tools.tavily_search import TavilySearchResults 
 # from langgraph.checkpoint.memory import InMemorySaver
 
+from approval_policy import SEARCH_ALLOW_PATTERNS, AllowListPolicy, PolicyHumanInTheLoopMiddleware
+from tool_concurrency import ToolConcurrencyMiddleware
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 model = ChatOpenAI(
     model_name="gpt-5-mini",
@@ -16,23 +18,35 @@ model = ChatOpenAI(
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 web_search = TavilySearchResults(max_results=2)
 
-# 创建 Agent，接入 HumanInTheLoopMiddleware
+# 整个搜索关键词完整匹配这些正则（分号分隔，正则中的量词会用到逗号）时自动执行，其余交给人工审批；
+# 未设置时使用 SEARCH_ALLOW_PATTERNS，设为空字符串则全部人工审批
+SEARCH_AUTO_APPROVE_PATTERNS = [
+    pattern.strip()
+    for pattern in os.getenv("SEARCH_AUTO_APPROVE_PATTERNS", ";".join(SEARCH_ALLOW_PATTERNS)).split(";")
+    if pattern.strip()
+]
+
+# 创建 Agent，接入带审批策略的 HumanInTheLoopMiddleware
 agent = create_agent(
     model=model,
     tools=[web_search],
+    # 通过 langgraph dev / LangGraph 平台运行时由平台提供持久化，这里不指定 checkpointer
     # checkpointer=InMemorySaver(),
     middleware=[
-        HumanInTheLoopMiddleware(
+        PolicyHumanInTheLoopMiddleware(
             interrupt_on={
                 # 拦截 Tavily 搜索工具执行前，要求人工确认
                 "tavily_search_results_json": {
                     "allowed_decisions": ["approve", "edit", "reject"],
-                    "description": lambda tool_name, tool_input, state: (
-                        f"🔍 模型准备执行 Tavily 搜索：'{tool_input.get('query', '')}'"
+                    "description": lambda tool_call, state, runtime: (
+                        f"🔍 模型准备执行 Tavily 搜索：'{tool_call['args'].get('query', '')}'"
                     ),
                 }
             },
+            policies={"tavily_search_results_json": AllowListPolicy(SEARCH_AUTO_APPROVE_PATTERNS)},
             description_prefix="⚠️ 工具执行需要人工审批"
-        )
+        ),
+        # 审批通过的多个搜索并行执行，同时执行的调用数不超过 TOOL_MAX_CONCURRENCY
+        ToolConcurrencyMiddleware(),
     ],
 )
\ No newline at end of file
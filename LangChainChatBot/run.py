@@ -10,12 +10,12 @@ load_dotenv(override=True)
 def main():
     print("输入 exit 退出对话\n")
 
-    # 创建会话ID用于checkpoint
+    # 创建会话ID用于checkpoint，对话历史由 checkpointer 按 thread_id 保存
     session_id = str(uuid.uuid4())
     config = {"configurable": {"thread_id": session_id}}
 
-    # 初始化消息历史
-    messages = [
+    # 人设消息只在第一轮随用户消息一起写入会话状态
+    pending_messages = [
         SystemMessage(content="你叫小猪，是一名智能助手。请在对话中保持温和、有耐心的语气。")
     ]
 
@@ -31,16 +31,17 @@ def main():
             print("对话结束，再见！")
             break
 
-        # 添加用户消息到历史
-        messages.append(HumanMessage(content=user_input))
+        # 每轮只发送新的用户消息，历史由 checkpointer 提供
+        messages = pending_messages + [HumanMessage(content=user_input)]
 
         print("小猪：", end="", flush=True)
         full_reply=""
 
         # 使用 agent 来处理消息，这样可以使用工具
         try:
-            # 调用 agent 并获取响应，传入完整的对话历史和config
+            # 调用 agent 并获取响应，config 中的 thread_id 用于关联会话状态
             response = agent.invoke({"messages": messages}, config)
+            pending_messages = []
 
             # 获取最新的 AI 消息
             if response.get("messages"):
@@ -48,9 +49,6 @@ def main():
                 if isinstance(last_message, AIMessage) and last_message.content:
                     print(last_message.content, end="", flush=True)
                     full_reply = last_message.content
-
-                    # 将AI回复添加到消息历史
-                    messages.append(last_message)
         except Exception as e:
             print(f"发生错误: {str(e)}")
             full_reply = "抱歉，处理您的请求时出现了错误。"
@@ -32,16 +32,15 @@ def test_memory():
             if isinstance(last_message1, AIMessage) and last_message1.content:
                 print(f"用户：{user_input1}")
                 print(f"助理：{last_message1.content}")
-                messages.append(last_message1)
     except Exception as e:
         print(f"测试1错误: {str(e)}")
 
     print("\n" + "-"*40 + "\n")
 
-    # 测试2：询问是否记得名字
+    # 测试2：询问是否记得名字（只发送新消息，历史由 checkpointer 提供）
     print("测试2：询问是否记得名字")
     user_input2 = "你还记得我叫什么名字吗？"
-    messages.append(HumanMessage(content=user_input2))
+    messages = [HumanMessage(content=user_input2)]
 
     try:
         response2 = agent.invoke({"messages": messages}, config)
@@ -50,7 +49,6 @@ def test_memory():
             if isinstance(last_message2, AIMessage) and last_message2.content:
                 print(f"用户：{user_input2}")
                 print(f"助理：{last_message2.content}")
-                messages.append(last_message2)
 
                 # 检查回复中是否包含名字
                 if "大壮" in last_message2.content:
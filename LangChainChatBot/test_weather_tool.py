@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+import weather_tool
+
+# 桩服务与 mcp-get-weather 的测试共用，追加到 sys.path 末尾，不影响本目录模块的导入
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mcp-get-weather"))
+from stub_weather_api import StubWeatherAPI  # noqa: E402
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    with StubWeatherAPI() as stub:
+        monkeypatch.setattr(weather_tool, "WEATHER_API_URL", stub.url)
+        # 退避等待缩短到毫秒级，测试只关心等待时长的计算与重试次数
+        monkeypatch.setattr(weather_tool, "BACKOFF_BASE", 0.001)
+        monkeypatch.setattr(weather_tool, "BACKOFF_CAP", 0.01)
+        weather_tool.weather_cache.clear()
+        try:
+            yield stub
+        finally:
+            weather_tool.weather_cache.clear()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    recorded = []
+    backoff_delay = weather_tool._backoff_delay
+
+    def recording(attempt, response=None):
+        delay = backoff_delay(attempt, response)
+        recorded.append((attempt, response.status_code if response is not None else None, delay))
+        return delay
+
+    monkeypatch.setattr(weather_tool, "_backoff_delay", recording)
+    return recorded
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504, 507, 520, 524])
+def test_retryable_status_is_retried_until_success(upstream, delays, status):
+    upstream.fail_next(status, count=2)
+
+    data = weather_tool.fetch_weather("Beijing")
+
+    assert data["location"]["name"] == "Beijing"
+    assert upstream.requests == 3
+    assert [(attempt, code) for attempt, code, _ in delays] == [(0, status), (1, status)]
+
+
+def test_gives_up_after_max_retries(upstream, delays, monkeypatch):
+    monkeypatch.setattr(weather_tool, "MAX_RETRIES", 2)
+    upstream.fail_next(503, count=10)
+
+    data = weather_tool.fetch_weather("Beijing")
+
+    assert "error" in data
+    assert upstream.requests == 3
+    assert len(delays) == 2
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404, 501, 505])
+def test_permanent_status_is_not_retried(upstream, delays, status):
+    upstream.fail_next(status, count=10)
+
+    data = weather_tool.fetch_weather("Beijing")
+
+    assert "error" in data
+    assert upstream.requests == 1
+    assert delays == []
+
+
+def test_client_errors_are_not_retried(upstream, delays):
+    data = weather_tool.fetch_weather("Atlantis")
+
+    assert "error" in data
+    assert upstream.requests == 1
+    assert delays == []
+
+
+def test_retry_after_is_honoured_and_capped(monkeypatch):
+    monkeypatch.setattr(weather_tool, "BACKOFF_CAP", 8)
+
+    assert weather_tool._backoff_delay(0, httpx.Response(429, headers={"Retry-After": "3"})) == 3
+    assert weather_tool._backoff_delay(0, httpx.Response(429, headers={"Retry-After": "120"})) == 8
+
+
+def test_backoff_uses_full_jitter_with_cap(monkeypatch):
+    monkeypatch.setattr(weather_tool, "BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(weather_tool, "BACKOFF_CAP", 8)
+    bounds = []
+    monkeypatch.setattr(weather_tool.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+
+    for attempt in range(6):
+        weather_tool._backoff_delay(attempt, httpx.Response(503))
+
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 2.0), (0, 4.0), (0, 8), (0, 8)]
+
+
+def test_async_retry_and_one_client_per_event_loop(upstream, delays):
+    clients = []
+
+    async def query(location: str, close: bool) -> dict:
+        data = await weather_tool.afetch_weather(location)
+        clients.append(weather_tool.get_async_client())
+        if close:
+            await weather_tool.close_async_client()
+        return data
+
+    upstream.fail_next(429, retry_after=0)
+    # 第一个循环结束时不关闭客户端：第二个循环不能复用绑定在已关闭循环上的连接
+    first = asyncio.run(query("Beijing", close=False))
+    second = asyncio.run(query("Shanghai", close=True))
+
+    assert first["location"]["name"] == "Beijing"
+    assert second["location"]["name"] == "Shanghai"
+    assert [(code, delay) for _, code, delay in delays] == [(429, 0)]
+    assert clients[0] is not clients[1]
+    assert clients[1].is_closed
+    assert clients[0] not in weather_tool._async_clients.values()
+
+
+def test_upstream_receives_the_original_spelling(upstream):
+    weather_tool.fetch_weather(" New York ")
+    weather_tool.fetch_weather("NEW YORK")
+
+    assert upstream.queries == ["New York"]
@@ -0,0 +1,98 @@
+"""
+工具并发上限中间件
+
+create_agent 会把一条 AI 消息中尚未执行的工具调用分别发给 tools 节点，在同一步内并发执行：
+- ainvoke / astream：原生异步的工具（MCP 工具、get_weather 的异步实现）作为协程并发，
+  只有同步实现的工具由事件循环的默认线程池执行
+- invoke / stream：每个工具调用在 langgraph 的线程池中执行（例如 get_weather 的同步实现）
+- 结果按 AI 消息中 tool_calls 的顺序写回消息状态，与完成先后无关
+
+这一步本身没有并发上限，一条消息里的调用越多，同时打到上游的请求就越多。
+ToolConcurrencyMiddleware 用信号量限制同时执行的工具调用数，超出的调用排队等待，顺序不受影响。
+
+mcp-get-weather、LangChainChatBot 各有一份本文件，修改时请保持两份一致。
+"""
+import asyncio
+import os
+import threading
+from typing import Awaitable, Callable
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain.agents.middleware.types import ToolCallRequest
+from langchain_core.messages import ToolMessage
+from langgraph.types import Command
+
+MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+
+
+class ToolConcurrencyMiddleware(AgentMiddleware):
+    """
+    限制同时执行的工具调用数
+    :param max_concurrency: 同步与异步路径各自的并发上限
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        super().__init__()
+        self.max_concurrency = max(1, max_concurrency)
+        self._sync_limit = threading.BoundedSemaphore(self.max_concurrency)
+        # asyncio.Semaphore 绑定事件循环，按循环分别创建
+        self._async_limits: dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.calls = 0
+        self.queued = 0
+        self.max_in_flight = 0
+
+    def _enter(self, waited: bool):
+        with self._lock:
+            self.calls += 1
+            self.queued += waited
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        waited = not self._sync_limit.acquire(blocking=False)
+        if waited:
+            self._sync_limit.acquire()
+        self._enter(waited)
+        try:
+            return handler(request)
+        finally:
+            self._exit()
+            self._sync_limit.release()
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            limit = self._async_limits.get(loop)
+            if limit is None:
+                # 丢弃已关闭循环的信号量（例如多次 asyncio.run）
+                self._async_limits = {k: v for k, v in self._async_limits.items() if not k.is_closed()}
+                limit = self._async_limits[loop] = asyncio.Semaphore(self.max_concurrency)
+        waited = limit.locked()
+        async with limit:
+            self._enter(waited)
+            try:
+                return await handler(request)
+            finally:
+                self._exit()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "calls": self.calls,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_concurrency": self.max_concurrency,
+        }
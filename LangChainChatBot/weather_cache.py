@@ -0,0 +1,205 @@
+"""
+天气查询结果缓存
+
+- 以规范化后的城市名作为 key（去除首尾空白、合并连续空白、大小写折叠）
+- 成功结果按 ttl 过期，失败结果（包含 "error" 字段）按较短的 negative_ttl 过期
+- 使用 OrderedDict 实现 LRU，超过 maxsize 时淘汰最久未使用的条目
+- 可选的 sqlite 持久化层：重启后加载未过期的条目；写入与删除交给后台线程批量落盘，
+  get / set 不等待磁盘 IO（在事件循环中调用也不会阻塞），flush() 等待已提交的写入落盘
+
+mcp-get-weather 与 LangChainChatBot 各有一份本文件，两条天气查询路径共用同一套缓存语义，修改时请保持两份一致
+（mcp-get-weather/test_shared_modules.py 会检查）。
+"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_location(loc: Any) -> str:
+    """将 "Beijing"、"beijing "、"BEIJING" 等写法规范化为同一个 key"""
+    return " ".join(str(loc).split()).casefold()
+
+
+def is_error_result(data: Any) -> bool:
+    return isinstance(data, dict) and "error" in data
+
+
+class WeatherCache:
+    """
+    线程安全的 TTL + LRU 缓存
+    :param ttl: 成功结果的有效期（秒）
+    :param negative_ttl: 失败结果的有效期（秒）
+    :param maxsize: 最多缓存的城市数
+    :param db_path: 可选的 sqlite 文件路径，为空时只使用内存
+    :param clock: 时间函数，默认 time.time（持久化需要墙上时间）
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600,
+        negative_ttl: float = 60,
+        maxsize: int = 1024,
+        db_path: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._db: sqlite3.Connection | None = None
+        # 待落盘的 (sql, 参数)，None 表示停止；只有后台写入线程访问 _db
+        self._writes: queue.Queue[tuple[str, tuple] | None] | None = None
+        self._writer: threading.Thread | None = None
+        if db_path:
+            self._open_db(db_path)
+            self._writes = queue.Queue()
+            self._writer = threading.Thread(target=self._write_loop, name="weather-cache-writer", daemon=True)
+            self._writer.start()
+
+    def get(self, key: str) -> Any | None:
+        """命中返回缓存的数据，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, data = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self._delete_row(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if is_error_result(data):
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return data
+
+    def set(self, key: str, data: Any) -> None:
+        ttl = self.negative_ttl if is_error_result(data) else self.ttl
+        if ttl <= 0:
+            return
+        expires_at = self.clock() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, data)
+            self._entries.move_to_end(key)
+            self._write_row(key, expires_at, data)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._delete_row(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._enqueue("DELETE FROM weather_cache", ())
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def flush(self) -> None:
+        """等待已提交的写入全部落盘"""
+        writes = self._writes
+        if writes is not None:
+            writes.join()
+
+    def close(self) -> None:
+        """写完已提交的写入后关闭数据库"""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+            self._writes = None
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # ---- sqlite 持久化 ----
+
+    def _open_db(self, db_path: str) -> None:
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS weather_cache ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM weather_cache WHERE expires_at <= ?", (self.clock(),))
+        rows = self._db.execute(
+            "SELECT key, expires_at, data FROM weather_cache ORDER BY expires_at DESC LIMIT ?",
+            (self.maxsize,),
+        ).fetchall()
+        # 按过期时间从早到晚插入，使最新的条目位于 LRU 尾部
+        for key, expires_at, data in reversed(rows):
+            self._entries[key] = (expires_at, json.loads(data))
+
+    def _enqueue(self, sql: str, params: tuple) -> None:
+        writes = self._writes
+        if writes is not None:
+            writes.put((sql, params))
+
+    def _write_row(self, key: str, expires_at: float, data: Any) -> None:
+        self._enqueue(
+            "INSERT OR REPLACE INTO weather_cache (key, expires_at, data) VALUES (?, ?, ?)",
+            (key, expires_at, json.dumps(data, ensure_ascii=False)),
+        )
+
+    def _delete_row(self, key: str) -> None:
+        self._enqueue("DELETE FROM weather_cache WHERE key = ?", (key,))
+
+    def _write_loop(self) -> None:
+        """后台写入线程：把队列中已有的写入合并到一个事务中执行"""
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._db:
+                    for item in batch:
+                        if item is not None:
+                            self._db.execute(*item)
+            except sqlite3.Error as e:
+                # 持久化只是加速重启，写入失败不影响内存中的缓存
+                logger.warning("天气缓存落盘失败: %s", e)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+            if None in batch:
+                return
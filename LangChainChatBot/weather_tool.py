@@ -0,0 +1,201 @@
+"""
+get_weather 工具：同时提供同步与异步实现
+
+- 同步路径（run.py 中的 agent.invoke）使用共享的 httpx.Client
+- 异步路径（langgraph dev / ainvoke）使用 httpx.AsyncClient，不再阻塞事件循环；
+  AsyncClient 的连接绑定创建它的事件循环，因此每个循环各有一个（例如多次 asyncio.run）
+- 两条路径共用同一个 WeatherCache，缓存语义与 mcp-get-weather/weather_server.py 一致
+- 遇到 429 和 5xx 响应以及网络错误时，按带抖动的指数退避重试
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+from langchain_core.tools import StructuredTool
+
+from weather_cache import WeatherCache, normalize_location
+
+USER_AGENT = "weather-app/1.0"
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.weatherapi.com/v1/current.json")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "15"))
+
+# 重试配置：最多重试 WEATHER_MAX_RETRIES 次，等待时间为 [0, min(cap, base * 2^n)] 内的随机值
+MAX_RETRIES = int(os.getenv("WEATHER_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("WEATHER_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("WEATHER_BACKOFF_CAP", "8"))
+# 429 与 5xx 视为暂时性错误（包括 507、CDN 的 520-524 等）；501 / 505 表示服务端不支持该请求，重试无意义
+NON_RETRYABLE_5XX = {501, 505}
+
+weather_cache = WeatherCache(
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    negative_ttl=float(os.getenv("WEATHER_CACHE_NEGATIVE_TTL", "60")),
+    maxsize=int(os.getenv("WEATHER_CACHE_MAXSIZE", "1024")),
+    db_path=os.getenv("WEATHER_CACHE_DB") or None,
+)
+
+_LIMITS = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+_TIMEOUT = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+_sync_client: httpx.Client | None = None
+# 事件循环 -> 该循环上的 AsyncClient
+_async_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_async_clients_lock = threading.Lock()
+
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(headers={"User-Agent": USER_AGENT}, limits=_LIMITS, timeout=_TIMEOUT)
+    return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """返回当前事件循环上的 AsyncClient，不存在或已关闭时创建"""
+    global _async_clients
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            # 丢弃已关闭循环的客户端，其连接已无法在其它循环上使用
+            _async_clients = {k: v for k, v in _async_clients.items() if not k.is_closed()}
+            client = _async_clients[loop] = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT}, limits=_LIMITS, timeout=_TIMEOUT
+            )
+    return client
+
+
+async def close_async_client() -> None:
+    """关闭当前事件循环上的 AsyncClient，释放连接池"""
+    with _async_clients_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _request_params(loc: str) -> dict:
+    # 规范化后的 key 只用于缓存，上游使用原始城市名
+    return {
+        "q": str(loc).strip(),
+        "key": os.getenv("OPENWEATHER_API_KEY"),
+        "aqi": "no",
+    }
+
+
+def _backoff_delay(attempt: int, response: httpx.Response | None = None) -> float:
+    """计算第 attempt 次重试前的等待时间，优先遵循 429 响应的 Retry-After"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_CAP)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def _should_retry(attempt: int, response: httpx.Response | None) -> bool:
+    if attempt >= MAX_RETRIES:
+        return False
+    return response is None or is_retryable_status(response.status_code)
+
+
+def is_retryable_status(status: int) -> bool:
+    return status == 429 or (500 <= status < 600 and status not in NON_RETRYABLE_5XX)
+
+
+def _parse_response(response: httpx.Response) -> dict:
+    try:
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        print(f"HTTP error occurred: {e}")
+        return {"error": "HTTP error occurred while fetching weather data."}
+    except ValueError as e:
+        print(f"An error occurred: {e}")
+        return {"error": "An unexpected error occurred while fetching weather data."}
+
+
+def fetch_weather(loc: str) -> dict:
+    """同步查询天气，带缓存与重试"""
+    key = normalize_location(loc)
+    cached = weather_cache.get(key)
+    if cached is not None:
+        return cached
+
+    client = get_sync_client()
+    attempt = 0
+    while True:
+        response = None
+        try:
+            response = client.get(WEATHER_API_URL, params=_request_params(loc))
+        except httpx.TransportError as e:
+            if not _should_retry(attempt, None):
+                print(f"An error occurred: {e}")
+                data = {"error": "An unexpected error occurred while fetching weather data."}
+                break
+        else:
+            if not _should_retry(attempt, response):
+                data = _parse_response(response)
+                break
+        time.sleep(_backoff_delay(attempt, response))
+        attempt += 1
+
+    weather_cache.set(key, data)
+    return data
+
+
+async def afetch_weather(loc: str) -> dict:
+    """异步查询天气，带缓存与重试"""
+    key = normalize_location(loc)
+    cached = weather_cache.get(key)
+    if cached is not None:
+        return cached
+
+    client = get_async_client()
+    attempt = 0
+    while True:
+        response = None
+        try:
+            response = await client.get(WEATHER_API_URL, params=_request_params(loc))
+        except httpx.TransportError as e:
+            if not _should_retry(attempt, None):
+                print(f"An error occurred: {e}")
+                data = {"error": "An unexpected error occurred while fetching weather data."}
+                break
+        else:
+            if not _should_retry(attempt, response):
+                data = _parse_response(response)
+                break
+        await asyncio.sleep(_backoff_delay(attempt, response))
+        attempt += 1
+
+    weather_cache.set(key, data)
+    return data
+
+
+def _get_weather(loc: str) -> str:
+    """
+    查询即时天气函数
+    :param loc: 必要参数，字符串类型，用于表示查询天气的具体城市名称，\
+    注意，中国的城市需要用对应城市的英文名称代替，例如如果需要查询北京市天气，则loc参数需要输入'Beijing'；
+    :return：WeatherAPI 查询即时天气的结果，具体URL请求地址为：https://api.weatherapi.com/v1/current.json\
+    返回结果对象类型为解析之后的JSON格式对象，并用字符串形式进行表示，其中包含了全部重要的天气信息
+    """
+    return json.dumps(fetch_weather(loc), ensure_ascii=False)
+
+
+async def _aget_weather(loc: str) -> str:
+    return json.dumps(await afetch_weather(loc), ensure_ascii=False)
+
+
+get_weather = StructuredTool.from_function(
+    func=_get_weather,
+    coroutine=_aget_weather,
+    name="get_weather",
+    description=_get_weather.__doc__,
+)
@@ -0,0 +1,164 @@
+"""
+多客户端压测：每个客户端一个 stdio 服务进程 vs 所有客户端共享一个 streamable-http 服务进程
+
+模拟 N 个 client.py：每个客户端建立自己的 MCP 会话，对几个城市各调用若干次 query_weather（上游为本地桩服务）。
+统计调用延迟 p50/p99、总耗时、服务进程数与其总内存（RSS），以及桩服务实际收到的上游请求数
+（共享进程时缓存与 single-flight 在所有客户端之间生效）。
+
+用法：
+    python bench_http_server.py --clients 20 --calls 10 --delay 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from langchain_mcp_adapters.sessions import create_session
+
+from stub_weather_api import StubWeatherAPI
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CITIES = ["Beijing", "Shanghai", "Shenzhen", "Guangzhou", "Hangzhou"]
+SERVER = os.path.abspath("weather_server.py")
+
+
+def server_processes() -> list[int]:
+    """本进程启动的 weather_server 进程"""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+            with open(f"/proc/{entry}/status", "r") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            continue
+        if SERVER.encode() in cmdline and int(status["PPid"]) == os.getpid():
+            pids.append(int(entry))
+    return pids
+
+
+def rss_mb(pids: list[int]) -> float:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def run_clients(connection: dict, clients: int, calls: int) -> dict:
+    latencies: list[float] = []
+    opened = asyncio.Barrier(clients + 1)
+    finished = asyncio.Event()
+
+    async def client(index: int):
+        async with create_session(connection) as session:
+            await session.initialize()
+            await opened.wait()
+            for i in range(calls):
+                city = CITIES[(index + i) % len(CITIES)]
+                start = time.perf_counter()
+                result = await session.call_tool("query_weather", {"location": city})
+                latencies.append(time.perf_counter() - start)
+                assert not result.isError, result
+            await finished.wait()
+
+    tasks = [asyncio.create_task(client(i)) for i in range(clients)]
+    start = time.perf_counter()
+    await opened.wait()
+    connected = time.perf_counter() - start
+    while len(latencies) < clients * calls:
+        await asyncio.sleep(0.01)
+        failed = [task for task in tasks if task.done() and task.exception()]
+        if failed:
+            raise failed[0].exception()
+    elapsed = time.perf_counter() - start
+    # 所有会话仍然打开时采样服务进程
+    pids = server_processes()
+    memory = rss_mb(pids)
+    finished.set()
+    await asyncio.gather(*tasks)
+    return {
+        "latencies": sorted(latencies),
+        "connect": connected,
+        "elapsed": elapsed,
+        "processes": len(pids),
+        "rss_mb": memory,
+    }
+
+
+def report(label: str, result: dict, upstream: int):
+    latencies = result["latencies"]
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(
+        f"{label:<16}{p50:>10.1f}{p99:>10.1f}{result['connect']:>10.2f}{result['elapsed']:>10.2f}"
+        f"{result['processes']:>8}{result['rss_mb']:>10.0f}{upstream:>8}"
+    )
+
+
+async def main(args):
+    with StubWeatherAPI(delay=args.delay) as stub:
+        env = {"WEATHER_API_URL": stub.url, "OPENWEATHER_API_KEY": "bench"}
+        print(f"{args.clients} 个客户端 × {args.calls} 次 query_weather，上游延迟 {args.delay}s")
+        print(
+            f"{'模式':<16}{'p50(ms)':>10}{'p99(ms)':>10}{'建连(s)':>10}{'调用(s)':>10}"
+            f"{'进程':>8}{'RSS(MB)':>10}{'上游':>8}"
+        )
+
+        stdio = {"command": sys.executable, "args": [SERVER], "transport": "stdio", "env": env}
+        stub.reset_counters()
+        report("stdio×每客户端", await run_clients(stdio, args.clients, args.calls), stub.requests)
+
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, SERVER, "--transport", "streamable-http", "--port", str(port)],
+            env={**os.environ, **env},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            await wait_for_port(port)
+            http = {"url": f"http://127.0.0.1:{port}/mcp", "transport": "streamable_http"}
+            stub.reset_counters()
+            report("http×共享", await run_clients(http, args.clients, args.calls), stub.requests)
+        finally:
+            server.terminate()
+            server.wait(10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20, help="模拟的客户端数")
+    parser.add_argument("--calls", type=int, default=10, help="每个客户端的调用次数")
+    parser.add_argument("--delay", type=float, default=0.05, help="桩服务每个请求的延迟（秒）")
+    asyncio.run(main(parser.parse_args()))
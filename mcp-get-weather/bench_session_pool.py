@@ -0,0 +1,91 @@
+"""
+MCP 会话池基准：每次工具调用新建会话 vs MCPSessionPool 长连接会话
+
+对 write_server 的 write_to_file 连续调用 N 次（默认 100，相当于一次较长的会话），统计单次调用的 p50/p95
+与总耗时；--concurrency 大于 1 时再用池并发调用一轮，观察 max_in_flight 限制下的吞吐。
+服务在临时目录中运行，写出的文件不会留在 output/ 下。
+
+用法：
+    python bench_session_pool.py --calls 100 --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from mcp_pool import MCPSessionPool
+from mcp_tools import ToolManifestCache, load_tools
+
+logging.getLogger("mcp_tools").setLevel(logging.ERROR)
+
+
+def summarize(label: str, latencies: list[float], total: float, spawns: int | str) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return (
+        f"{label:<14}{len(latencies):>6}{statistics.median(latencies):>10.1f}{p95:>10.1f}"
+        f"{total:>12.2f}{spawns:>8}"
+    )
+
+
+async def sequential(tool, calls: int) -> tuple[list[float], float]:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(calls):
+        begin = time.perf_counter()
+        await tool.ainvoke({"content": f"note {i}"})
+        latencies.append((time.perf_counter() - begin) * 1000)
+    return latencies, time.perf_counter() - start
+
+
+async def concurrent(tool, calls: int) -> tuple[list[float], float]:
+    latencies = []
+
+    async def timed(i: int):
+        begin = time.perf_counter()
+        await tool.ainvoke({"content": f"note {i}"})
+        latencies.append((time.perf_counter() - begin) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(calls)))
+    return latencies, time.perf_counter() - start
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        servers = {
+            "write": {
+                "command": sys.executable,
+                "args": [os.path.abspath("write_server.py")],
+                "transport": "stdio",
+                "cwd": tmp,
+                "max_in_flight": args.concurrency,
+            }
+        }
+        cache = ToolManifestCache(os.path.join(tmp, "tools.json"))
+        print(f"write_to_file × {args.calls}")
+        print(f"{'模式':<14}{'调用':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'总耗时(s)':>12}{'启动':>8}")
+
+        tools = await load_tools(servers, cache=cache)
+        latencies, total = await sequential(tools[0], args.calls)
+        print(summarize("每次新建", latencies, total, args.calls))
+
+        async with MCPSessionPool(servers) as pool:
+            tools = await load_tools(servers, cache=cache, pool=pool)
+            latencies, total = await sequential(tools[0], args.calls)
+            print(summarize("会话池", latencies, total, pool.stats()["write"]["spawns"]))
+            if args.concurrency > 1:
+                latencies, total = await concurrent(tools[0], args.calls)
+                label = f"会话池×{args.concurrency}"
+                print(summarize(label, latencies, total, pool.stats()["write"]["spawns"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="并发轮的 max_in_flight，1 表示不跑并发轮")
+    asyncio.run(main(parser.parse_args()))
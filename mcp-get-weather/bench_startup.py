@@ -0,0 +1,87 @@
+"""
+MCP 启动基准：从开始加载到拿到全部工具的耗时
+
+- get_tools：MultiServerMCPClient(servers).get_tools()（原来 client.py 的做法）
+- cold：load_tools 不使用缓存，各服务并发启动、单独超时
+- warm：load_tools 命中工具清单缓存，启动时不连接任何服务
+
+--cold-start 会额外加入一个先休眠 N 秒再启动 write_server 的服务，模拟 npx 之类的慢速冷启动；
+--timeout 为它设置的 startup_timeout，小于 --cold-start 时可以观察超时跳过的效果。
+
+用法：
+    python bench_startup.py --runs 5 --cold-start 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+from mcp_tools import ToolManifestCache, load_tools, split_server_config
+
+logging.getLogger("mcp_tools").setLevel(logging.ERROR)
+
+# write_server 会用 parse_transport_args 解析命令行，启动前把休眠秒数从 sys.argv 中去掉
+SLOW_SERVER = (
+    "import runpy, sys, time; seconds = float(sys.argv[1]); sys.argv = ['write_server.py']; "
+    "time.sleep(seconds); runpy.run_path('write_server.py', run_name='__main__')"
+)
+
+
+def slow_server_config(cold_start: float, timeout: float) -> dict:
+    """先休眠 cold_start 秒再启动 write_server 的服务配置，模拟慢速冷启动"""
+    return {
+        "command": sys.executable,
+        "args": ["-c", SLOW_SERVER, str(cold_start)],
+        "cwd": os.path.dirname(os.path.abspath(__file__)),
+        "transport": "stdio",
+        "startup_timeout": timeout,
+    }
+
+
+async def measure(mode: str, servers: dict, cache_path: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    if mode == "get_tools":
+        connections = {name: split_server_config(config)[0] for name, config in servers.items()}
+        tools = await MultiServerMCPClient(connections).get_tools()
+    else:
+        tools = await load_tools(servers, cache=ToolManifestCache(cache_path), use_cache=mode == "warm")
+    return time.perf_counter() - start, len(tools)
+
+
+async def main(args):
+    with open(args.config, "r", encoding="utf-8") as f:
+        servers = json.load(f)["mcpServers"]
+    if args.cold_start > 0:
+        servers["slow_start"] = slow_server_config(args.cold_start, args.timeout)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "tools.json")
+        # 预热一次缓存，warm 模式从第一轮开始命中
+        await load_tools(servers, cache=ToolManifestCache(cache_path), use_cache=False)
+        print(f"服务: {', '.join(servers)}，每种模式 {args.runs} 轮")
+        print(f"{'模式':<12}{'工具数':>6}{'p50(ms)':>12}{'min(ms)':>12}{'max(ms)':>12}")
+        for mode in ("get_tools", "cold", "warm"):
+            timings, count = [], 0
+            for _ in range(args.runs):
+                elapsed, count = await measure(mode, servers, cache_path)
+                timings.append(elapsed * 1000)
+            print(
+                f"{mode:<12}{count:>6}{statistics.median(timings):>12.1f}"
+                f"{min(timings):>12.1f}{max(timings):>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="servers_config.json")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-start", type=float, default=3.0, help="模拟慢速服务的冷启动秒数，0 表示不加入")
+    parser.add_argument("--timeout", type=float, default=30.0, help="模拟慢速服务的 startup_timeout")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,85 @@
+"""
+连接池基准测试：共享 AsyncClient vs 每次调用新建 AsyncClient
+
+在本地桩服务上并发执行 N 次天气查询，统计 p50/p99 延迟和新建 TCP 连接数。
+
+用法：
+    python bench_weather_pool.py --concurrency 50 --rounds 20
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import weather_server
+from stub_weather_api import StubWeatherAPI
+from weather_server import create_http_client, format_weather, get_weather
+
+# FastMCP 会把日志级别设为 INFO，屏蔽 httpx 的逐请求日志
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CITIES = ["Beijing", "Shanghai", "Shenzhen", "Guangzhou", "Hangzhou"]
+
+
+async def pooled_call(loc: str) -> str:
+    return format_weather(await get_weather(loc))
+
+
+async def unpooled_call(loc: str) -> str:
+    # 重构前的行为：每次调用都新建并关闭一个 AsyncClient
+    async with create_http_client() as client:
+        return format_weather(await get_weather(loc, client=client))
+
+
+async def run_rounds(call, concurrency: int, rounds: int) -> list[float]:
+    latencies: list[float] = []
+
+    async def timed(loc: str):
+        start = time.perf_counter()
+        await call(loc)
+        latencies.append(time.perf_counter() - start)
+
+    for _ in range(rounds):
+        await asyncio.gather(*(timed(CITIES[i % len(CITIES)]) for i in range(concurrency)))
+    return latencies
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name: str, latencies: list[float], connections: int, elapsed: float):
+    print(
+        f"{name:<10} calls={len(latencies):<6} "
+        f"p50={percentile(latencies, 50) * 1000:7.2f}ms "
+        f"p99={percentile(latencies, 99) * 1000:7.2f}ms "
+        f"mean={statistics.mean(latencies) * 1000:7.2f}ms "
+        f"connections={connections:<6} total={elapsed:.2f}s"
+    )
+
+
+async def main(concurrency: int, rounds: int, delay: float):
+    with StubWeatherAPI(delay=delay) as stub:
+        weather_server.WEATHER_API_URL = stub.url
+
+        for name, call in (("unpooled", unpooled_call), ("pooled", pooled_call)):
+            # 预热一次，避免首次 import/解析开销计入结果
+            await call("Beijing")
+            stub.reset_counters()
+            start = time.perf_counter()
+            latencies = await run_rounds(call, concurrency, rounds)
+            report(name, latencies, stub.connections, time.perf_counter() - start)
+
+        await weather_server.close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50, help="每轮并发调用数 N")
+    parser.add_argument("--rounds", type=int, default=20, help="轮数")
+    parser.add_argument("--delay", type=float, default=0.0, help="桩服务每个请求的延迟（秒）")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.rounds, args.delay))
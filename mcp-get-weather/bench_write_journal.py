@@ -0,0 +1,110 @@
+"""
+笔记写入吞吐基准：每条笔记一个文件 vs 分段日志（逐条 fsync / 批量 fsync）
+
+并发 C 个写入方（模拟多个客户端同时调用 write_to_file）共写 N 条笔记，统计每秒笔记数、单次写入 p50/p99，
+以及写入期间事件循环的最大卡顿（每 1ms 唤醒一次的探测任务实际迟到的最长时间）。
+- 阻塞写文件：重构前的写法，在协程中直接 open() 写文件
+- 文件/线程：files 模式，文件 IO 放到线程中执行（不 fsync）
+- 日志/逐条：journal 模式，max_batch=1，每条笔记 fsync 一次
+- 日志/批量：journal 模式，group commit：上一批落盘期间到达的笔记合并为一批，一起 fsync
+
+用法：
+    python bench_write_journal.py --notes 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import write_server
+from note_journal import NoteJournal
+
+CONTENT = "今天北京晴，21°C，湿度 40%，适合户外活动。" * 4
+
+
+async def blocking_write(content: str) -> str:
+    # 重构前的 write_to_file：在事件循环线程中直接写文件
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filepath = os.path.join(write_server.OUTPUT_DIR, f"note_{timestamp}_{id(content)}.txt")
+    with open(filepath, "w", encoding="utf-8") as file:
+        file.write(content)
+    return filepath
+
+
+async def loop_lag(stop: asyncio.Event) -> float:
+    worst = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(0.001)
+        worst = max(worst, loop.time() - start - 0.001)
+    return worst
+
+
+async def run_mode(write, notes: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    queue = iter(range(notes))
+
+    async def writer():
+        for i in queue:
+            start = time.perf_counter()
+            result = await write(f"{i} {CONTENT}")
+            latencies.append(time.perf_counter() - start)
+            assert "出错" not in str(result), result
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await probe
+    latencies.sort()
+    return {
+        "rate": notes / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "lag": lag * 1000,
+    }
+
+
+async def main(args):
+    print(f"{args.notes} 条笔记，{args.concurrency} 个并发写入方，每条 {len(CONTENT.encode())} 字节")
+    print(f"{'模式':<12}{'笔记/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'最大卡顿(ms)':>14}{'fsync':>8}{'文件数':>8}")
+    modes = [
+        ("阻塞写文件", None, None),
+        ("文件/线程", None, None),
+        ("日志/逐条", 1, 0.0),
+        ("日志/批量", args.max_batch, args.fsync_interval),
+    ]
+    for label, max_batch, interval in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_server.OUTPUT_DIR = tmp
+            journal = None
+            if max_batch is None:
+                write_server.journal = None
+                write = blocking_write if label == "阻塞写文件" else write_server.write_to_file
+            else:
+                journal = NoteJournal(tmp, fsync_interval=interval, max_batch=max_batch)
+                write_server.journal = journal
+                write = write_server.write_to_file
+            result = await run_mode(write, args.notes, args.concurrency)
+            fsyncs = journal.stats["fsyncs"] if journal is not None else 0
+            if journal is not None:
+                await journal.close()
+            files = len(os.listdir(tmp))
+            print(
+                f"{label:<12}{result['rate']:>10.0f}{result['p50']:>10.2f}{result['p99']:>10.2f}"
+                f"{result['lag']:>14.2f}{fsyncs:>8}{files:>8}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--fsync-interval", type=float, default=0.0, help="批量模式每批额外的收集窗口（秒）")
+    parser.add_argument("--max-batch", type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
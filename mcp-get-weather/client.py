@@ -1,27 +1,30 @@
+import argparse
 import asyncio
 import json 
 import logging
 import os
+import uuid
 from typing import Any, Dict, List
 
 from dotenv import load_dotenv
 # from langgraph.prebuilt import create_react_agent
 from langchain.agents import create_agent
 from langchain_openai import ChatOpenAI
-from langchain_mcp_adapters.client import MultiServerMCPClient 
-from langgraph.checkpoint.memory import InMemorySaver
+
+from history_middleware import HistoryBudgetMiddleware
+from mcp_pool import MCPSessionPool
+from mcp_tools import load_tools
+from tool_concurrency import ToolConcurrencyMiddleware
+from sqlite_checkpointer import get_checkpointer
 
 
 load_dotenv(override=True)
-checkpoint = InMemorySaver() 
+# 持久化 checkpointer：会话状态保存在 checkpoints.db，重启后不丢失
+checkpoint = get_checkpointer()
 
 with open("agent_prompts.txt", "r", encoding="utf-8") as f:
     promt = f.read()
 
-config = {
-    "configurable": {"thread_id": "1"},
-}
-
 class Configuration:
     def __init__(self) -> None:
         load_dotenv(override=True)
@@ -29,45 +32,63 @@ class Configuration:
         self.model = ChatOpenAI(model_name="gpt-5-mini", openai_api_key=self.api_key)
 
     @staticmethod
-    def load_servers(file_path = "servers_config.json"):
+    def load_servers(file_path = None):
+        # MCP_SERVERS_CONFIG=servers_config_http.json 时连接常驻的 HTTP 服务，多个客户端共享同一服务进程
+        file_path = file_path or os.getenv("MCP_SERVERS_CONFIG", "servers_config.json")
         with open(file_path, "r", encoding="utf-8") as f:
             return json.load(f).get("mcpServers", {})
 
 # main logic
-async def run_chat_loop():
+async def run_chat_loop(thread_id: str | None = None):
+    # 会话状态持久化在 checkpoints.db 中：默认每次启动新建一个会话，传入 --thread-id 可继续之前的会话
+    thread_id = thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    print(f"Session: {thread_id}")
     cfg = Configuration() 
     os.environ["OPENAI_API_KEY"] = cfg.api_key
     servers_cfg = cfg.load_servers() 
 
-    # connect to MCP servers
-    mcp_client = MultiServerMCPClient(servers_cfg)
-    tools = await mcp_client.get_tools()
-    print(f"Loaded {len(tools)} tools from MCP servers") 
+    # 会话池：每个服务一个长连接会话，工具调用复用，退出时统一关闭
+    pool = MCPSessionPool(servers_cfg)
+    try:
+        # load MCP tools: 命中工具清单缓存时不启动任何服务，第一次调用工具时才连接
+        tools = await load_tools(servers_cfg, pool=pool)
+        print(f"Loaded {len(tools)} tools from MCP servers") 
 
-    # init LLM model
-    model = cfg.model 
+        # init LLM model
+        model = cfg.model 
 
-    # create agent 
-    # agent = create_react_agent(model=model, tools=tools, prompt=promt, checkpointer=checkpoint)
-    agent = create_agent(model=model, tools=tools, system_prompt=promt, checkpointer=checkpoint)
+        # create agent 
+        # agent = create_react_agent(model=model, tools=tools, prompt=promt, checkpointer=checkpoint)
+        # 历史预算中间件：超出 token 预算时保留最近几轮，更早的轮次折叠为摘要
+        history = HistoryBudgetMiddleware(
+            model=model,
+            max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "4000")),
+            keep_last_turns=int(os.getenv("HISTORY_KEEP_TURNS", "4")),
+        )
+        # 同一条 AI 消息中互不依赖的工具调用并行执行（MCP 工具为协程），并发数不超过 TOOL_MAX_CONCURRENCY
+        agent = create_agent(model=model, tools=tools, system_prompt=promt, checkpointer=checkpoint, middleware=[history, ToolConcurrencyMiddleware()])
 
-    print(f"Agent created: {agent}, input quit to exit")
+        print(f"Agent created: {agent}, input quit to exit")
 
-    # Chat loop
-    while True:
-        user_input = input("\nYou: ").strip()
-        if user_input.lower() in ["exit", "quit", "bye"]:
-            break
-        try:
-            result = await agent.ainvoke({"messages": [{"role": "user", "content": user_input}]}, config )
-            print(f"\nAI: {result['messages'][-1].content}")
-        except Exception as e:
-            logging.error(f"Error: {e}")
-            print("Sorry, something went wrong. Please try again.")
+        # Chat loop
+        while True:
+            user_input = input("\nYou: ").strip()
+            if user_input.lower() in ["exit", "quit", "bye"]:
+                break
+            try:
+                result = await agent.ainvoke({"messages": [{"role": "user", "content": user_input}]}, config )
+                print(f"\nAI: {result['messages'][-1].content}")
+            except Exception as e:
+                logging.error(f"Error: {e}")
+                print("Sorry, something went wrong. Please try again.")
+    finally:
+        await pool.cleanup()
 
-    await mcp_client.cleanup()
     print("Chat session ended. Bye!")
 
 if __name__ == "__main__":
-    asyncio.run(run_chat_loop())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--thread-id", help="继续指定的会话（默认新建会话）")
+    asyncio.run(run_chat_loop(parser.parse_args().thread_id))
     
\ No newline at end of file
@@ -8,8 +8,12 @@ from dotenv import load_dotenv
 from langgraph.prebuilt import create_react_agent
 from langchain.agents import create_agent
 from langchain_openai import ChatOpenAI
-from langchain_mcp_adapters.client import MultiServerMCPClient 
-from langgraph.checkpoint.memory import InMemorySaver
+
+from history_middleware import HistoryBudgetMiddleware
+from mcp_pool import MCPSessionPool
+from mcp_tools import load_tools
+from tool_concurrency import ToolConcurrencyMiddleware
+from sqlite_checkpointer import get_checkpointer
 
 from langgraph.graph import StateGraph
 """
@@ -19,7 +23,8 @@ User open source tools: Filesystem MCP Server
 
 
 load_dotenv(override=True)
-checkpoint = InMemorySaver() 
+# 持久化 checkpointer：会话状态保存在 checkpoints.db，重启后不丢失
+checkpoint = get_checkpointer()
 
 with open("agent_prompts.txt", "r", encoding="utf-8") as f:
     promt = f.read()
@@ -35,7 +40,9 @@ class Configuration:
         self.model = ChatOpenAI(model_name="gpt-5-mini", openai_api_key=self.api_key)
 
     @staticmethod
-    def load_servers(file_path = "servers_config2.json"):
+    def load_servers(file_path = None):
+        # MCP_SERVERS_CONFIG=servers_config_http.json 时连接常驻的 HTTP 服务，多个客户端共享同一服务进程
+        file_path = file_path or os.getenv("MCP_SERVERS_CONFIG", "servers_config2.json")
         with open(file_path, "r", encoding="utf-8") as f:
             return json.load(f).get("mcpServers", {})
 
@@ -45,97 +52,108 @@ async def run_chat_loop():
     os.environ["OPENAI_API_KEY"] = cfg.api_key
     servers_cfg = cfg.load_servers() 
 
-    # Create MCP client (no need for context manager or manual cleanup)
-    mcp_client = MultiServerMCPClient(servers_cfg)
-    all_tools = await mcp_client.get_tools()
+    # 会话池：每个服务一个长连接会话，工具调用复用，退出时统一关闭
+    pool = MCPSessionPool(servers_cfg)
+    try:
+        # Load MCP tools: 各服务并发启动、单独超时；命中工具清单缓存时不启动服务，第一次调用工具时才连接
+        all_tools = await load_tools(servers_cfg, pool=pool)
     
-    # Filter out problematic tools that have parameter validation issues
-    # list_directory_with_sizes has issues with langchain_mcp_adapters parameter conversion
-    problematic_tools = {"list_directory_with_sizes"}
-    tools = [tool for tool in all_tools if tool.name not in problematic_tools]
+        # Filter out problematic tools that have parameter validation issues
+        # list_directory_with_sizes has issues with langchain_mcp_adapters parameter conversion
+        problematic_tools = {"list_directory_with_sizes"}
+        tools = [tool for tool in all_tools if tool.name not in problematic_tools]
     
-    # Display loaded tools information
-    print("\n" + "="*60)
-    print("MCP 工具加载信息")
-    print("="*60)
-    print(f"总工具数: {len(all_tools)}")
-    print(f"可用工具数: {len(tools)}")
-    if len(all_tools) - len(tools) > 0:
-        print(f"已过滤工具数: {len(all_tools) - len(tools)}")
-        filtered_names = [tool.name for tool in all_tools if tool.name in problematic_tools]
-        print(f"已过滤工具: {', '.join(filtered_names)}")
+        # Display loaded tools information
+        print("\n" + "="*60)
+        print("MCP 工具加载信息")
+        print("="*60)
+        print(f"总工具数: {len(all_tools)}")
+        print(f"可用工具数: {len(tools)}")
+        if len(all_tools) - len(tools) > 0:
+            print(f"已过滤工具数: {len(all_tools) - len(tools)}")
+            filtered_names = [tool.name for tool in all_tools if tool.name in problematic_tools]
+            print(f"已过滤工具: {', '.join(filtered_names)}")
     
-    print("\n可用工具列表:")
-    print("-"*60)
-    for i, tool in enumerate(tools, 1):
-        tool_name = tool.name if hasattr(tool, 'name') else str(tool)
-        tool_desc = ""
-        if hasattr(tool, 'description') and tool.description:
-            tool_desc = tool.description
-        elif hasattr(tool, 'func') and hasattr(tool.func, '__doc__') and tool.func.__doc__:
-            tool_desc = tool.func.__doc__.strip().split('\n')[0]
+        print("\n可用工具列表:")
+        print("-"*60)
+        for i, tool in enumerate(tools, 1):
+            tool_name = tool.name if hasattr(tool, 'name') else str(tool)
+            tool_desc = ""
+            if hasattr(tool, 'description') and tool.description:
+                tool_desc = tool.description
+            elif hasattr(tool, 'func') and hasattr(tool.func, '__doc__') and tool.func.__doc__:
+                tool_desc = tool.func.__doc__.strip().split('\n')[0]
         
-        # Truncate description if too long
-        if tool_desc and len(tool_desc) > 80:
-            tool_desc = tool_desc[:77] + "..."
+            # Truncate description if too long
+            if tool_desc and len(tool_desc) > 80:
+                tool_desc = tool_desc[:77] + "..."
         
-        print(f"  {i}. {tool_name}")
-        if tool_desc:
-            print(f"     描述: {tool_desc}")
+            print(f"  {i}. {tool_name}")
+            if tool_desc:
+                print(f"     描述: {tool_desc}")
     
-    print("="*60 + "\n") 
-
-    # init LLM model
-    model = cfg.model 
-
-    # create agent 
-    # agent = create_react_agent(model=model, tools=tools, prompt=promt, checkpointer=checkpoint)
-    agent = create_agent(model=model, tools=tools, system_prompt=promt, checkpointer=checkpoint)
-
-    print(f"Agent created: {agent}, input quit to exit")
+        print("="*60 + "\n") 
+
+        # init LLM model
+        model = cfg.model 
+
+        # create agent 
+        # agent = create_react_agent(model=model, tools=tools, prompt=promt, checkpointer=checkpoint)
+        # 历史预算中间件：超出 token 预算时保留最近几轮，更早的轮次折叠为摘要
+        history = HistoryBudgetMiddleware(
+            model=model,
+            max_tokens=int(os.getenv("HISTORY_MAX_TOKENS", "4000")),
+            keep_last_turns=int(os.getenv("HISTORY_KEEP_TURNS", "4")),
+        )
+        # 同一条 AI 消息中互不依赖的工具调用并行执行（MCP 工具为协程），并发数不超过 TOOL_MAX_CONCURRENCY
+        agent = create_agent(model=model, tools=tools, system_prompt=promt, checkpointer=checkpoint, middleware=[history, ToolConcurrencyMiddleware()])
+
+        print(f"Agent created: {agent}, input quit to exit")
     
-    # Current thread_id (will be updated if checkpoint state gets corrupted)
-    current_thread_id = thread_id
-
-    # Chat loop
-    while True:
-        user_input = input("\nYou: ").strip()
-        if user_input.lower() in ["exit", "quit", "bye"]:
-            break
-        try:
-            config = {
-                "configurable": {"thread_id": current_thread_id},
-            }
-            result = await agent.ainvoke({"messages": [{"role": "user", "content": user_input}]}, config )
-            # Get the last message content
-            if result and "messages" in result and len(result["messages"]) > 0:
-                last_message = result["messages"][-1]
-                if hasattr(last_message, 'content'):
-                    print(f"\nAI: {last_message.content}")
-                elif isinstance(last_message, dict) and 'content' in last_message:
-                    print(f"\nAI: {last_message['content']}")
+        # Current thread_id (will be updated if checkpoint state gets corrupted)
+        current_thread_id = thread_id
+
+        # Chat loop
+        while True:
+            user_input = input("\nYou: ").strip()
+            if user_input.lower() in ["exit", "quit", "bye"]:
+                break
+            try:
+                config = {
+                    "configurable": {"thread_id": current_thread_id},
+                }
+                result = await agent.ainvoke({"messages": [{"role": "user", "content": user_input}]}, config )
+                # Get the last message content
+                if result and "messages" in result and len(result["messages"]) > 0:
+                    last_message = result["messages"][-1]
+                    if hasattr(last_message, 'content'):
+                        print(f"\nAI: {last_message.content}")
+                    elif isinstance(last_message, dict) and 'content' in last_message:
+                        print(f"\nAI: {last_message['content']}")
+                    else:
+                        print(f"\nAI: {last_message}")
                 else:
-                    print(f"\nAI: {last_message}")
-            else:
-                print("\nAI: (无响应)")
+                    print("\nAI: (无响应)")
                 
-        except Exception as e:
-            error_msg = str(e)
-            logging.error(f"Error: {e}")
+            except Exception as e:
+                error_msg = str(e)
+                logging.error(f"Error: {e}")
             
-            # Provide more helpful error messages for common issues
-            if "list_directory_with_sizes" in error_msg or "Invalid structured content" in error_msg:
-                print("\n抱歉，获取文件大小信息的工具暂时不可用。")
-                print("您可以使用 'list_directory' 工具来列出文件，但可能无法显示文件大小。")
-            elif "tool_calls" in error_msg and "must be followed" in error_msg:
-                print("\n检测到对话历史状态不一致，正在切换到新的对话线程...")
-                # Switch to a new thread_id to reset the checkpoint state
-                current_thread_id = f"thread_{int(time.time())}"
-                print(f"已切换到新线程: {current_thread_id}")
-                print("请重新输入您的问题。")
-            else:
-                print("Sorry, something went wrong. Please try again.")
-                print(f"Error details: {error_msg[:200]}")  # Show first 200 chars of error
+                # Provide more helpful error messages for common issues
+                if "list_directory_with_sizes" in error_msg or "Invalid structured content" in error_msg:
+                    print("\n抱歉，获取文件大小信息的工具暂时不可用。")
+                    print("您可以使用 'list_directory' 工具来列出文件，但可能无法显示文件大小。")
+                elif "tool_calls" in error_msg and "must be followed" in error_msg:
+                    print("\n检测到对话历史状态不一致，正在切换到新的对话线程...")
+                    # Switch to a new thread_id to reset the checkpoint state
+                    current_thread_id = f"thread_{int(time.time())}"
+                    print(f"已切换到新线程: {current_thread_id}")
+                    print("请重新输入您的问题。")
+                else:
+                    print("Sorry, something went wrong. Please try again.")
+                    print(f"Error details: {error_msg[:200]}")  # Show first 200 chars of error
+    finally:
+        await pool.cleanup()
 
     print("Chat session ended. Bye!")
 
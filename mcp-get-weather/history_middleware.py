@@ -0,0 +1,229 @@
+"""
+对话历史预算中间件
+
+在每次调用模型前检查消息 token 数，超过预算时：
+- 开头的 SystemMessage 原样保留
+- 最近 keep_last_turns 轮对话原样保留（一轮从一条 HumanMessage 开始，
+  包含其后的 AI 消息、工具调用与工具结果，因此 tool_call 与 ToolMessage 永远不会被拆开）
+- 更早的轮次折叠进一条滚动摘要，已有摘要会与新折叠的消息一起增量更新
+- 摘要生成失败时本次不做任何裁剪，消息原样交给模型，下次调用模型前再重试，历史不会丢失
+
+本轮（一次 invoke）节省的 token 记录在状态的 history_tokens_saved 中，随会话（thread_id）各自保存，
+同一个中间件实例被多个会话、线程共享时互不覆盖；实例上只保留累计统计（stats()）。
+
+mcp-get-weather、LangChainChatBot、nl2sql 各有一份本文件，修改时请保持三份一致（mcp-get-weather/test_shared_modules.py 会检查）。
+"""
+import logging
+import threading
+import uuid
+from typing import Any, Callable, Iterable, NotRequired
+
+from langchain.agents.middleware import AgentMiddleware, AgentState
+from langchain.chat_models import BaseChatModel, init_chat_model
+from langchain_core.messages import (
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    get_buffer_string,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langgraph.runtime import Runtime
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MESSAGE_ID = "history-summary"
+SUMMARY_PREFIX = "以下是此前对话的摘要：\n\n"
+
+DEFAULT_SUMMARY_PROMPT = """你负责维护一段对话的滚动摘要。请把"新增对话"中的重要信息合并进"已有摘要"，输出更新后的完整摘要。
+
+要求：
+- 保留用户的身份、偏好、明确提出的需求和尚未完成的任务
+- 保留工具调用得到的关键结果（例如查询到的数据、写入的文件路径），避免后续重复调用
+- 删除寒暄和重复内容，使用简洁的要点
+- 只输出摘要本身，不要添加任何额外说明
+
+<已有摘要>
+{summary}
+</已有摘要>
+
+<新增对话>
+{messages}
+</新增对话>"""
+
+TOKENS_SAVED_KEY = "history_tokens_saved"
+
+
+class HistoryBudgetState(AgentState):
+    # 本轮（一次 invoke）内各次折叠节省的 token 之和，新一轮开始时清零
+    history_tokens_saved: NotRequired[int]
+
+
+class HistoryBudgetMiddleware(AgentMiddleware):
+    """
+    将消息状态控制在 token 预算内的中间件
+    :param model: 用于生成摘要的模型（模型实例或 init_chat_model 可识别的名称）
+    :param max_tokens: 消息状态的 token 预算，超过时触发折叠
+    :param keep_last_turns: 原样保留的最近轮数，单轮超出预算时会逐步减少，但至少保留最后一轮
+    :param token_counter: token 计数函数，默认使用近似计数
+    :param summary_prompt: 摘要提示词模板，需包含 {summary} 和 {messages} 占位符
+    """
+
+    state_schema = HistoryBudgetState
+
+    def __init__(
+        self,
+        model: str | BaseChatModel,
+        *,
+        max_tokens: int = 4000,
+        keep_last_turns: int = 4,
+        token_counter: Callable[[Iterable[AnyMessage]], int] = count_tokens_approximately,
+        summary_prompt: str = DEFAULT_SUMMARY_PROMPT,
+    ):
+        super().__init__()
+        self.model = init_chat_model(model) if isinstance(model, str) else model
+        self.max_tokens = max_tokens
+        self.keep_last_turns = max(1, keep_last_turns)
+        self.token_counter = token_counter
+        self.summary_prompt = summary_prompt
+        # 所有会话的累计统计，实例可能被多个线程共享
+        self._lock = threading.Lock()
+        self.total_tokens_saved = 0
+        self.summarizations = 0
+        self.failures = 0
+
+    def before_agent(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        return {TOKENS_SAVED_KEY: 0}
+
+    async def abefore_agent(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        return {TOKENS_SAVED_KEY: 0}
+
+    def before_model(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        plan = self._plan(state["messages"])
+        if plan is None:
+            return None
+        leading, summary, to_fold, kept, total_tokens = plan
+        new_summary = self._summarize(summary, to_fold)
+        if new_summary is None:
+            return None
+        return self._apply(state, leading, new_summary, kept, total_tokens)
+
+    async def abefore_model(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        plan = self._plan(state["messages"])
+        if plan is None:
+            return None
+        leading, summary, to_fold, kept, total_tokens = plan
+        new_summary = await self._asummarize(summary, to_fold)
+        if new_summary is None:
+            return None
+        return self._apply(state, leading, new_summary, kept, total_tokens)
+
+    def stats(self) -> dict[str, int]:
+        """所有会话的累计统计；某一轮节省的 token 见状态中的 history_tokens_saved"""
+        with self._lock:
+            return {
+                "summarizations": self.summarizations,
+                "failures": self.failures,
+                "total_tokens_saved": self.total_tokens_saved,
+            }
+
+    # ---- 内部实现 ----
+
+    def _plan(self, messages: list[AnyMessage]):
+        """决定哪些轮次需要折叠；无需处理时返回 None"""
+        total_tokens = self.token_counter(messages)
+        if total_tokens <= self.max_tokens:
+            return None
+
+        for message in messages:
+            if message.id is None:
+                message.id = str(uuid.uuid4())
+
+        leading: list[AnyMessage] = []
+        index = 0
+        while index < len(messages) and isinstance(messages[index], SystemMessage):
+            leading.append(messages[index])
+            index += 1
+
+        summary = ""
+        body: list[AnyMessage] = []
+        for message in messages[index:]:
+            if message.id == SUMMARY_MESSAGE_ID:
+                summary = message.text.removeprefix(SUMMARY_PREFIX)
+            else:
+                body.append(message)
+
+        turns = _split_turns(body)
+        keep = min(self.keep_last_turns, len(turns))
+        # 保留的轮次本身就超出预算时，逐步减少保留轮数（至少保留正在进行的最后一轮）
+        while keep > 1:
+            kept_tokens = self.token_counter(leading + [m for turn in turns[-keep:] for m in turn])
+            if kept_tokens <= self.max_tokens:
+                break
+            keep -= 1
+
+        to_fold = [m for turn in turns[:-keep] for m in turn]
+        if not to_fold:
+            return None
+        kept = [m for turn in turns[-keep:] for m in turn]
+        return leading, summary, to_fold, kept, total_tokens
+
+    def _prompt(self, summary: str, to_fold: list[AnyMessage]) -> str:
+        return self.summary_prompt.format(
+            summary=summary or "（暂无）",
+            messages=get_buffer_string(to_fold),
+        )
+
+    def _summarize(self, summary: str, to_fold: list[AnyMessage]) -> str | None:
+        """返回更新后的摘要；模型调用失败时返回 None"""
+        try:
+            return self.model.invoke(self._prompt(summary, to_fold)).text.strip()
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning("历史摘要生成失败，本次不裁剪历史: %s", e)
+            return None
+
+    async def _asummarize(self, summary: str, to_fold: list[AnyMessage]) -> str | None:
+        try:
+            response = await self.model.ainvoke(self._prompt(summary, to_fold))
+            return response.text.strip()
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning("历史摘要生成失败，本次不裁剪历史: %s", e)
+            return None
+
+    def _apply(self, state: AgentState, leading, summary: str, kept, total_tokens: int) -> dict[str, Any]:
+        new_messages = list(leading)
+        if summary:
+            new_messages.append(HumanMessage(content=SUMMARY_PREFIX + summary, id=SUMMARY_MESSAGE_ID))
+        new_messages.extend(kept)
+
+        saved = max(0, total_tokens - self.token_counter(new_messages))
+        turn_saved = state.get(TOKENS_SAVED_KEY, 0) + saved
+        with self._lock:
+            self.total_tokens_saved += saved
+            self.summarizations += 1
+            total_saved = self.total_tokens_saved
+        logger.info(
+            "历史折叠：%d -> %d tokens，本次节省 %d，本轮节省 %d，累计节省 %d",
+            total_tokens,
+            total_tokens - saved,
+            saved,
+            turn_saved,
+            total_saved,
+        )
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *new_messages], TOKENS_SAVED_KEY: turn_saved}
+
+
+def _split_turns(messages: list[AnyMessage]) -> list[list[AnyMessage]]:
+    """按 HumanMessage 划分轮次，每轮包含该轮的全部 AI / 工具消息"""
+    turns: list[list[AnyMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
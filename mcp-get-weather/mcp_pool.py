@@ -0,0 +1,269 @@
+"""
+MCP 长连接会话池
+
+不传 session 的 MCP 工具每次调用都会新建 stdio 会话（启动子进程 + 握手），单次调用多出数百毫秒。
+MCPSessionPool 为 servers_config.json 中的每个服务维护一个长期存活的会话：
+- 懒启动：第一次调用该服务的工具（或列出工具）时才启动
+- 健康检查：会话存活期间每 health_interval 秒 ping 一次，超时或失败时重启
+- 崩溃重启：子进程退出后，下一次调用会先重启会话；请求尚未发出（写入已关闭的流）时自动重试一次，
+  已发出但未返回的调用不重试，避免重复执行写操作
+- 并发上限：每个服务同时进行的调用数不超过 max_in_flight（服务配置中的 max_in_flight 或 MCP_MAX_IN_FLIGHT）
+- cleanup()：停止健康检查并依次关闭所有会话
+
+会话的 async with 上下文必须在同一个任务中进入和退出，因此每个会话由一个专门的任务持有，
+调用方只拿到已初始化的 ClientSession。PooledServer 实现了 call_tool，可以直接作为 session
+传给 langchain_mcp_adapters 的 convert_mcp_tool_to_langchain_tool（见 mcp_tools.load_tools）。
+"""
+import asyncio
+import collections
+import logging
+import os
+from typing import Any
+
+import anyio
+from langchain_mcp_adapters.sessions import Connection, create_session
+from mcp import ClientSession
+from mcp.types import CallToolResult, Tool as MCPTool
+
+from mcp_tools import STARTUP_TIMEOUT, split_server_config
+
+logger = logging.getLogger(__name__)
+
+MAX_IN_FLIGHT = int(os.getenv("MCP_MAX_IN_FLIGHT", "8"))
+HEALTH_INTERVAL = float(os.getenv("MCP_HEALTH_INTERVAL", "30"))
+HEALTH_TIMEOUT = float(os.getenv("MCP_HEALTH_TIMEOUT", "5"))
+SHUTDOWN_TIMEOUT = 5.0
+
+# 写入已关闭的流时抛出：请求没有发出，可以在新会话上安全重试
+_NOT_SENT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+
+
+class PooledServer:
+    """
+    单个 MCP 服务的长连接会话
+    :param name: 服务名
+    :param connection: langchain_mcp_adapters 的连接配置
+    :param max_in_flight: 同时进行的调用数上限
+    :param startup_timeout: 启动并完成握手的超时（秒）
+    :param health_interval: 健康检查间隔（秒），0 表示不检查
+    :param health_timeout: 单次 ping 的超时（秒）
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connection: Connection,
+        *,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        startup_timeout: float = STARTUP_TIMEOUT,
+        health_interval: float = HEALTH_INTERVAL,
+        health_timeout: float = HEALTH_TIMEOUT,
+    ):
+        self.name = name
+        self.connection = connection
+        self.max_in_flight = max_in_flight
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.stats = collections.Counter()
+        self._session: ClientSession | None = None
+        self._owner: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self._health: asyncio.Task | None = None
+        self._closed = False
+        # 以下对象绑定事件循环，第一次使用时创建
+        self._spawn_lock: asyncio.Lock | None = None
+        self._limit: asyncio.Semaphore | None = None
+
+    @property
+    def alive(self) -> bool:
+        return self._session is not None
+
+    async def session(self) -> ClientSession:
+        """返回存活的会话，没有时启动（或重启）"""
+        if self._session is not None:
+            return self._session
+        if self._spawn_lock is None:
+            self._spawn_lock = asyncio.Lock()
+        async with self._spawn_lock:
+            if self._session is None:
+                if self._closed:
+                    raise RuntimeError(f"MCP 服务 {self.name} 的会话池已关闭")
+                await self._spawn()
+            return self._session
+
+    async def _spawn(self):
+        await self._stop_owner()
+        loop = asyncio.get_running_loop()
+        ready: asyncio.Future = loop.create_future()
+        self._stop = asyncio.Event()
+        self._owner = asyncio.create_task(self._own(ready, self._stop), name=f"mcp-session-{self.name}")
+        try:
+            self._session = await asyncio.wait_for(asyncio.shield(ready), self.startup_timeout)
+        except BaseException:
+            await self._stop_owner()
+            raise
+        if self.stats["spawns"]:
+            self.stats["respawns"] += 1
+        self.stats["spawns"] += 1
+        logger.info("MCP 服务 %s 会话已启动", self.name)
+        if self.health_interval > 0 and (self._health is None or self._health.done()):
+            self._health = asyncio.create_task(self._health_loop(), name=f"mcp-health-{self.name}")
+
+    async def _own(self, ready: asyncio.Future, stop: asyncio.Event):
+        """持有会话上下文：启动、握手，然后等待停止信号"""
+        session = None
+        try:
+            async with create_session(self.connection) as session:
+                await session.initialize()
+                if ready.done():
+                    return
+                ready.set_result(session)
+                await stop.wait()
+        except asyncio.CancelledError:
+            if not ready.done():
+                ready.set_exception(ConnectionError(f"MCP 服务 {self.name} 启动被取消"))
+            raise
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning("MCP 服务 %s 会话异常退出: %s", self.name, e)
+        finally:
+            if session is not None and self._session is session:
+                self._session = None
+
+    async def _stop_owner(self):
+        """通知持有任务退出会话上下文（关闭子进程），超时后取消"""
+        owner, self._owner = self._owner, None
+        self._session = None
+        if owner is None:
+            return
+        if self._stop is not None:
+            self._stop.set()
+        try:
+            await asyncio.wait_for(owner, SHUTDOWN_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            owner.cancel()
+        except Exception as e:
+            logger.debug("MCP 服务 %s 会话关闭时出错: %s", self.name, e)
+
+    def _mark_dead(self, session: ClientSession, reason: str):
+        if self._session is session:
+            logger.warning("MCP 服务 %s 会话失效，将在下次使用时重启: %s", self.name, reason)
+            self._session = None
+            self.stats["failures"] += 1
+
+    async def _health_loop(self):
+        while not self._closed:
+            await asyncio.sleep(self.health_interval)
+            session = self._session
+            if session is None:
+                continue
+            try:
+                await asyncio.wait_for(session.send_ping(), self.health_timeout)
+            except Exception as e:
+                self.stats["health_failures"] += 1
+                self._mark_dead(session, f"健康检查失败（{type(e).__name__}）")
+                try:
+                    # 主动重启，下一次调用不必等待启动
+                    await self.session()
+                except Exception as e:
+                    logger.warning("MCP 服务 %s 重启失败: %s", self.name, e)
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any] | None = None,
+        progress_callback=None,
+        **kwargs: Any,
+    ) -> CallToolResult:
+        """与 ClientSession.call_tool 签名兼容，受 max_in_flight 限制"""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_in_flight)
+        async with self._limit:
+            self.stats["calls"] += 1
+            for attempt in (1, 2):
+                session = await self.session()
+                try:
+                    return await session.call_tool(name, arguments, progress_callback=progress_callback, **kwargs)
+                except _NOT_SENT_ERRORS as e:
+                    self._mark_dead(session, type(e).__name__)
+                    if attempt == 2:
+                        raise
+                    self.stats["retries"] += 1
+                except Exception as e:
+                    if isinstance(e, anyio.EndOfStream) or "Connection closed" in str(e):
+                        self._mark_dead(session, str(e) or type(e).__name__)
+                    raise
+
+    async def list_tools(self) -> list[MCPTool]:
+        """列出全部工具（处理分页）"""
+        session = await self.session()
+        tools: list[MCPTool] = []
+        cursor = None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools.extend(page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                return tools
+
+    async def close(self):
+        self._closed = True
+        if self._health is not None:
+            self._health.cancel()
+            self._health = None
+        await self._stop_owner()
+
+
+class MCPSessionPool:
+    """
+    按 servers_config.json 的 mcpServers 为每个服务维护一个 PooledServer
+    :param servers: 服务名 -> 服务配置（可包含 startup_timeout / max_in_flight）
+    其余参数作为各服务的默认值
+    """
+
+    def __init__(
+        self,
+        servers: dict[str, dict[str, Any]],
+        *,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        health_interval: float = HEALTH_INTERVAL,
+        health_timeout: float = HEALTH_TIMEOUT,
+    ):
+        self.servers: dict[str, PooledServer] = {}
+        for name, config in servers.items():
+            connection, startup_timeout = split_server_config(config)
+            self.servers[name] = PooledServer(
+                name,
+                connection,
+                max_in_flight=int(config.get("max_in_flight", max_in_flight)),
+                startup_timeout=startup_timeout,
+                health_interval=health_interval,
+                health_timeout=health_timeout,
+            )
+
+    def server(self, name: str) -> PooledServer:
+        return self.servers[name]
+
+    async def start(self, names: list[str] | None = None):
+        """预先启动指定（默认全部）服务；失败的服务只记录警告"""
+        names = list(self.servers) if names is None else names
+        results = await asyncio.gather(*(self.servers[n].session() for n in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.warning("MCP 服务 %s 启动失败: %s", name, result)
+
+    async def cleanup(self):
+        """关闭全部会话（子进程正常退出）"""
+        await asyncio.gather(*(server.close() for server in self.servers.values()), return_exceptions=True)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {name: {"alive": server.alive, **server.stats} for name, server in self.servers.items()}
+
+    async def __aenter__(self) -> "MCPSessionPool":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.cleanup()
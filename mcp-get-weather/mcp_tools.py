@@ -0,0 +1,303 @@
+"""
+MCP 工具加载：并发启动、工具清单缓存与懒连接
+
+MultiServerMCPClient.get_tools() 在启动时连接每个服务并列出工具，npx 之类的服务冷启动就要数秒。
+load_tools 的做法：
+- 工具清单（MCP Tool 定义）缓存在磁盘上（默认 .mcp_tools_cache.json），每条按 服务名 + 指纹 存放，
+  指纹为服务连接配置（command / args / url 等）、args 中本地脚本及其递归 import 的同目录模块的内容哈希，
+  以及 MANIFEST_VERSION；使用不同配置的客户端（client.py / client2.py）共用一个缓存文件也不会互相覆盖
+- npx 启动且未固定版本（如 @modelcontextprotocol/server-filesystem、pkg@latest）的服务，
+  包可能随时更新，清单只缓存 MCP_TOOLS_CACHE_UNPINNED_TTL 秒（默认 1 小时）
+- 命中缓存的服务启动时完全不连接，直接用缓存的清单构建工具；第一次调用其工具时才真正启动服务
+- 未命中的服务并发启动并列出工具，每个服务有独立超时（servers_config.json 中的 startup_timeout，
+  默认 MCP_STARTUP_TIMEOUT 秒），超时或失败的服务只记录警告并跳过，不影响其它服务
+- 工具顺序与配置文件中的服务顺序一致
+- 传入 pool（mcp_pool.MCPSessionPool）时，工具调用与清单获取都走池中的长连接会话，
+  否则每次工具调用新建一个会话
+"""
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.sessions import Connection, create_session
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.types import Tool as MCPTool
+
+logger = logging.getLogger(__name__)
+
+# 清单格式或工具转换方式变化时递增，使旧缓存全部失效
+MANIFEST_VERSION = 2
+MANIFEST_PATH = os.getenv("MCP_TOOLS_CACHE", ".mcp_tools_cache.json")
+# 缓存的清单超过该时间（秒）后重新连接服务获取，默认 7 天
+MANIFEST_TTL = float(os.getenv("MCP_TOOLS_CACHE_TTL", str(7 * 24 * 3600)))
+# npx 未固定版本的包：上游发布新版本后工具定义可能变化，默认 1 小时
+UNPINNED_TTL = float(os.getenv("MCP_TOOLS_CACHE_UNPINNED_TTL", "3600"))
+STARTUP_TIMEOUT = float(os.getenv("MCP_STARTUP_TIMEOUT", "30"))
+
+# servers_config.json 中由本模块使用、不传给 MCP 连接的字段
+LOCAL_KEYS = ("startup_timeout", "max_in_flight")
+
+# 超时后被放弃的启动任务：子进程的关闭在后台完成，不拖慢启动
+_abandoned: set[asyncio.Task] = set()
+
+
+def split_server_config(config: dict[str, Any]) -> tuple[Connection, float]:
+    """把一条服务配置拆成 (MCP 连接配置, 启动超时)"""
+    connection = {k: v for k, v in config.items() if k not in LOCAL_KEYS}
+    return connection, float(config.get("startup_timeout", STARTUP_TIMEOUT))
+
+
+def _local_sources(script: str) -> list[str]:
+    """
+    本地脚本及其递归 import 的同目录模块（weather_server.py -> weather_cache.py、mcp_transport.py ...）
+    :return: 按路径排序的文件列表
+    """
+    directory = os.path.dirname(os.path.abspath(script))
+    seen: set[str] = set()
+    pending = [os.path.abspath(script)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        try:
+            with open(path, "rb") as f:
+                tree = ast.parse(f.read(), filename=path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                candidate = os.path.join(directory, module.split(".")[0] + ".py")
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+    return sorted(seen)
+
+
+def server_fingerprint(connection: Connection) -> str:
+    """连接配置 + 本地脚本及其 import 的本地模块内容 + MANIFEST_VERSION 的哈希"""
+    digest = hashlib.sha256()
+    digest.update(f"v{MANIFEST_VERSION}\0".encode())
+    digest.update(json.dumps(connection, sort_keys=True, default=str).encode("utf-8"))
+    cwd = connection.get("cwd") or ""
+    for arg in connection.get("args", []):
+        # python weather_server.py 这类本地脚本（或它 import 的模块）修改后，工具定义可能随之变化
+        if not isinstance(arg, str) or not arg.endswith(".py"):
+            continue
+        script = os.path.join(str(cwd), arg)
+        if not os.path.isfile(script):
+            continue
+        for path in _local_sources(script):
+            with open(path, "rb") as f:
+                digest.update(b"\0" + os.path.basename(path).encode("utf-8") + b"\0")
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+# 精确版本号，如 1.2.3、1.0.0-beta.1；latest、^1.0 之类的标签或范围都视为未固定
+_EXACT_VERSION = re.compile(r"\d+\.\d+\.\d+(?:[-+][0-9A-Za-z.-]+)?")
+
+
+def is_unpinned_package(connection: Connection) -> bool:
+    """npx 启动且包名没有精确版本号时返回 True"""
+    command = os.path.basename(str(connection.get("command", "")))
+    if command not in ("npx", "npx.cmd"):
+        return False
+    args = [str(arg) for arg in connection.get("args", [])]
+    package = None
+    for i, arg in enumerate(args):
+        if arg.startswith("--package="):
+            package = arg.split("=", 1)[1]
+            break
+        if arg in ("-p", "--package") and i + 1 < len(args):
+            package = args[i + 1]
+            break
+        if not arg.startswith("-"):
+            package = arg
+            break
+    if package is None:
+        return False
+    # @scope/name@version：跳过作用域开头的 @
+    _, _, version = package[1:].partition("@") if package.startswith("@") else package.partition("@")
+    return not _EXACT_VERSION.fullmatch(version)
+
+
+class ToolManifestCache:
+    """
+    磁盘上的工具清单缓存，key 为 "服务名:指纹"，每条为 {"saved_at", "tools"}
+    同名服务的不同配置（例如 client.py 与 client2.py 各自的 servers_config）各占一条，互不覆盖
+    :param path: 缓存文件路径
+    :param ttl: 清单有效期（秒）；写回时会丢弃已过期的条目
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH, ttl: float = MANIFEST_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._servers: dict[str, dict[str, Any]] = {}
+        self._dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self._servers = data.get("servers", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("工具清单缓存读取失败，将重新获取: %s", e)
+
+    @staticmethod
+    def _key(name: str, fingerprint: str) -> str:
+        return f"{name}:{fingerprint}"
+
+    def get(self, name: str, fingerprint: str, ttl: float | None = None) -> list[MCPTool] | None:
+        """
+        :param ttl: 本次查询使用的有效期，默认 self.ttl（取两者中较小的）
+        """
+        entry = self._servers.get(self._key(name, fingerprint))
+        if not entry:
+            return None
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if time.time() - entry.get("saved_at", 0) > ttl:
+            return None
+        return [MCPTool.model_validate(tool) for tool in entry["tools"]]
+
+    def put(self, name: str, fingerprint: str, tools: list[MCPTool]) -> None:
+        self._servers[self._key(name, fingerprint)] = {
+            "saved_at": time.time(),
+            "tools": [tool.model_dump(mode="json", by_alias=True, exclude_none=True) for tool in tools],
+        }
+        self._dirty = True
+
+    def save(self) -> None:
+        """有变化时原子地写回缓存文件"""
+        if not self._dirty:
+            return
+        # 配置或脚本改过之后旧指纹的条目不会再被命中，过期后清理掉，避免文件无限增长
+        now = time.time()
+        self._servers = {
+            key: entry for key, entry in self._servers.items() if now - entry.get("saved_at", 0) <= self.ttl
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "servers": self._servers}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning("工具清单缓存写入失败: %s", e)
+
+
+async def list_server_tools(connection: Connection) -> list[MCPTool]:
+    """连接一次服务，列出全部工具（处理分页）后断开"""
+    async with create_session(connection) as session:
+        await session.initialize()
+        tools: list[MCPTool] = []
+        cursor = None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools.extend(page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                return tools
+
+
+async def discover_tools(
+    servers: dict[str, dict[str, Any]],
+    names: list[str] | None = None,
+    pool=None,
+) -> dict[str, list[MCPTool] | BaseException]:
+    """
+    并发连接服务并列出工具，每个服务单独超时
+    :param pool: 会话池；传入时在池中的会话上列出工具，会话保持打开供之后的调用使用
+    :return: 服务名 -> 工具列表；失败或超时的服务对应异常对象
+    """
+    names = list(servers) if names is None else names
+
+    async def discover(name: str) -> list[MCPTool]:
+        connection, timeout = split_server_config(servers[name])
+        start = time.perf_counter()
+        listing = pool.server(name).list_tools() if pool is not None else list_server_tools(connection)
+        task = asyncio.create_task(listing)
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if not done:
+            # 不等待取消完成：stdio 客户端关闭子进程还需要几秒
+            task.cancel()
+            _abandoned.add(task)
+            task.add_done_callback(_abandoned.discard)
+            raise asyncio.TimeoutError
+        tools = task.result()
+        logger.info("MCP 服务 %s 启动完成：%d 个工具，%.2fs", name, len(tools), time.perf_counter() - start)
+        return tools
+
+    results = await asyncio.gather(*(discover(name) for name in names), return_exceptions=True)
+    return dict(zip(names, results))
+
+
+async def load_tools(
+    servers: dict[str, dict[str, Any]],
+    *,
+    cache: ToolManifestCache | None = None,
+    use_cache: bool = True,
+    server_name_prefix: bool = False,
+    pool=None,
+) -> list[BaseTool]:
+    """
+    按 servers_config.json 中的 mcpServers 加载 LangChain 工具
+    :param servers: 服务名 -> 服务配置
+    :param cache: 工具清单缓存，默认使用 MANIFEST_PATH
+    :param use_cache: False 时每次都连接服务获取清单（结果仍会写入缓存）
+    :param server_name_prefix: 工具名是否加上服务名前缀
+    :param pool: mcp_pool.MCPSessionPool；不传时每次工具调用新建会话
+    """
+    if cache is None:
+        cache = ToolManifestCache()
+    manifests: dict[str, list[MCPTool]] = {}
+    fingerprints: dict[str, str] = {}
+    for name, config in servers.items():
+        connection, _ = split_server_config(config)
+        fingerprints[name] = server_fingerprint(connection)
+        ttl = UNPINNED_TTL if is_unpinned_package(connection) else None
+        cached = cache.get(name, fingerprints[name], ttl) if use_cache else None
+        if cached is not None:
+            manifests[name] = cached
+
+    missing = [name for name in servers if name not in manifests]
+    if missing:
+        for name, result in (await discover_tools(servers, missing, pool)).items():
+            if isinstance(result, BaseException):
+                reason = "启动超时" if isinstance(result, asyncio.TimeoutError) else f"{type(result).__name__}: {result}"
+                logger.warning("MCP 服务 %s 不可用，跳过其工具（%s）", name, reason)
+                continue
+            manifests[name] = result
+            cache.put(name, fingerprints[name], result)
+        cache.save()
+
+    tools = []
+    for name, config in servers.items():
+        connection, _ = split_server_config(config)
+        for tool in manifests.get(name, []):
+            # 池中的会话第一次使用时才启动；没有池时不传 session，每次调用按 connection 新建会话
+            tools.append(
+                convert_mcp_tool_to_langchain_tool(
+                    pool.server(name) if pool is not None else None,
+                    tool,
+                    connection=connection,
+                    server_name=name,
+                    tool_name_prefix=server_name_prefix,
+                )
+            )
+    return tools
@@ -0,0 +1,86 @@
+"""
+MCP 服务的传输方式选择：stdio（默认）/ streamable-http / sse
+
+stdio 模式下每个客户端进程都会启动一份私有的服务进程，缓存与连接池无法共享。
+HTTP 类传输只运行一个常驻进程，多个 client.py 通过 URL 连接同一个服务：
+
+    python weather_server.py --transport streamable-http --port 8001
+    python write_server.py --transport streamable-http --port 8002
+
+客户端使用 servers_config_http.json（MCP_SERVERS_CONFIG=servers_config_http.json）。
+
+服务端固定单进程运行：缓存、single-flight 与上游连接池都在进程内存中，多个 uvicorn worker 会把它们重新拆开。
+并发能力来自事件循环本身，可调的是 uvicorn 的连接参数与 MCP 会话参数：
+
+MCP_TRANSPORT               stdio / streamable-http / sse（命令行 --transport 优先）
+MCP_HOST                    监听地址（默认 127.0.0.1）
+MCP_PORT                    监听端口（默认由各服务指定）
+MCP_HTTP_LIMIT_CONCURRENCY  同时处理的连接 + 请求数上限，超过返回 503（默认不限制）
+MCP_HTTP_BACKLOG            等待 accept 的连接队列长度（默认 2048）
+MCP_HTTP_KEEPALIVE          空闲 keep-alive 连接保持秒数（默认 5）
+MCP_MAX_SESSIONS            同时存在的 MCP 会话数上限（默认 10000）
+MCP_SESSION_IDLE_TIMEOUT    空闲会话回收秒数（默认 1800）
+MCP_STATELESS_HTTP          1 表示无状态模式：每个请求独立处理，不保留会话
+MCP_JSON_RESPONSE           1 表示直接返回 JSON，不使用 SSE 流
+"""
+import argparse
+import os
+
+import anyio
+from mcp.server.fastmcp import FastMCP
+
+TRANSPORTS = ("stdio", "streamable-http", "sse")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+HOST = os.getenv("MCP_HOST", "127.0.0.1")
+LIMIT_CONCURRENCY = int(os.getenv("MCP_HTTP_LIMIT_CONCURRENCY", "0")) or None
+BACKLOG = int(os.getenv("MCP_HTTP_BACKLOG", "2048"))
+KEEPALIVE = int(os.getenv("MCP_HTTP_KEEPALIVE", "5"))
+MAX_SESSIONS = int(os.getenv("MCP_MAX_SESSIONS", "10000"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("MCP_SESSION_IDLE_TIMEOUT", "1800"))
+STATELESS_HTTP = os.getenv("MCP_STATELESS_HTTP", "0") == "1"
+JSON_RESPONSE = os.getenv("MCP_JSON_RESPONSE", "0") == "1"
+
+
+def parse_transport_args(port: int, argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    解析服务的命令行参数
+    :param port: 该服务的默认端口（MCP_PORT 可覆盖）
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=TRANSPORTS, default=os.getenv("MCP_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_PORT", str(port))))
+    parser.add_argument("--limit-concurrency", type=int, default=LIMIT_CONCURRENCY)
+    return parser.parse_args(argv)
+
+
+def run_server(mcp: FastMCP, args: argparse.Namespace) -> None:
+    """按 args.transport 运行服务；HTTP 类传输使用单进程 uvicorn"""
+    if args.transport == "stdio":
+        mcp.run(transport="stdio")
+        return
+
+    import uvicorn
+
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.settings.max_sessions = MAX_SESSIONS
+    mcp.settings.session_idle_timeout = SESSION_IDLE_TIMEOUT
+    mcp.settings.stateless_http = STATELESS_HTTP
+    mcp.settings.json_response = JSON_RESPONSE
+    if args.host not in LOOPBACK_HOSTS:
+        # FastMCP 按构造时的 127.0.0.1 开启了 DNS rebinding 防护（只接受 localhost 的 Host 头），
+        # 监听其它地址时与 FastMCP(host=...) 的行为保持一致，不做限制
+        mcp.settings.transport_security = None
+    app = mcp.streamable_http_app() if args.transport == "streamable-http" else mcp.sse_app()
+    config = uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        log_level=mcp.settings.log_level.lower(),
+        limit_concurrency=args.limit_concurrency,
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEPALIVE,
+    )
+    anyio.run(uvicorn.Server(config).serve)
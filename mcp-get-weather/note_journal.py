@@ -0,0 +1,293 @@
+"""
+write_server 的日志模式：分段的只追加日志 + 定长索引
+
+目录结构（默认 ./output/journal）：
+- segment_<首条 id>.log：笔记内容依次追加，每条之后跟一个换行，便于直接查看
+- segment_<首条 id>.idx：每条笔记一个 20 字节的索引记录 (时间戳 float64, 偏移 uint64, 长度 uint32)
+
+笔记 id 全局递增，按段文件名中的首条 id 二分定位到段，再按 (id - 首条 id) * 20 定位索引记录，读取是 O(1) 的。
+段超过 segment_bytes 后新开一段。
+
+写入由一个后台写入任务完成（group commit）：append 把笔记放进队列后等待结果，写入任务取出队列中已有的
+全部笔记（最多 max_batch 条），在线程中一次性写入日志与索引并各 fsync 一次，再唤醒全部调用方；
+上一批落盘期间到达的笔记自然组成下一批。fsync_interval 大于 0 时每批再多等待这么久以攒更大的批，
+适合 fsync 很慢的磁盘。append 返回时笔记已经落盘，而磁盘 IO 与 fsync 都不在事件循环线程中执行。
+
+打开时做崩溃恢复：先写日志再写索引，所以只需丢弃末尾不完整的索引记录、指向日志之外的索引记录，
+并把日志截断到最后一条有效记录之后。
+"""
+import asyncio
+import bisect
+import glob
+import os
+import re
+import struct
+import threading
+import time
+from dataclasses import dataclass
+
+INDEX_RECORD = struct.Struct("<dQI")
+SEGMENT_RE = re.compile(r"segment_(\d+)\.log$")
+
+JOURNAL_DIR = os.getenv("WRITE_JOURNAL_DIR", os.path.join("output", "journal"))
+SEGMENT_BYTES = int(os.getenv("WRITE_JOURNAL_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+# 每批额外的收集窗口（秒）与最大条数：窗口越长，每次 fsync 分摊的笔记越多，单条写入的延迟也越高
+FSYNC_INTERVAL = float(os.getenv("WRITE_JOURNAL_FSYNC_INTERVAL", "0"))
+MAX_BATCH = int(os.getenv("WRITE_JOURNAL_MAX_BATCH", "256"))
+
+
+@dataclass(frozen=True)
+class NoteRef:
+    id: int
+    timestamp: float
+    segment: str
+    offset: int
+    length: int
+
+
+class NoteJournal:
+    """
+    分段只追加日志
+    :param directory: 日志目录
+    :param segment_bytes: 单个段的大小上限（字节）
+    :param fsync_interval: 每批额外的收集窗口（秒），0 表示只合并已在队列中的笔记
+    :param max_batch: 单批最多写入的笔记数
+    """
+
+    def __init__(
+        self,
+        directory: str = JOURNAL_DIR,
+        *,
+        segment_bytes: int = SEGMENT_BYTES,
+        fsync_interval: float = FSYNC_INTERVAL,
+        max_batch: int = MAX_BATCH,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.max_batch = max(1, max_batch)
+        self.stats = {"notes": 0, "batches": 0, "fsyncs": 0, "segments": 0}
+        # 各段的首条 id，升序；只在写入线程中追加
+        self._first_ids: list[int] = []
+        self._next_id = 0
+        self._log = None
+        self._idx = None
+        self._opened = False
+        self._open_lock = threading.Lock()
+        # 以下对象绑定事件循环，第一次 append 时创建
+        self._queue: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+
+    # ---- 文件与恢复（均在线程中执行） ----
+
+    def _paths(self, first_id: int) -> tuple[str, str]:
+        base = os.path.join(self.directory, f"segment_{first_id:012d}")
+        return base + ".log", base + ".idx"
+
+    def _open(self):
+        with self._open_lock:
+            if self._opened:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            first_ids = sorted(
+                int(m.group(1))
+                for m in (SEGMENT_RE.search(os.path.basename(p)) for p in glob.glob(os.path.join(self.directory, "*.log")))
+                if m
+            )
+            if not first_ids:
+                first_ids = [0]
+            self._first_ids = first_ids
+            self._next_id = first_ids[-1] + self._recover(first_ids[-1])
+            self._open_segment(first_ids[-1])
+            self.stats["segments"] = len(first_ids)
+            self._opened = True
+
+    def _recover(self, first_id: int) -> int:
+        """修复最后一段，返回其中有效的笔记数"""
+        log_path, idx_path = self._paths(first_id)
+        for path in (log_path, idx_path):
+            open(path, "ab").close()
+        log_size = os.path.getsize(log_path)
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        count = len(data) // INDEX_RECORD.size
+        end = 0
+        while count:
+            _, offset, length = INDEX_RECORD.unpack_from(data, (count - 1) * INDEX_RECORD.size)
+            end = offset + length + 1
+            if end <= log_size:
+                break
+            count -= 1
+            end = 0
+        if count * INDEX_RECORD.size != len(data):
+            with open(idx_path, "r+b") as f:
+                f.truncate(count * INDEX_RECORD.size)
+        if end != log_size:
+            with open(log_path, "r+b") as f:
+                f.truncate(end)
+        return count
+
+    def _open_segment(self, first_id: int):
+        log_path, idx_path = self._paths(first_id)
+        self._log = open(log_path, "ab")
+        self._idx = open(idx_path, "ab")
+
+    def _roll(self):
+        self._close_files()
+        self._first_ids.append(self._next_id)
+        self._open_segment(self._next_id)
+        self.stats["segments"] += 1
+
+    def _close_files(self):
+        for f in (self._log, self._idx):
+            if f is not None:
+                f.close()
+        self._log = self._idx = None
+
+    def _write_batch(self, contents: list[bytes]) -> list[NoteRef]:
+        """写入一批笔记：先日志后索引，各 fsync 一次"""
+        self._open()
+        try:
+            refs = []
+            index = bytearray()
+            for content in contents:
+                position = self._log.tell()
+                if position and position + len(content) + 1 > self.segment_bytes:
+                    self._flush(index)
+                    index.clear()
+                    self._roll()
+                    position = 0
+                self._log.write(content + b"\n")
+                timestamp = time.time()
+                index += INDEX_RECORD.pack(timestamp, position, len(content))
+                segment = os.path.basename(self._log.name)
+                refs.append(NoteRef(self._next_id, timestamp, segment, position, len(content)))
+                self._next_id += 1
+            self._flush(index)
+        except BaseException:
+            # 写入失败（例如磁盘已满）后内存中的 id 与磁盘不再一致，下次写入前重新打开并做崩溃恢复
+            with self._open_lock:
+                self._opened = False
+                try:
+                    self._close_files()
+                except OSError:
+                    self._log = self._idx = None
+            raise
+        self.stats["notes"] += len(contents)
+        self.stats["batches"] += 1
+        return refs
+
+    def _flush(self, index: bytes):
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._idx.write(index)
+        self._idx.flush()
+        os.fsync(self._idx.fileno())
+        self.stats["fsyncs"] += 2
+
+    # ---- 读取（线程中执行，与写入并发安全：可见的索引记录对应的日志内容一定已经写入） ----
+
+    def _read_index(self, first_id: int) -> bytes:
+        with open(self._paths(first_id)[1], "rb") as f:
+            data = f.read()
+        return data[: len(data) - len(data) % INDEX_RECORD.size]
+
+    def _read(self, note_id: int) -> tuple[NoteRef, str] | None:
+        self._open()
+        first_ids = list(self._first_ids)
+        position = bisect.bisect_right(first_ids, note_id) - 1
+        if note_id < 0 or position < 0:
+            return None
+        first_id = first_ids[position]
+        log_path, idx_path = self._paths(first_id)
+        with open(idx_path, "rb") as f:
+            f.seek((note_id - first_id) * INDEX_RECORD.size)
+            record = f.read(INDEX_RECORD.size)
+        if len(record) < INDEX_RECORD.size:
+            return None
+        timestamp, offset, length = INDEX_RECORD.unpack(record)
+        with open(log_path, "rb") as f:
+            f.seek(offset)
+            content = f.read(length).decode("utf-8")
+        return NoteRef(note_id, timestamp, os.path.basename(log_path), offset, length), content
+
+    def _search(self, query: str, limit: int, since: float | None) -> list[tuple[NoteRef, str]]:
+        """从新到旧扫描，返回内容包含 query（不区分大小写）的笔记"""
+        self._open()
+        needle = query.lower()
+        results = []
+        for first_id in reversed(list(self._first_ids)):
+            index = self._read_index(first_id)
+            log_path = self._paths(first_id)[0]
+            with open(log_path, "rb") as f:
+                data = f.read()
+            for number in range(len(index) // INDEX_RECORD.size - 1, -1, -1):
+                timestamp, offset, length = INDEX_RECORD.unpack_from(index, number * INDEX_RECORD.size)
+                if since is not None and timestamp < since:
+                    # 时间戳随 id 递增，更早的笔记都不满足
+                    return results
+                content = data[offset : offset + length].decode("utf-8")
+                if needle in content.lower():
+                    ref = NoteRef(first_id + number, timestamp, os.path.basename(log_path), offset, length)
+                    results.append((ref, content))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    # ---- 异步接口 ----
+
+    async def append(self, content: str) -> NoteRef:
+        """追加一条笔记，落盘后返回其位置"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_loop(), name="note-journal-writer")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((content.encode("utf-8"), future))
+        return await future
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.fsync_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    # close()：写完已收集的笔记后退出
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                refs = await asyncio.to_thread(self._write_batch, [content for content, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), ref in zip(batch, refs):
+                if not future.done():
+                    future.set_result(ref)
+
+    async def read(self, note_id: int) -> tuple[NoteRef, str] | None:
+        return await asyncio.to_thread(self._read, note_id)
+
+    async def search(self, query: str = "", limit: int = 10, since: float | None = None) -> list[tuple[NoteRef, str]]:
+        return await asyncio.to_thread(self._search, query, limit, since)
+
+    async def close(self):
+        """写完队列中已有的笔记后停止写入任务并关闭文件"""
+        if self._writer is not None and not self._writer.done():
+            await self._queue.put(None)
+            await self._writer
+        self._writer = None
+        await asyncio.to_thread(self._close_files)
+        self._opened = False
@@ -0,0 +1,513 @@
+"""
+基于本地 SQLite（WAL 模式）的持久化 checkpointer
+
+- 进程重启后会话状态不丢失，可替代 InMemorySaver
+- 批量写入：put / put_writes 先进入内存缓冲区，达到 batch_size 或经过 flush_interval 后
+  在一个事务中落盘；任何读操作前都会先落盘，保证读到自己的写入
+- 保留策略：每个会话（thread_id + checkpoint_ns）只保留最近 keep_last 个 checkpoint，
+  超过 idle_ttl 秒未写入的会话整体删除
+- 后台维护线程定期清理空闲会话、截断 WAL 并执行增量 vacuum
+
+状态跨进程保留，调用方应为每次会话生成新的 thread_id（例如 uuid4），
+只在需要继续之前的会话时复用已有的 thread_id；固定的 thread_id 会让每次启动都追加到同一个会话。
+
+注意：每个 checkpoint 保存完整的 channel_values，不依赖祖先 checkpoint，
+因此按数量裁剪是安全的；使用 DeltaChannel 的图不适用本实现。
+
+mcp-get-weather、LangChainChatBot、nl2sql 各有一份本文件，修改时请保持三份一致（mcp-get-weather/test_shared_modules.py 会检查）。
+"""
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_write REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_write ON threads (last_write);
+"""
+
+_INSERT_CHECKPOINT = (
+    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+    "parent_checkpoint_id, type, checkpoint, metadata_type, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_WRITE = (
+    "INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, value) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    SQLite / WAL 持久化 checkpointer
+    :param path: 数据库文件路径
+    :param keep_last: 每个会话保留的最近 checkpoint 数，None 表示不裁剪
+    :param idle_ttl: 会话空闲超过该秒数后被删除，None 表示不删除
+    :param batch_size: 缓冲区达到该条数时立即落盘
+    :param flush_interval: 缓冲区最长停留时间（秒），进程崩溃时最多丢失这段时间内的写入
+    :param maintenance_interval: 后台清理空闲会话与 vacuum 的间隔（秒），None 表示不启动后台线程
+    """
+
+    def __init__(
+        self,
+        path: str = "checkpoints.db",
+        *,
+        keep_last: int | None = 20,
+        idle_ttl: float | None = 7 * 24 * 3600,
+        batch_size: int = 64,
+        flush_interval: float = 0.05,
+        maintenance_interval: float | None = 300,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_last = keep_last
+        self.idle_ttl = idle_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum 只对新建的数据库生效，需在建表之前设置
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        self._pending_checkpoints: list[tuple] = []
+        self._pending_writes: list[tuple[str, tuple]] = []
+        self._touched: dict[str, set[str]] = {}
+        self._first_pending_at: float | None = None
+
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="checkpoint-flush", daemon=True)
+        self._flusher.start()
+        self._maintainer: threading.Thread | None = None
+        if maintenance_interval:
+            self._maintainer = threading.Thread(
+                target=self._maintenance_loop,
+                args=(maintenance_interval,),
+                name="checkpoint-maintenance",
+                daemon=True,
+            )
+            self._maintainer.start()
+
+    # ---- 读 ----
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            self.flush()
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                    "metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                    "metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            return self._row_to_tuple(row)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                f"metadata_type, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params,
+            ).fetchall()
+
+        remaining = limit
+        for row in rows:
+            if remaining is not None and remaining <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            with self._lock:
+                yield self._row_to_tuple(row)
+            if remaining is not None:
+                remaining -= 1
+
+    def _row_to_tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    # ---- 写 ----
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        row = (
+            thread_id,
+            checkpoint_ns,
+            checkpoint["id"],
+            config["configurable"].get("checkpoint_id"),
+            type_,
+            serialized,
+            metadata_type,
+            serialized_metadata,
+        )
+        with self._lock:
+            self._pending_checkpoints.append(row)
+            self._mark_pending(thread_id, checkpoint_ns)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # 特殊通道（错误、中断等）允许覆盖，普通写入重复提交时保留第一次的结果
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            for idx, (channel, value) in enumerate(writes):
+                value_type, serialized = self.serde.dumps_typed(value)
+                self._pending_writes.append((
+                    verb,
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint_id,
+                        task_id,
+                        task_path,
+                        WRITES_IDX_MAP.get(channel, idx),
+                        channel,
+                        value_type,
+                        serialized,
+                    ),
+                ))
+            self._mark_pending(thread_id, checkpoint_ns)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.flush()
+            self._conn.execute("BEGIN")
+            self._delete_threads([thread_id])
+            self._conn.execute("COMMIT")
+
+    def _mark_pending(self, thread_id: str, checkpoint_ns: str) -> None:
+        self._touched.setdefault(thread_id, set()).add(checkpoint_ns)
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+        if len(self._pending_checkpoints) + len(self._pending_writes) >= self.batch_size:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """把缓冲区中的写入在一个事务内落盘，并对涉及的会话执行保留策略"""
+        with self._lock:
+            if not self._pending_checkpoints and not self._pending_writes:
+                return
+            checkpoints, self._pending_checkpoints = self._pending_checkpoints, []
+            writes, self._pending_writes = self._pending_writes, []
+            touched, self._touched = self._touched, {}
+            self._first_pending_at = None
+
+            now = time.time()
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(_INSERT_CHECKPOINT, checkpoints)
+                for verb, params in writes:
+                    self._conn.execute(f"{verb} {_INSERT_WRITE}", params)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO threads (thread_id, last_write) VALUES (?, ?)",
+                    [(thread_id, now) for thread_id in touched],
+                )
+                if self.keep_last:
+                    for thread_id, namespaces in touched.items():
+                        for checkpoint_ns in namespaces:
+                            self._trim(thread_id, checkpoint_ns)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _trim(self, thread_id: str, checkpoint_ns: str) -> None:
+        cutoff = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1),
+        ).fetchone()
+        if cutoff is None:
+            return
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, cutoff[0]),
+            )
+
+    def _delete_threads(self, thread_ids: Sequence[str]) -> None:
+        for table in ("checkpoints", "writes", "threads"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids])
+
+    # ---- 后台维护 ----
+
+    def prune_idle_threads(self) -> int:
+        """删除超过 idle_ttl 未写入的会话，返回删除的会话数"""
+        if not self.idle_ttl:
+            return 0
+        with self._lock:
+            self.flush()
+            expired = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE last_write < ?", (time.time() - self.idle_ttl,)
+                )
+            ]
+            if expired:
+                self._conn.execute("BEGIN")
+                self._delete_threads(expired)
+                self._conn.execute("COMMIT")
+        return len(expired)
+
+    def vacuum(self) -> None:
+        """截断 WAL 文件并归还空闲页"""
+        with self._lock:
+            self.flush()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("PRAGMA incremental_vacuum")
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            first = self._first_pending_at
+            if first is not None:
+                delay = self.flush_interval - (time.monotonic() - first)
+                if delay > 0 and self._stop.wait(delay):
+                    break
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("checkpoint 批量写入失败")
+
+    def _maintenance_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                pruned = self.prune_idle_threads()
+                self.vacuum()
+                if pruned:
+                    logger.info("已清理 %d 个空闲会话", pruned)
+            except Exception:
+                logger.exception("checkpoint 后台维护失败")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        self._flusher.join()
+        if self._maintainer is not None:
+            self._maintainer.join()
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    def __enter__(self) -> "SQLiteCheckpointer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # ---- 异步接口：全部放到线程中执行；写操作可能等待后台落盘持有的锁，或在缓冲区满时同步落盘 ----
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        next_v = current_v + 1
+        next_h = random.random()
+        return f"{next_v:032}.{next_h:016}"
+
+
+_shared: dict[str, SQLiteCheckpointer] = {}
+_shared_lock = threading.Lock()
+
+
+def get_checkpointer(path: str | None = None) -> SQLiteCheckpointer:
+    """
+    返回进程内共享的 checkpointer（同一文件只打开一次）
+    路径默认取环境变量 CHECKPOINT_DB，未设置时为当前目录下的 checkpoints.db；
+    保留策略可通过 CHECKPOINT_KEEP_LAST、CHECKPOINT_IDLE_TTL 调整
+    """
+    path = path or os.getenv("CHECKPOINT_DB", "checkpoints.db")
+    with _shared_lock:
+        if path not in _shared:
+            _shared[path] = SQLiteCheckpointer(
+                path,
+                keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "20")) or None,
+                idle_ttl=float(os.getenv("CHECKPOINT_IDLE_TTL", str(7 * 24 * 3600))) or None,
+            )
+        return _shared[path]
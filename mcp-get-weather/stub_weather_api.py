@@ -0,0 +1,135 @@
+"""
+本地 weatherapi.com 桩服务，用于基准测试和单元测试
+
+在后台线程中运行一个支持 HTTP/1.1 keep-alive 的 HTTP 服务器，
+对 /v1/current.json 返回固定格式的天气数据，并统计收到的请求数与新建连接数。
+fail_next 可以让接下来的若干个请求返回指定的错误状态码（例如 429 / 503），用于测试重试逻辑。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stub.record_connection()
+
+    def do_GET(self):
+        stub = self.server.stub
+        query = parse_qs(urlparse(self.path).query)
+        city = query.get("q", ["Unknown"])[0]
+        failure = stub.record_request(city)
+        if stub.delay:
+            time.sleep(stub.delay)
+
+        if failure is not None:
+            status, retry_after = failure
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+            self._send(status, {"error": {"code": status, "message": "Stub failure."}}, headers)
+            return
+        if city.strip().lower() in stub.unknown_cities:
+            self._send(400, {"error": {"code": 1006, "message": "No matching location found."}})
+            return
+
+        self._send(200, {
+            "location": {"name": city.strip().title(), "region": "", "country": "Stub"},
+            "current": {
+                "temp_c": 21.0,
+                "condition": {"text": "Sunny"},
+                "humidity": 40,
+                "wind_kph": 7.2,
+            },
+        })
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubWeatherAPI:
+    """
+    可作为上下文管理器使用的桩服务
+    :param delay: 每个请求的人为延迟（秒），用于模拟慢速上游
+    :param unknown_cities: 返回 400 错误的城市名（小写）
+    """
+
+    def __init__(self, delay: float = 0.0, unknown_cities=("atlantis",)):
+        self.delay = delay
+        self.unknown_cities = set(unknown_cities)
+        self.requests = 0
+        self.connections = 0
+        # 每个请求的 q 参数，按到达顺序记录
+        self.queries: list[str] = []
+        self._failures: list[tuple[int, int | None]] = []
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/current.json"
+
+    def record_request(self, city: str) -> tuple[int, int | None] | None:
+        """记录一个请求，返回该请求应当模拟的错误 (状态码, Retry-After)，没有时返回 None"""
+        with self._lock:
+            self.requests += 1
+            self.queries.append(city)
+            return self._failures.pop(0) if self._failures else None
+
+    def fail_next(self, status: int, count: int = 1, retry_after: int | None = None):
+        """
+        让接下来的 count 个请求返回 status
+        :param retry_after: 非空时在错误响应中附带 Retry-After 头（秒）
+        """
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+            self.queries.clear()
+            self._failures.clear()
+
+    def start(self):
+        self._server = _StubServer(("127.0.0.1", 0), _StubHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,13 @@
+import asyncio
+
+from bench_startup import slow_server_config
+from mcp_tools import ToolManifestCache, load_tools
+
+
+def test_slow_server_wrapper_starts_write_server(tmp_path):
+    servers = {"slow_start": slow_server_config(cold_start=0.2, timeout=30)}
+
+    tools = asyncio.run(load_tools(servers, cache=ToolManifestCache(str(tmp_path / "tools.json")), use_cache=False))
+
+    assert "write_to_file" in {tool.name for tool in tools}
+
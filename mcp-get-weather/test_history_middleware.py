@@ -0,0 +1,139 @@
+import asyncio
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from history_middleware import SUMMARY_MESSAGE_ID, SUMMARY_PREFIX, TOKENS_SAVED_KEY, HistoryBudgetMiddleware
+
+
+class FailingModel(GenericFakeChatModel):
+    def _generate(self, *args, **kwargs):
+        raise RuntimeError("模型不可用")
+
+    async def _agenerate(self, *args, **kwargs):
+        raise RuntimeError("模型不可用")
+
+
+def summary_model(*summaries: str) -> GenericFakeChatModel:
+    return GenericFakeChatModel(messages=iter([AIMessage(content=s) for s in summaries]))
+
+
+def count_messages(messages) -> int:
+    # 每条消息计 10 个 token，便于推算预算
+    return 10 * len(list(messages))
+
+
+def weather_turn(i: int) -> list:
+    call = {"name": "get_weather", "args": {"loc": f"城市{i}"}, "id": f"call_{i}"}
+    return [
+        HumanMessage(content=f"城市{i}的天气？", id=f"human_{i}"),
+        AIMessage(content="", tool_calls=[call], id=f"ai_call_{i}"),
+        ToolMessage(content="晴", tool_call_id=f"call_{i}", id=f"tool_{i}"),
+        AIMessage(content=f"城市{i}晴", id=f"ai_{i}"),
+    ]
+
+
+def conversation(turns: int) -> list:
+    messages = [SystemMessage(content="你是天气助手", id="system")]
+    for i in range(turns):
+        messages.extend(weather_turn(i))
+    return messages
+
+
+def middleware(model, max_tokens: int, keep_last_turns: int = 2) -> HistoryBudgetMiddleware:
+    return HistoryBudgetMiddleware(
+        model, max_tokens=max_tokens, keep_last_turns=keep_last_turns, token_counter=count_messages
+    )
+
+
+def test_within_budget_is_untouched():
+    history = middleware(summary_model("不会用到"), max_tokens=1000)
+
+    assert history.before_model({"messages": conversation(3)}, None) is None
+    assert history.stats()["summarizations"] == 0
+
+
+def test_over_budget_folds_old_turns_into_summary():
+    history = middleware(summary_model("用户查询了城市0、1的天气"), max_tokens=100)
+
+    update = history.before_model({"messages": conversation(4)}, None)
+
+    remove, system, summary, *kept = update["messages"]
+    assert isinstance(remove, RemoveMessage)
+    assert system.id == "system"
+    assert summary.id == SUMMARY_MESSAGE_ID
+    assert summary.content == SUMMARY_PREFIX + "用户查询了城市0、1的天气"
+    assert [m.id for m in kept] == [m.id for m in weather_turn(2) + weather_turn(3)]
+    assert update[TOKENS_SAVED_KEY] == 70
+
+
+def test_tool_calls_stay_paired_with_their_results():
+    # 预算只够一轮时，保留的仍是完整的一轮
+    history = middleware(summary_model("摘要"), max_tokens=50, keep_last_turns=4)
+
+    update = history.before_model({"messages": conversation(4)}, None)
+
+    kept = update["messages"][3:]
+    assert isinstance(kept[0], HumanMessage)
+    called = {call["id"] for m in kept if isinstance(m, AIMessage) for call in m.tool_calls}
+    answered = {m.tool_call_id for m in kept if isinstance(m, ToolMessage)}
+    assert called == answered == {"call_3"}
+
+
+def test_summary_failure_keeps_full_history():
+    history = middleware(FailingModel(messages=iter([])), max_tokens=100)
+    messages = conversation(4)
+
+    assert history.before_model({"messages": messages}, None) is None
+    assert asyncio.run(history.abefore_model({"messages": messages}, None)) is None
+    stats = history.stats()
+    assert stats["failures"] == 2
+    assert stats["summarizations"] == 0
+    assert stats["total_tokens_saved"] == 0
+
+
+def test_turn_savings_cover_the_whole_turn():
+    history = middleware(summary_model("摘要一", "摘要二"), max_tokens=100)
+    state = {"messages": conversation(4), **history.before_agent({"messages": []}, None)}
+
+    first = history.before_model(state, None)
+    # 同一轮中的第二次模型调用：工具结果使状态再次超出预算
+    second = history.before_model({"messages": first["messages"][1:] + weather_turn(4), **_saved(first)}, None)
+
+    assert second[TOKENS_SAVED_KEY] == 70 + 40
+    assert history.before_agent({"messages": []}, None) == {TOKENS_SAVED_KEY: 0}
+    assert history.stats() == {"summarizations": 2, "failures": 0, "total_tokens_saved": 110}
+
+
+def test_sessions_sharing_one_middleware_keep_their_own_turn_savings():
+    history = middleware(summary_model("摘要一", "摘要二", "摘要三"), max_tokens=100)
+    a = history.before_model({"messages": conversation(4), TOKENS_SAVED_KEY: 0}, None)
+    # 另一个会话在两次调用之间折叠了一次，不影响前一个会话的本轮数字
+    b = history.before_model({"messages": conversation(5), TOKENS_SAVED_KEY: 0}, None)
+    a = history.before_model({"messages": a["messages"][1:] + weather_turn(4), **_saved(a)}, None)
+
+    assert a[TOKENS_SAVED_KEY] == 70 + 40
+    assert b[TOKENS_SAVED_KEY] == 110
+    assert history.stats()["total_tokens_saved"] == 220
+
+
+def test_turn_savings_are_stored_in_agent_state():
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=f"回答{i}") for i in range(10)]))
+    history = middleware(summary_model("摘要一", "摘要二"), max_tokens=60)
+    agent = create_agent(model=model, middleware=[history], checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "t"}}
+
+    saved = []
+    for i in range(5):
+        agent.invoke({"messages": [HumanMessage(content=f"问题{i}")]}, config)
+        saved.append(agent.get_state(config).values[TOKENS_SAVED_KEY])
+
+    # 第 4 轮 7 条消息超出预算，前两轮折叠成摘要：70 -> 40；第 5 轮未超出预算，清零
+    assert saved == [0, 0, 0, 30, 0]
+    assert history.stats()["total_tokens_saved"] == 30
+
+
+def _saved(update: dict) -> dict:
+    return {TOKENS_SAVED_KEY: update[TOKENS_SAVED_KEY]}
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from mcp_pool import MCPSessionPool
+from mcp_tools import ToolManifestCache, load_tools
+
+# 测试用 MCP 服务：pid 返回进程号，slow 睡眠后返回
+SERVER = """
+import asyncio, os
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("PoolTest")
+
+
+@mcp.tool()
+async def pid() -> str:
+    return str(os.getpid())
+
+
+@mcp.tool()
+async def slow(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+mcp.run(transport="stdio")
+"""
+
+
+@pytest.fixture
+def servers(tmp_path):
+    script = tmp_path / "pool_server.py"
+    script.write_text(SERVER, encoding="utf-8")
+    return {"test": {"command": sys.executable, "args": [str(script)], "transport": "stdio", "max_in_flight": 2}}
+
+
+async def _text(pool: MCPSessionPool, tool: str, **arguments) -> str:
+    result = await pool.server("test").call_tool(tool, arguments)
+    return result.content[0].text
+
+
+def test_calls_reuse_one_process_and_respawn_after_crash(servers):
+    async def run():
+        async with MCPSessionPool(servers) as pool:
+            pids = {await _text(pool, "pid") for _ in range(20)}
+            assert len(pids) == 1
+
+            os.kill(int(pids.pop()), signal.SIGKILL)
+            await asyncio.sleep(0.5)
+            # 会话已失效：请求没有发出，换新进程后自动重试
+            new_pid = await _text(pool, "pid")
+            stats = pool.stats()["test"]
+            assert (stats["spawns"], stats["respawns"], stats["retries"]) == (2, 1, 1)
+            assert new_pid == await _text(pool, "pid")
+        assert not pool.server("test").alive
+
+    asyncio.run(run())
+
+
+def test_max_in_flight_limits_concurrent_calls(servers):
+    async def run():
+        async with MCPSessionPool(servers) as pool:
+            await pool.start()
+            start = time.perf_counter()
+            await asyncio.gather(*(_text(pool, "slow", seconds=0.3) for _ in range(4)))
+            return time.perf_counter() - start
+
+    # 4 个调用、每次最多 2 个并发：至少两轮
+    assert asyncio.run(run()) >= 0.6
+
+
+def test_load_tools_uses_pooled_sessions(servers, tmp_path):
+    async def run():
+        async with MCPSessionPool(servers) as pool:
+            tools = await load_tools(servers, cache=ToolManifestCache(str(tmp_path / "tools.json")), pool=pool)
+            pid_tool = next(tool for tool in tools if tool.name == "pid")
+            results = [await pid_tool.ainvoke({}) for _ in range(5)]
+            # 清单获取与工具调用共用同一个会话
+            assert pool.stats()["test"]["spawns"] == 1
+            return {result[0]["text"] for result in results}
+
+    assert len(asyncio.run(run())) == 1
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from mcp.types import Tool as MCPTool
+
+from mcp_tools import ToolManifestCache, is_unpinned_package, server_fingerprint
+
+
+def _tool(name: str) -> MCPTool:
+    return MCPTool(name=name, inputSchema={"type": "object", "properties": {}})
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "server.py").write_text("import helper\nfrom transport import run\n", encoding="utf-8")
+    (tmp_path / "helper.py").write_text("import nested\n", encoding="utf-8")
+    (tmp_path / "nested.py").write_text("VALUE = 1\n", encoding="utf-8")
+    (tmp_path / "transport.py").write_text("def run(): pass\n", encoding="utf-8")
+    (tmp_path / "unrelated.py").write_text("X = 1\n", encoding="utf-8")
+    return tmp_path
+
+
+def _connection(project) -> dict:
+    return {"command": "python", "args": ["server.py"], "cwd": str(project), "transport": "stdio"}
+
+
+@pytest.mark.parametrize("module", ["server.py", "helper.py", "nested.py", "transport.py"])
+def test_fingerprint_covers_modules_imported_by_the_script(project, module):
+    before = server_fingerprint(_connection(project))
+    with open(project / module, "a", encoding="utf-8") as f:
+        f.write("# changed\n")
+
+    assert server_fingerprint(_connection(project)) != before
+
+
+def test_fingerprint_ignores_modules_the_script_does_not_import(project):
+    before = server_fingerprint(_connection(project))
+    (project / "unrelated.py").write_text("X = 2\n", encoding="utf-8")
+
+    assert server_fingerprint(_connection(project)) == before
+
+
+@pytest.mark.parametrize(
+    "args, unpinned",
+    [
+        (["-y", "@modelcontextprotocol/server-filesystem", "/tmp"], True),
+        (["-y", "@modelcontextprotocol/server-filesystem@latest", "/tmp"], True),
+        (["-y", "some-server@^1.2.0"], True),
+        (["-y", "@modelcontextprotocol/server-filesystem@2025.8.21", "/tmp"], False),
+        (["-y", "some-server@1.2.3-beta.1"], False),
+        (["--package=some-server@1.2.3", "some-bin"], False),
+        (["-p", "some-server", "some-bin"], True),
+    ],
+)
+def test_npx_packages_without_an_exact_version_are_unpinned(args, unpinned):
+    assert is_unpinned_package({"command": "npx", "args": args}) is unpinned
+
+
+def test_local_scripts_are_not_unpinned_packages():
+    assert not is_unpinned_package({"command": "python", "args": ["weather_server.py"]})
+
+
+def test_same_server_name_with_different_configs_do_not_overwrite(tmp_path):
+    path = str(tmp_path / "tools.json")
+    cache = ToolManifestCache(path)
+    cache.put("weather", "config-a", [_tool("a")])
+    cache.put("weather", "config-b", [_tool("b")])
+    cache.save()
+
+    reloaded = ToolManifestCache(path)
+    assert [t.name for t in reloaded.get("weather", "config-a")] == ["a"]
+    assert [t.name for t in reloaded.get("weather", "config-b")] == ["b"]
+    assert reloaded.get("weather", "config-c") is None
+
+
+def test_shorter_ttl_expires_unpinned_entries_first(tmp_path):
+    cache = ToolManifestCache(str(tmp_path / "tools.json"), ttl=3600)
+    cache.put("filesystem", "fp", [_tool("read_file")])
+    cache._servers["filesystem:fp"]["saved_at"] = time.time() - 120
+
+    assert cache.get("filesystem", "fp") is not None
+    assert cache.get("filesystem", "fp", ttl=60) is None
+
+
+def test_save_drops_expired_entries(tmp_path):
+    path = str(tmp_path / "tools.json")
+    cache = ToolManifestCache(path, ttl=60)
+    cache.put("weather", "old", [_tool("a")])
+    cache._servers["weather:old"]["saved_at"] = time.time() - 120
+    cache.put("weather", "new", [_tool("b")])
+    cache.save()
+
+    assert set(ToolManifestCache(path)._servers) == {"weather:new"}
@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import write_server
+from note_journal import INDEX_RECORD, NoteJournal
+
+
+def test_concurrent_appends_are_batched_and_readable(tmp_path):
+    async def run():
+        journal = NoteJournal(str(tmp_path), fsync_interval=0.01)
+        refs = await asyncio.gather(*(journal.append(f"笔记 {i}") for i in range(200)))
+        notes = [await journal.read(ref.id) for ref in refs]
+        await journal.close()
+        return journal, refs, notes
+
+    journal, refs, notes = asyncio.run(run())
+
+    assert sorted(ref.id for ref in refs) == list(range(200))
+    assert [content for _, content in notes] == [f"笔记 {i}" for i in range(200)]
+    # 200 条笔记只触发了少数几次批量 fsync
+    assert journal.stats["batches"] < 20
+
+
+def test_reopen_recovers_from_torn_writes(tmp_path):
+    async def write(contents):
+        journal = NoteJournal(str(tmp_path))
+        refs = [await journal.append(content) for content in contents]
+        await journal.close()
+        return refs
+
+    asyncio.run(write(["first", "second"]))
+    log_path = tmp_path / "segment_000000000000.log"
+    idx_path = tmp_path / "segment_000000000000.idx"
+    clean_size = os.path.getsize(log_path)
+    # 模拟崩溃：日志写了一半，索引只写了半条记录
+    with open(log_path, "ab") as f:
+        f.write(b"half-written")
+    with open(idx_path, "ab") as f:
+        f.write(INDEX_RECORD.pack(0.0, clean_size, 100)[:7])
+
+    refs = asyncio.run(write(["third"]))
+
+    assert refs[0].id == 2
+    assert refs[0].offset == clean_size
+    assert os.path.getsize(idx_path) == 3 * INDEX_RECORD.size
+    assert log_path.read_bytes() == b"first\nsecond\nthird\n"
+
+
+def test_segments_roll_and_search_returns_newest_first(tmp_path):
+    async def run():
+        journal = NoteJournal(str(tmp_path), segment_bytes=64)
+        for i in range(20):
+            await journal.append(f"weather note {i}" if i % 2 == 0 else f"other {i}")
+        found = await journal.search("WEATHER", limit=3)
+        oldest = await journal.read(0)
+        await journal.close()
+        return journal, found, oldest
+
+    journal, found, oldest = asyncio.run(run())
+
+    assert journal.stats["segments"] > 1
+    assert [ref.id for ref, _ in found] == [18, 16, 14]
+    assert oldest[1] == "weather note 0"
+
+
+def test_file_mode_does_not_overwrite_notes_written_together(tmp_path, monkeypatch):
+    monkeypatch.setattr(write_server, "OUTPUT_DIR", str(tmp_path))
+
+    async def run():
+        return await asyncio.gather(*(write_server.write_to_file(f"note {i}") for i in range(20)))
+
+    results = asyncio.run(run())
+
+    assert all("成功" in result for result in results)
+    contents = sorted(path.read_text(encoding="utf-8") for path in tmp_path.iterdir())
+    assert contents == sorted(f"note {i}" for i in range(20))
@@ -0,0 +1,70 @@
+import asyncio
+import filecmp
+import os
+import uuid
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from sqlite_checkpointer import SQLiteCheckpointer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在多个目录中各有一份、需要保持完全一致的模块
+SHARED_MODULES = {
+    "sqlite_checkpointer.py": ["mcp-get-weather", "LangChainChatBot", "nl2sql"],
+    "history_middleware.py": ["mcp-get-weather", "LangChainChatBot", "nl2sql"],
+    "tool_concurrency.py": ["mcp-get-weather", "LangChainChatBot"],
+    "weather_cache.py": ["mcp-get-weather", "LangChainChatBot"],
+    "approval_policy.py": ["LangChainChatBot", "nl2sql"],
+}
+
+
+@pytest.mark.parametrize("name", sorted(SHARED_MODULES))
+def test_shared_module_copies_are_identical(name):
+    paths = [os.path.join(ROOT, directory, name) for directory in SHARED_MODULES[name]]
+    present = [path for path in paths if os.path.exists(path)]
+    if len(present) < 2:
+        pytest.skip(f"{name} 的其它副本不在当前检出中")
+    for path in present[1:]:
+        assert filecmp.cmp(present[0], path, shallow=False), f"{path} 与 {present[0]} 不一致"
+
+
+def test_async_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    saver = SQLiteCheckpointer(str(tmp_path / "checkpoints.db"), maintenance_interval=None)
+    in_loop = []
+    put, put_writes = saver.put, saver.put_writes
+
+    def recording(method):
+        def wrapper(*args, **kwargs):
+            in_loop.append(_in_loop_thread())
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(saver, "put", recording(put))
+    monkeypatch.setattr(saver, "put_writes", recording(put_writes))
+
+    async def main():
+        config = {"configurable": {"thread_id": str(uuid.uuid4()), "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        saved = await saver.aput(config, checkpoint, {}, {})
+        await saver.aput_writes(saved, [("messages", "hi")], task_id="task")
+        return await saver.aget_tuple(saved)
+
+    try:
+        result = asyncio.run(main())
+    finally:
+        saver.close()
+
+    assert in_loop == [False, False]
+    assert result.checkpoint["id"] == result.config["configurable"]["checkpoint_id"]
+    assert result.pending_writes == [("task", "messages", "hi")]
+
+
+def _in_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
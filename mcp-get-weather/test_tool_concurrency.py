@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from tool_concurrency import ToolConcurrencyMiddleware
+
+# 越靠前的调用越慢：完成顺序与调用顺序相反
+DELAYS = [0.4, 0.3, 0.2, 0.1]
+
+
+class ToolCallingFakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def fake_model(tool_name: str) -> ToolCallingFakeModel:
+    calls = [{"name": tool_name, "args": {"index": i}, "id": f"call_{i}"} for i in range(len(DELAYS))]
+    return ToolCallingFakeModel(messages=iter([AIMessage(content="", tool_calls=calls), AIMessage(content="完成")]))
+
+
+@tool
+def slow_sync(index: int) -> str:
+    """同步的慢工具"""
+    time.sleep(DELAYS[index])
+    return f"result {index}"
+
+
+@tool
+async def slow_async(index: int) -> str:
+    """异步的慢工具"""
+    await asyncio.sleep(DELAYS[index])
+    return f"result {index}"
+
+
+def tool_results(result: dict) -> list[tuple[str, str]]:
+    return [(m.tool_call_id, m.content) for m in result["messages"] if m.type == "tool"]
+
+
+EXPECTED = [(f"call_{i}", f"result {i}") for i in range(len(DELAYS))]
+
+
+def test_async_calls_run_concurrently_in_call_order():
+    limit = ToolConcurrencyMiddleware(max_concurrency=4)
+    agent = create_agent(model=fake_model("slow_async"), tools=[slow_async], middleware=[limit])
+
+    start = time.perf_counter()
+    result = asyncio.run(agent.ainvoke({"messages": [("user", "hi")]}))
+
+    assert time.perf_counter() - start < sum(DELAYS)
+    assert tool_results(result) == EXPECTED
+    assert limit.stats()["max_in_flight"] == 4
+
+
+def test_sync_calls_respect_concurrency_cap():
+    limit = ToolConcurrencyMiddleware(max_concurrency=2)
+    agent = create_agent(model=fake_model("slow_sync"), tools=[slow_sync], middleware=[limit])
+
+    start = time.perf_counter()
+    result = agent.invoke({"messages": [("user", "hi")]})
+    elapsed = time.perf_counter() - start
+
+    assert tool_results(result) == EXPECTED
+    stats = limit.stats()
+    assert (stats["calls"], stats["max_in_flight"], stats["queued"]) == (4, 2, 2)
+    # 上限 2：至少需要两轮，但比逐个执行快
+    assert 0.5 <= elapsed < sum(DELAYS)
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+from weather_cache import WeatherCache, normalize_location
+
+ERROR = {"error": "No matching location found."}
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def weather(city: str) -> dict:
+    return {"location": {"name": city}, "current": {"temp_c": 21.0}}
+
+
+def test_normalize_location_folds_spelling_variants():
+    assert normalize_location(" Beijing ") == normalize_location("BEIJING") == normalize_location("beijing")
+    assert normalize_location("New   York") == "new york"
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = WeatherCache(ttl=600, negative_ttl=60, clock=clock)
+    cache.set("beijing", weather("Beijing"))
+
+    clock.now += 599
+    assert cache.get("beijing") == weather("Beijing")
+    clock.now += 1
+    assert cache.get("beijing") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_error_results_use_negative_ttl():
+    clock = FakeClock()
+    cache = WeatherCache(ttl=600, negative_ttl=60, clock=clock)
+    cache.set("atlantis", ERROR)
+
+    clock.now += 59
+    assert cache.get("atlantis") == ERROR
+    assert cache.stats()["negative_hits"] == 1
+    clock.now += 1
+    assert cache.get("atlantis") is None
+
+
+def test_zero_negative_ttl_does_not_cache_errors():
+    cache = WeatherCache(negative_ttl=0)
+    cache.set("atlantis", ERROR)
+
+    assert cache.get("atlantis") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = WeatherCache(maxsize=2)
+    cache.set("beijing", weather("Beijing"))
+    cache.set("shanghai", weather("Shanghai"))
+    cache.get("beijing")
+    cache.set("shenzhen", weather("Shenzhen"))
+
+    assert cache.get("shanghai") is None
+    assert cache.get("beijing") is not None
+    assert cache.get("shenzhen") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_persistent_cache_reloads_live_entries(tmp_path):
+    clock = FakeClock()
+    db_path = str(tmp_path / "weather.db")
+    cache = WeatherCache(ttl=600, negative_ttl=60, maxsize=2, db_path=db_path, clock=clock)
+    cache.set("atlantis", ERROR)
+    cache.set("beijing", weather("Beijing"))
+    cache.set("shanghai", weather("Shanghai"))
+    cache.set("shenzhen", weather("Shenzhen"))  # 淘汰 atlantis，对应的行也被删除
+    cache.close()
+
+    clock.now += 300
+    reloaded = WeatherCache(ttl=600, maxsize=2, db_path=db_path, clock=clock)
+    assert reloaded.get("shenzhen") == weather("Shenzhen")
+    assert reloaded.get("shanghai") == weather("Shanghai")
+    assert reloaded.get("atlantis") is None
+    reloaded.close()
+
+    clock.now += 301
+    expired = WeatherCache(db_path=db_path, clock=clock)
+    assert len(expired) == 0
+    expired.close()
+
+
+def test_persistent_writes_run_on_the_writer_thread(tmp_path):
+    cache = WeatherCache(db_path=str(tmp_path / "weather.db"))
+    threads = []
+    cache._db.set_trace_callback(lambda sql: threads.append(threading.current_thread().name))
+
+    async def main():
+        cache.set("beijing", weather("Beijing"))
+        cache.clear()
+
+    asyncio.run(main())
+    cache.flush()
+
+    assert threads and set(threads) == {"weather-cache-writer"}
+    cache.close()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+from langchain_mcp_adapters.sessions import create_session
+
+import weather_server
+from stub_weather_api import StubWeatherAPI
+
+
+@pytest.fixture
+def slow_upstream():
+    with StubWeatherAPI(delay=0.3) as stub:
+        original_url = weather_server.WEATHER_API_URL
+        weather_server.WEATHER_API_URL = stub.url
+        weather_server.weather_cache.clear()
+        try:
+            yield stub
+        finally:
+            weather_server.WEATHER_API_URL = original_url
+            weather_server.weather_cache.clear()
+
+
+async def _query_many(location: str, n: int) -> list[str]:
+    try:
+        return await asyncio.gather(*(weather_server.query_weather(location) for _ in range(n)))
+    finally:
+        await weather_server.close_http_client()
+
+
+def test_concurrent_identical_queries_share_one_upstream_request(slow_upstream):
+    results = asyncio.run(_query_many("Beijing", 100))
+
+    assert slow_upstream.requests == 1
+    assert len(set(results)) == 1
+    assert "Beijing" in results[0]
+    assert not weather_server._inflight
+
+
+def test_normalized_spellings_are_coalesced(slow_upstream):
+    async def run():
+        try:
+            return await asyncio.gather(
+                weather_server.query_weather("Beijing"),
+                weather_server.query_weather("beijing "),
+                weather_server.query_weather("BEIJING"),
+                weather_server.query_weather("Shanghai"),
+            )
+        finally:
+            await weather_server.close_http_client()
+
+    asyncio.run(run())
+
+    assert slow_upstream.requests == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_fetch(slow_upstream):
+    async def run():
+        try:
+            first = asyncio.ensure_future(weather_server.query_weather("Beijing"))
+            second = asyncio.ensure_future(weather_server.query_weather("Beijing"))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            return await second
+        finally:
+            await weather_server.close_http_client()
+
+    result = asyncio.run(run())
+
+    assert "Beijing" in result
+    assert slow_upstream.requests == 1
+
+
+def test_batch_reports_each_city_and_partial_failures(slow_upstream):
+    async def run():
+        try:
+            return await weather_server.query_weather_batch(["Beijing", "Atlantis", "Shenzhen"])
+        finally:
+            await weather_server.close_http_client()
+
+    result = asyncio.run(run())
+
+    blocks = result.strip().split("\n\n")
+    assert [block.splitlines()[0] for block in blocks] == ["[1] Beijing", "[2] Atlantis", "[3] Shenzhen"]
+    assert "Beijing" in blocks[0].splitlines()[2]
+    assert "error" in blocks[1]
+    assert "Shenzhen" in blocks[2].splitlines()[2]
+
+
+def test_batch_respects_concurrency_limit(slow_upstream, monkeypatch):
+    monkeypatch.setattr(weather_server, "BATCH_CONCURRENCY", 2)
+    cities = ["Beijing", "Shanghai", "Shenzhen", "Guangzhou"]
+
+    async def run():
+        try:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await weather_server.query_weather_batch(cities)
+            return loop.time() - start
+        finally:
+            await weather_server.close_http_client()
+
+    elapsed = asyncio.run(run())
+
+    assert slow_upstream.requests == 4
+    # 4 个城市、并发 2、每个请求 0.3s -> 至少两轮
+    assert elapsed >= 0.55
+
+
+def test_http_transport_shares_one_server_between_clients(slow_upstream):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "weather_server.py", "--transport", "streamable-http", "--port", str(port)],
+        env={**os.environ, "WEATHER_API_URL": slow_upstream.url, "OPENWEATHER_API_KEY": "test"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    connection = {"url": f"http://127.0.0.1:{port}/mcp", "transport": "streamable_http"}
+
+    async def query(location: str) -> str:
+        async with create_session(connection) as session:
+            await session.initialize()
+            result = await session.call_tool("query_weather", {"location": location})
+            return result.content[0].text
+
+    async def run():
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.1)
+        # 两个客户端先后连接同一个服务进程：第二个直接命中第一个留下的缓存
+        return [await query("Beijing"), await query("beijing")]
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    assert results[0] == results[1]
+    assert "Beijing" in results[0]
+    assert slow_upstream.requests == 1
+
+
+def test_upstream_receives_the_original_spelling(slow_upstream):
+    async def run():
+        try:
+            await weather_server.query_weather("  New York ")
+            return await weather_server.query_weather("new york")
+        finally:
+            await weather_server.close_http_client()
+
+    result = asyncio.run(run())
+
+    # 规范化只用于缓存 key：上游收到调用方的写法，第二次查询命中缓存
+    assert slow_upstream.queries == ["New York"]
+    assert "New York" in result
@@ -1,28 +1,123 @@
 import os 
 import json
+import asyncio
+import importlib.util
 import httpx
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP 
 
+from mcp_transport import parse_transport_args, run_server
+from weather_cache import WeatherCache, normalize_location
+
 
-mcp = FastMCP("WeatherServer")
 USER_AGENT = "weather-app/1.0"
 
 load_dotenv(override=True)
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://api.weatherapi.com/v1/current.json")
+
+# 连接池配置（可通过环境变量覆盖）
+HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "30"))
+# 仅在安装了 h2 时启用 HTTP/2，否则退回 HTTP/1.1 keep-alive
+HTTP2_ENABLED = (
+    os.getenv("WEATHER_HTTP2", "1") != "0"
+    and importlib.util.find_spec("h2") is not None
+)
+
+# 结果缓存配置：当前天气 10 分钟内有效，失败结果只缓存 1 分钟
+CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+CACHE_NEGATIVE_TTL = float(os.getenv("WEATHER_CACHE_NEGATIVE_TTL", "60"))
+CACHE_MAXSIZE = int(os.getenv("WEATHER_CACHE_MAXSIZE", "1024"))
+# 设置后使用 sqlite 持久化缓存，重启的 stdio 服务可以直接命中
+CACHE_DB = os.getenv("WEATHER_CACHE_DB") or None
+
+weather_cache = WeatherCache(
+    ttl=CACHE_TTL,
+    negative_ttl=CACHE_NEGATIVE_TTL,
+    maxsize=CACHE_MAXSIZE,
+    db_path=CACHE_DB,
+)
+
+# 批量查询时同时请求上游的最大城市数
+BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "5"))
+
+# 正在进行中的上游请求（single-flight），同一城市的并发查询共享同一个 Task
+_inflight: dict[str, asyncio.Task] = {}
+coalesced_requests = 0
+
+_http_client: httpx.AsyncClient | None = None
+_http_client_users = 0
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """按照连接池配置创建一个 AsyncClient"""
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
 
-async def get_weather(loc):
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    返回服务器生命周期内共享的 AsyncClient
+    未经过 lifespan 启动时（例如直接 import 调用 get_weather）按需创建
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """关闭共享的 AsyncClient，释放连接池"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+@asynccontextmanager
+async def http_client_lifespan(server: FastMCP) -> AsyncIterator[dict[str, Any]]:
+    """
+    FastMCP 启动时创建连接池，关闭时释放
+    HTTP 类传输会为每个会话进入一次 lifespan，因此用引用计数保证只在最后一个会话结束时关闭
+    """
+    global _http_client_users
+    _http_client_users += 1
+    try:
+        yield {"http_client": get_http_client()}
+    finally:
+        _http_client_users -= 1
+        if _http_client_users == 0:
+            await close_http_client()
+
+
+mcp = FastMCP("WeatherServer", lifespan=http_client_lifespan)
+
+
+async def get_weather(loc, client: httpx.AsyncClient | None = None):
     """
     查询即时天气函数
     :param loc: 必要参数，字符串类型，用于表示查询天气的具体城市名称，\
     注意，中国的城市需要用对应城市的英文名称代替，例如如果需要查询北京市天气，则loc参数需要输入'Beijing'；
+    :param client: 可选参数，指定使用的 AsyncClient，默认使用服务器共享的连接池
     :return：OpenWeather API查询即时天气的结果，具体URL请求地址为：https://api.openweathermap.org/data/2.5/weather\
     返回结果对象类型为解析之后的JSON格式对象，并用字符串形式进行表示，其中包含了全部重要的天气信息
     """
-    print("API KEY:" + OPENWEATHER_API_KEY)
     # Step 1.构建请求
-    url = "https://api.weatherapi.com/v1/current.json"
+    url = WEATHER_API_URL
 
     # Step 2.设置查询参数
     params = {
@@ -31,20 +126,47 @@ async def get_weather(loc):
         "aqi": "no",        
     }
 
-    headers = {"User-Agent": USER_AGENT}
+    client = client or get_http_client()
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        weather_data = response.json()
+        return weather_data
+    except httpx.HTTPStatusError as e:
+        print(f"HTTP error occurred: {e}")
+        return {"error": "HTTP error occurred while fetching weather data."}
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return {"error": "An unexpected error occurred while fetching weather data."}
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, params=params, headers=headers, timeout=30.0)
-            response.raise_for_status()
-            weather_data = response.json()
-            return weather_data
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred: {e}")
-            return {"error": "HTTP error occurred while fetching weather data."}
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            return {"error": "An unexpected error occurred while fetching weather data."}
+async def fetch_weather(location: str):
+    """
+    带缓存的天气查询：先按规范化后的城市名查缓存，未命中时调用 get_weather 并写回缓存
+    规范化只用于缓存 key，请求上游时使用调用方给出的原始城市名（去除首尾空白）
+    同一城市已有请求在进行时，直接等待该请求的结果，不再重复请求上游
+    :param location: 城市名称
+    :return: 与 get_weather 相同的天气数据对象
+    """
+    global coalesced_requests
+    key = normalize_location(location)
+    cached = weather_cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_and_cache(key, str(location).strip()))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        coalesced_requests += 1
+    # shield：某个调用方被取消时不影响其他正在等待的调用方
+    return await asyncio.shield(task)
+
+async def _fetch_and_cache(key: str, location: str):
+    weather_data = await get_weather(location)
+    weather_cache.set(key, weather_data)
+    return weather_data
 
 def format_weather(data: Any) -> str:
     """
@@ -99,9 +221,48 @@ async def query_weather(location: str) -> str:
     注意，中国的城市需要用对应城市的英文名称代替，例如如果需要查询北京市天气，则location参数需要输入'Beijing'；
     :return 格式化后的字符串，包含主要天气信息
     """
-    weather_data = await get_weather(location)
+    weather_data = await fetch_weather(location)
     formatted_weather = format_weather(weather_data)
     return formatted_weather
 
+@mcp.tool()
+async def query_weather_batch(locations: list[str]) -> str:
+    """
+    一次性查询多个城市的即时天气信息，适用于"比较北京、上海和深圳的天气"这类问题
+    :param locations: 必要参数，城市名称列表，中国的城市需要用对应城市的英文名称，例如 ['Beijing', 'Shanghai', 'Shenzhen']；
+    :return 按输入顺序拼接的格式化天气信息，某个城市查询失败时单独标注，不影响其他城市
+    """
+    if not locations:
+        return "请至少提供一个城市名称。"
+
+    semaphore = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+    async def fetch_one(location: str) -> str:
+        async with semaphore:
+            try:
+                weather_data = await fetch_weather(location)
+            except Exception as e:
+                return f"查询失败: {e}"
+        return format_weather(weather_data)
+
+    results = await asyncio.gather(*(fetch_one(location) for location in locations))
+    blocks = [
+        f"[{idx}] {location}\n{result.rstrip()}"
+        for idx, (location, result) in enumerate(zip(locations, results), start=1)
+    ]
+    return "\n\n".join(blocks) + "\n"
+
+@mcp.resource("weather://cache/stats", mime_type="application/json")
+def weather_cache_stats() -> str:
+    """天气缓存的命中、未命中、淘汰等统计信息"""
+    stats = weather_cache.stats()
+    stats["inflight"] = len(_inflight)
+    stats["coalesced"] = coalesced_requests
+    return json.dumps(stats, ensure_ascii=False)
+
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    args = parse_transport_args(port=8001)
+    if args.transport != "stdio":
+        # HTTP 传输下会话随客户端来去，引用计数可能归零；上游连接池改为随进程存活，供所有客户端共享
+        _http_client_users += 1
+    run_server(mcp, args)
\ No newline at end of file
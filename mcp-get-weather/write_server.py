@@ -1,14 +1,42 @@
+import asyncio
 import os
 from datetime import datetime
 from mcp.server.fastmcp import FastMCP
 
+from mcp_transport import parse_transport_args, run_server
+from note_journal import NoteJournal
+
 mcp = FastMCP("WriteServer")
 USER_AGENT = "write-app/1.0"
 
 OUTPUT_DIR = "./output"
+# files：每条笔记一个文件（默认）；journal：追加到 output/journal 下的分段日志，见 note_journal.py
+WRITE_MODE = os.getenv("WRITE_MODE", "files")
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+journal = NoteJournal() if WRITE_MODE == "journal" else None
+
+
+def _write_note_file(content: str) -> str:
+    """以独占方式新建笔记文件，同一时刻的多次写入不会互相覆盖"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    for attempt in range(100):
+        suffix = f"_{attempt}" if attempt else ""
+        filepath = os.path.join(OUTPUT_DIR, f"note_{timestamp}{suffix}.txt")
+        try:
+            with open(filepath, "x", encoding="utf-8") as file:
+                file.write(content)
+            return filepath
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"无法为时间戳 {timestamp} 创建新的笔记文件")
+
+
+def _format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
 @mcp.tool()
 async def write_to_file(content: str) -> str:
     """
@@ -16,16 +44,52 @@ async def write_to_file(content: str) -> str:
     :param content: 要写入的内容
     :return: 写入成功的结果和文件路径
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"note_{timestamp}.txt"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-
     try:
-        with open(filepath, "w", encoding="utf-8") as file:
-            file.write(content)
+        if journal is not None:
+            ref = await journal.append(content)
+            return f"内容已成功写入日志: 笔记 #{ref.id}（{ref.segment}，偏移 {ref.offset}）"
+        # 文件 IO 放到线程中执行，不阻塞事件循环
+        filepath = await asyncio.to_thread(_write_note_file, content)
         return f"内容已成功写入文件: {filepath}"
     except Exception as e:
         return f"写入文件时出错: {e}"
 
+
+@mcp.tool()
+async def search_notes(query: str = "", limit: int = 10) -> str:
+    """
+    在日志模式下按关键词搜索已写入的笔记（不区分大小写），按时间从新到旧返回
+    :param query: 关键词，留空则返回最近的笔记
+    :param limit: 最多返回的条数
+    :return: 每条笔记的编号、写入时间和内容摘要
+    """
+    if journal is None:
+        return "当前未开启日志模式（WRITE_MODE=journal），笔记以单独文件保存在 output 目录中"
+    results = await journal.search(query, max(1, min(limit, 100)))
+    if not results:
+        return f"没有找到包含“{query}”的笔记" if query else "日志中还没有笔记"
+    lines = []
+    for ref, content in results:
+        preview = content if len(content) <= 80 else content[:77] + "..."
+        lines.append(f"#{ref.id} [{_format_time(ref.timestamp)}] {preview}")
+    return "\n".join(lines)
+
+
+@mcp.tool()
+async def read_note(note_id: int) -> str:
+    """
+    在日志模式下按编号读取一条笔记的完整内容
+    :param note_id: 笔记编号（write_to_file 或 search_notes 返回的 #编号）
+    :return: 笔记内容
+    """
+    if journal is None:
+        return "当前未开启日志模式（WRITE_MODE=journal），笔记以单独文件保存在 output 目录中"
+    result = await journal.read(note_id)
+    if result is None:
+        return f"笔记 #{note_id} 不存在"
+    ref, content = result
+    return f"笔记 #{ref.id} [{_format_time(ref.timestamp)}]\n{content}"
+
+
 if __name__ == "__main__":
-    mcp.run(transport='stdio') 
\ No newline at end of file
+    run_server(mcp, parse_transport_args(port=8002))
@@ -0,0 +1,231 @@
+"""
+带审批策略的 HITL 中间件
+
+HumanInTheLoopMiddleware 对 interrupt_on 中的工具每次都会中断：写 checkpoint、暂停图、等待人工、再恢复。
+PolicyHumanInTheLoopMiddleware 在中断之前先按工具名调用审批策略：
+- 策略判定安全的调用直接放行，不产生中断
+- 其余调用照常交给人工审批，审批界面的描述中附带策略拒绝自动批准的原因
+- 一次模型回复中的调用全部被策略放行时，本轮完全不中断
+- 策略只在模型生成工具调用时评估一次，结论记录在 AIMessage.response_metadata["approval_policy"] 中，
+  随消息写入 checkpoint；中断恢复时 after_model 重新执行，直接使用记录的结论，
+  即使此期间策略的判断（如代价估算、表行数）发生变化，交给人工的调用也与审批回答一一对应
+
+审批策略是一个可调用对象：policy(tool_call) -> (是否自动批准, 原因)。
+AllowListPolicy 按正则白名单匹配工具参数（例如搜索关键词），正则必须匹配整个参数值；
+SEARCH_ALLOW_PATTERNS 是只描述天气、汇率这类查询本身的默认搜索白名单。
+
+stats() 返回中断率与节省的端到端延迟估算：
+被避免的中断次数 × 平均人工等待时间（已观测到人工审批时取实测平均值，否则取 assumed_human_wait）。
+
+nl2sql、LangChainChatBot 各有一份本文件，修改时请保持两份一致（mcp-get-weather/test_shared_modules.py 会检查）。
+"""
+import collections
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+from langchain.agents.middleware import AgentState, HumanInTheLoopMiddleware, ModelResponse
+from langchain_core.messages import AIMessage, ToolCall
+from langgraph.runtime import Runtime
+
+logger = logging.getLogger(__name__)
+
+ApprovalPolicy = Callable[[ToolCall], tuple[bool, str]]
+
+# AIMessage.response_metadata 中记录策略结论的 key：tool_call_id -> [是否自动批准, 原因]
+VERDICT_METADATA_KEY = "approval_policy"
+
+# 等待人工审批的消息最多记录多少条（用于计算人工等待时间，未恢复的中断不会无限累积）
+MAX_PENDING = 1000
+
+# 默认的搜索关键词白名单：每条正则描述整个查询，"北京天气 + 任意内容" 不会被自动批准
+SEARCH_ALLOW_PATTERNS = [
+    r"\w{1,10}\s?(天气|气温)(预报|情况|怎么样|如何)?[?？]?",
+    r"\w{1,10}\s?汇率(是多少)?[?？]?",
+    r"([a-z.'-]+ ){1,3}(weather|temperature)( forecast| today| tomorrow)?\??",
+    r"(weather|temperature)( forecast)? (in|for)( [a-z.'-]+){1,3}( today| tomorrow)?\??",
+    r"[a-z]{3}( to |/)[a-z]{3} exchange rate\??",
+    r"exchange rate( of)? [a-z]{3}( to |/)[a-z]{3}\??",
+]
+
+
+class AllowListPolicy:
+    """
+    参数完整匹配白名单正则时自动批准
+    :param patterns: 正则表达式列表，使用 re.fullmatch 匹配（去掉首尾空白后），忽略大小写
+    :param arg: 要检查的工具参数名
+    """
+
+    def __init__(self, patterns: Iterable[str], arg: str = "query"):
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.arg = arg
+
+    def __call__(self, tool_call: ToolCall) -> tuple[bool, str]:
+        value = str(tool_call["args"].get(self.arg, "")).strip()
+        for pattern in self.patterns:
+            if pattern.fullmatch(value):
+                return True, f"匹配白名单 {pattern.pattern}"
+        return False, "不在自动批准的白名单内"
+
+
+class PolicyHumanInTheLoopMiddleware(HumanInTheLoopMiddleware):
+    """
+    先按策略自动审批、只把剩余调用交给人工的 HITL 中间件
+    :param interrupt_on: 与 HumanInTheLoopMiddleware 相同
+    :param policies: 工具名 -> 审批策略；没有策略的工具全部交给人工
+    :param description_prefix: 与 HumanInTheLoopMiddleware 相同
+    :param assumed_human_wait: 尚未观测到人工审批时，每次中断假定的人工等待时间（秒）
+    """
+
+    def __init__(
+        self,
+        interrupt_on: dict[str, Any],
+        *,
+        policies: dict[str, ApprovalPolicy] | None = None,
+        description_prefix: str = "Tool execution requires approval",
+        assumed_human_wait: float = 10.0,
+    ):
+        super().__init__(interrupt_on=interrupt_on, description_prefix=description_prefix)
+        self.policies = policies or {}
+        self.assumed_human_wait = assumed_human_wait
+        self._lock = threading.Lock()
+        # 等待人工审批的消息 -> 中断开始时间；恢复时 after_model 会重新执行，据此计算人工等待时间
+        self._pending: collections.OrderedDict[str, float] = collections.OrderedDict()
+        # 交给人工的调用 id -> 策略给出的原因，用于审批描述
+        self._reasons: dict[str, str] = {}
+        self._counts = collections.Counter()
+        self._human_wait_total = 0.0
+
+    def _evaluate(self, tool_call: ToolCall) -> tuple[bool, str]:
+        policy = self.policies.get(tool_call["name"])
+        if policy is None:
+            return False, "该工具没有配置自动审批策略"
+        try:
+            return policy(tool_call)
+        except Exception as e:
+            logger.warning("审批策略执行失败，交给人工审批: %s", e)
+            return False, f"审批策略执行失败：{e}"
+
+    def _record_verdicts(self, response: ModelResponse | AIMessage) -> ModelResponse | AIMessage:
+        """在模型返回的 AIMessage 上记录每个需审批调用的策略结论"""
+        messages = response.result if isinstance(response, ModelResponse) else [response]
+        for message in messages:
+            if not isinstance(message, AIMessage):
+                continue
+            verdicts = {
+                call["id"]: list(self._evaluate(call))
+                for call in message.tool_calls
+                if call["name"] in self.interrupt_on
+            }
+            if verdicts:
+                message.response_metadata[VERDICT_METADATA_KEY] = verdicts
+        return response
+
+    def wrap_model_call(self, request, handler):
+        return self._record_verdicts(handler(request))
+
+    async def awrap_model_call(self, request, handler):
+        return self._record_verdicts(await handler(request))
+
+    def _create_action_and_config(self, tool_call, config, state, runtime):
+        action_request, review_config = super()._create_action_and_config(tool_call, config, state, runtime)
+        reason = self._reasons.get(tool_call["id"])
+        if reason:
+            action_request["description"] = f"{action_request['description']}\n\n未自动批准：{reason}"
+        return action_request, review_config
+
+    def after_model(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        messages = state["messages"]
+        last_ai_msg = next((msg for msg in reversed(messages) if isinstance(msg, AIMessage)), None)
+        if not last_ai_msg or not last_ai_msg.tool_calls:
+            return None
+        gated = [call for call in last_ai_msg.tool_calls if call["name"] in self.interrupt_on]
+        if not gated:
+            return None
+
+        key = last_ai_msg.id or ",".join(call["id"] for call in gated)
+        with self._lock:
+            resuming = key in self._pending
+
+        # 恢复时使用模型生成调用时记录的结论，不重新评估；没有记录的消息（例如手工构造的状态）才在这里评估
+        verdicts = last_ai_msg.response_metadata.get(VERDICT_METADATA_KEY, {})
+        auto_approved, escalated = set(), []
+        for call in gated:
+            approved, reason = verdicts[call["id"]] if call["id"] in verdicts else self._evaluate(call)
+            if approved:
+                auto_approved.add(call["id"])
+            else:
+                escalated.append(call)
+                self._reasons[call["id"]] = reason
+            if not resuming:
+                logger.info("工具调用 %s %s：%s", call["name"], "自动批准" if approved else "交给人工审批", reason)
+
+        if not resuming:
+            with self._lock:
+                self._counts["tool_calls"] += len(gated)
+                self._counts["auto_approved"] += len(auto_approved)
+                self._counts["escalated"] += len(escalated)
+                if escalated:
+                    self._counts["interrupts"] += 1
+                    self._pending[key] = time.perf_counter()
+                    while len(self._pending) > MAX_PENDING:
+                        self._pending.popitem(last=False)
+                else:
+                    self._counts["interrupts_avoided"] += 1
+        if not escalated:
+            return None
+
+        # 只把需要人工审批的调用交给父类中断；恢复后按原顺序合并回自动批准的调用
+        filtered = last_ai_msg.model_copy(
+            update={"tool_calls": [call for call in last_ai_msg.tool_calls if call["id"] not in auto_approved]}
+        )
+        try:
+            result = super().after_model(
+                {**state, "messages": [filtered if msg is last_ai_msg else msg for msg in messages]},
+                runtime,
+            )
+        finally:
+            for call in escalated:
+                self._reasons.pop(call["id"], None)
+
+        with self._lock:
+            started = self._pending.pop(key, None)
+            if started is not None:
+                self._counts["human_reviews"] += 1
+                self._human_wait_total += time.perf_counter() - started
+
+        reviewed, *tool_messages = result["messages"]
+        revised = {call["id"]: call for call in reviewed.tool_calls}
+        last_ai_msg.tool_calls = [
+            call if call["id"] in auto_approved else revised[call["id"]]
+            for call in last_ai_msg.tool_calls
+            if call["id"] in auto_approved or call["id"] in revised
+        ]
+        return {"messages": [last_ai_msg, *tool_messages]}
+
+    async def aafter_model(self, state: AgentState, runtime: Runtime) -> dict[str, Any] | None:
+        return self.after_model(state, runtime)
+
+    def stats(self) -> dict[str, Any]:
+        """自动审批统计：中断率、人工等待时间与节省的延迟估算"""
+        with self._lock:
+            counts = dict(self._counts)
+            human_wait_total = self._human_wait_total
+        tool_calls = counts.get("tool_calls", 0)
+        interrupts = counts.get("interrupts", 0)
+        avoided = counts.get("interrupts_avoided", 0)
+        reviews = counts.get("human_reviews", 0)
+        human_wait_avg = human_wait_total / reviews if reviews else self.assumed_human_wait
+        return {
+            "tool_calls": tool_calls,
+            "auto_approved": counts.get("auto_approved", 0),
+            "escalated": counts.get("escalated", 0),
+            "interrupts": interrupts,
+            "interrupts_avoided": avoided,
+            "interrupt_rate": interrupts / (interrupts + avoided) if interrupts + avoided else 0.0,
+            "human_reviews": reviews,
+            "human_wait_avg_s": human_wait_avg,
+            "latency_saved_s": avoided * human_wait_avg,
+        }
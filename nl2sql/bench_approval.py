@@ -0,0 +1,97 @@
+"""
+自动审批基准：每条 SQL 都人工审批 vs 按策略自动审批（sql_policy.ReadOnlySQLPolicy）
+
+使用离线回放模型跑评测问题（默认 eval_questions.jsonl），人工审批用固定的等待时间模拟，
+审批结果与 run_batch.py 的 read-only 策略一致。分别统计：
+- 中断次数与中断率（中断次数 / 发起 SQL 的模型回复数）
+- 全部问题的端到端耗时，以及两种模式之间实际节省的时间
+- 中间件自身统计的节省时间估算（get_approval_stats）
+
+用法：
+    python bench_approval.py --human-wait 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+from langgraph.types import Command
+
+import nl2sql
+from replay_model import ReplayChatModel
+from run_batch import decide, load_questions
+
+
+async def run_question(agent, question: str, human_wait: float) -> tuple[float, int]:
+    config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex[:8]}"}}
+    inputs = {"messages": [HumanMessage(content=question)]}
+    interrupts = 0
+    start = time.perf_counter()
+    while inputs is not None:
+        pending = None
+        async for payload in agent.astream(inputs, config=config, stream_mode="updates"):
+            if "__interrupt__" in payload:
+                pending = payload["__interrupt__"]
+        inputs = None
+        if pending:
+            interrupts += 1
+            # 模拟人工阅读并审批
+            await asyncio.sleep(human_wait)
+            decisions = [decide(action, "read-only") for action in pending[0].value["action_requests"]]
+            inputs = Command(resume={"decisions": decisions})
+    return time.perf_counter() - start, interrupts
+
+
+async def run_mode(questions, auto_approve: bool, human_wait: float) -> dict:
+    os.environ["SQL_AUTO_APPROVE"] = "1" if auto_approve else "0"
+    reference_sql = {q["question"]: q["sql"] for q in questions if q.get("sql")}
+    agent = nl2sql.create_nl2sql_agent(model=ReplayChatModel(reference_sql=reference_sql))
+    latencies, interrupts = [], 0
+    for item in questions:
+        latency, count = await run_question(agent, item["question"], human_wait)
+        latencies.append(latency)
+        interrupts += count
+    return {
+        "latencies": latencies,
+        "interrupts": interrupts,
+        "stats": nl2sql.get_approval_stats(agent),
+    }
+
+
+async def main(args):
+    questions = load_questions(args.questions)
+    sql_turns = sum(1 for q in questions if q.get("sql"))
+    results = {}
+    for auto_approve in (False, True):
+        results[auto_approve] = await run_mode(questions, auto_approve, args.human_wait)
+
+    print(f"{len(questions)} 个问题（{sql_turns} 个会执行 SQL），模拟人工审批耗时 {args.human_wait}s")
+    print(f"{'模式':<10}{'中断':>6}{'中断率':>10}{'总耗时(s)':>12}{'p50(s)':>10}{'max(s)':>10}")
+    for auto_approve, label in ((False, "全部人工"), (True, "策略审批")):
+        result = results[auto_approve]
+        latencies = result["latencies"]
+        print(
+            f"{label:<10}{result['interrupts']:>6}{result['interrupts'] / sql_turns:>10.0%}"
+            f"{sum(latencies):>12.2f}{statistics.median(latencies):>10.3f}{max(latencies):>10.3f}"
+        )
+    saved = sum(results[False]["latencies"]) - sum(results[True]["latencies"])
+    stats = results[True]["stats"]
+    print(
+        f"实际节省 {saved:.2f}s；中间件估算节省 {stats['latency_saved_s']:.2f}s"
+        f"（避免 {stats['interrupts_avoided']} 次中断 × 平均人工等待 {stats['human_wait_avg_s']:.2f}s）"
+    )
+    print(f"策略审批统计: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", nargs="?", default=str(nl2sql.BASE_DIR / "eval_questions.jsonl"))
+    parser.add_argument("--human-wait", type=float, default=0.5, help="模拟的人工审批耗时（秒）")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHECKPOINT_DB"] = os.path.join(tmp, "checkpoints.db")
+        asyncio.run(main(args))
@@ -0,0 +1,90 @@
+"""
+并发会话压测：每个会话各自创建 SQLDatabase（旧方式）vs 共享只读 Engine
+
+模拟 N 个并发会话，每个会话在自己的线程中依次执行一组固定 SQL（与 Agent 常见查询类似），
+统计总吞吐、单条查询 p50/p99 以及实际打开的 SQLite 连接数。
+查询结果缓存在两种模式下都关闭，只比较连接与执行路径。
+
+用法：
+    python bench_concurrency.py --sessions 32 --rounds 20
+"""
+import argparse
+import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from database import CachedSQLDatabase, get_readonly_engine
+
+CANNED_SQL = [
+    "SELECT COUNT(*) FROM Track",
+    "SELECT g.Name, COUNT(*) FROM Track t JOIN Genre g ON t.GenreId = g.GenreId GROUP BY g.Name ORDER BY 2 DESC LIMIT 5",
+    "SELECT c.Country, ROUND(SUM(i.Total), 2) FROM Invoice i JOIN Customer c ON i.CustomerId = c.CustomerId "
+    "GROUP BY c.Country ORDER BY 2 DESC LIMIT 5",
+    "SELECT ar.Name, COUNT(*) FROM Album a JOIN Artist ar ON a.ArtistId = ar.ArtistId GROUP BY ar.Name ORDER BY 2 DESC LIMIT 5",
+    "SELECT e.LastName, COUNT(c.CustomerId) FROM Employee e LEFT JOIN Customer c ON c.SupportRepId = e.EmployeeId "
+    "GROUP BY e.EmployeeId",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(mode: str, db_path: pathlib.Path, sessions: int, rounds: int) -> None:
+    connections = 0
+    counter_lock = threading.Lock()
+
+    def count_connect(*_):
+        nonlocal connections
+        with counter_lock:
+            connections += 1
+
+    # 在 Pool 类上监听，统计本模式下所有 Engine 新建的连接
+    event.listen(Pool, "connect", count_connect)
+    if mode == "shared":
+        engine = get_readonly_engine(db_path, pool_size=sessions)
+        shared_db = CachedSQLDatabase(engine, query_cache_bytes=0)
+
+    latencies: list[float] = []
+
+    def session(index: int) -> None:
+        if mode == "shared":
+            db = shared_db
+        else:
+            db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
+        local = []
+        for i in range(rounds):
+            sql = CANNED_SQL[(index + i) % len(CANNED_SQL)]
+            start = time.perf_counter()
+            db.run_no_throw(sql)
+            local.append(time.perf_counter() - start)
+        with counter_lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    elapsed = time.perf_counter() - start
+    event.remove(Pool, "connect", count_connect)
+
+    print(
+        f"{mode:<11} sessions={sessions} queries={len(latencies)} total={elapsed:.2f}s "
+        f"qps={len(latencies) / elapsed:7.1f} p50={percentile(latencies, 50) * 1000:6.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:6.1f}ms connections={connections}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(pathlib.Path(__file__).parent / "Chinook.db"), help="SQLite 数据库路径")
+    parser.add_argument("--sessions", type=int, default=32, help="并发会话数")
+    parser.add_argument("--rounds", type=int, default=20, help="每个会话执行的查询数")
+    args = parser.parse_args()
+    for mode in ("per-session", "shared"):
+        run(mode, pathlib.Path(args.db).resolve(), args.sessions, args.rounds)
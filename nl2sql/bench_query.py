@@ -0,0 +1,70 @@
+"""
+sql_db_query 结果序列化基准：SQLDatabase 原有的元组列表输出 vs 分批读取的列式输出
+
+对 Chinook.db 上的几条大结果集 join 分别统计：
+- 耗时（p50，多次运行）
+- tracemalloc 峰值内存
+- 返回给模型的字符串大小
+
+用法：
+    python bench_query.py --repeat 5
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from database import CachedSQLDatabase
+
+QUERIES = {
+    "track_album_artist": """
+        SELECT t.Name, a.Title, ar.Name, t.Composer, t.Milliseconds
+        FROM Track t JOIN Album a ON t.AlbumId = a.AlbumId JOIN Artist ar ON a.ArtistId = ar.ArtistId
+    """,
+    "invoiceline_full": """
+        SELECT il.InvoiceLineId, i.InvoiceDate, c.FirstName, c.LastName, c.Country, t.Name, g.Name, il.UnitPrice
+        FROM InvoiceLine il
+        JOIN Invoice i ON il.InvoiceId = i.InvoiceId
+        JOIN Customer c ON i.CustomerId = c.CustomerId
+        JOIN Track t ON il.TrackId = t.TrackId
+        JOIN Genre g ON t.GenreId = g.GenreId
+    """,
+    "track_x_genre": """
+        SELECT t.TrackId, t.Name, g.Name FROM Track t CROSS JOIN Genre g
+    """,
+}
+
+
+def measure(db: CachedSQLDatabase, query: str, repeat: int) -> tuple[float, float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.run(query)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    output = db.run(query)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, len(output.encode("utf-8"))
+
+
+def main(db_path: str, repeat: int):
+    dbs = {
+        "repr": CachedSQLDatabase.from_uri(f"sqlite:///{db_path}", query_cache_bytes=0, result_format="repr"),
+        "columnar": CachedSQLDatabase.from_uri(f"sqlite:///{db_path}", query_cache_bytes=0, result_format="columnar"),
+    }
+    for name, query in QUERIES.items():
+        for mode, db in dbs.items():
+            elapsed, peak, size = measure(db, query, repeat)
+            print(
+                f"{name:<20} {mode:<9} p50={elapsed * 1000:8.1f}ms "
+                f"peak={peak / 1024 / 1024:7.2f}MB output={size / 1024:9.1f}KB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="Chinook.db", help="SQLite 数据库路径")
+    parser.add_argument("--repeat", type=int, default=5, help="每条查询的重复次数")
+    args = parser.parse_args()
+    main(args.db, args.repeat)
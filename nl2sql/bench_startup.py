@@ -0,0 +1,78 @@
+"""
+NL2SQL 启动基准：冷启动（导入 + 构建 Agent + 首个 token）与缓存命中时的构建耗时
+
+每次测量都在新的子进程中进行，使用不调用网络的假模型，分别记录：
+- import：导入 nl2sql 模块
+- build：第一次 create_nl2sql_agent
+- first_token：第一次 stream 输出第一个 token
+- rebuild：同一进程内再次调用 create_nl2sql_agent（命中缓存）
+
+用法：
+    python bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+WORKER = r"""
+import json, time
+t0 = time.perf_counter()
+import nl2sql
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+t1 = time.perf_counter()
+
+
+class FakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+model = FakeModel(messages=iter([AIMessage(content="Chinook 数据库中共有 3503 首曲目。")] * 10))
+agent = nl2sql.create_nl2sql_agent(model=model)
+t2 = time.perf_counter()
+for chunk, _ in agent.stream(
+    {"messages": [HumanMessage(content="一共有多少首曲目？")]},
+    {"configurable": {"thread_id": "bench"}},
+    stream_mode="messages",
+):
+    if chunk.content:
+        break
+t3 = time.perf_counter()
+nl2sql.create_nl2sql_agent(model=model)
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "build": t2 - t1, "first_token": t3 - t2, "rebuild": t4 - t3}))
+"""
+
+
+def main(runs: int):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CHECKPOINT_DB=os.path.join(tmp, "checkpoints.db"))
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", WORKER],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for phase in ("import", "build", "first_token", "rebuild"):
+        values = [r[phase] * 1000 for r in results]
+        print(f"{phase:<12} median={statistics.median(values):8.2f}ms min={min(values):8.2f}ms")
+    total = [(r["import"] + r["build"] + r["first_token"]) * 1000 for r in results]
+    print(f"{'cold->token':<12} median={statistics.median(total):8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="子进程次数")
+    args = parser.parse_args()
+    main(args.runs)
@@ -0,0 +1,111 @@
+"""
+打字机输出基准：原有逐字 sleep 输出 vs 按帧批量输出的 TypewriterRenderer
+
+模拟一个以固定速度流式产出 token 的模型，回答总长 --chars 个字符，对比：
+- legacy：等整段回答生成完，再逐字 write + flush 并 sleep 20ms
+- frames：token 到达后按帧输出，不做节奏控制
+- paced：按帧输出并控制节奏（自适应追赶，不落后模型超过 max_lag）
+- skip：paced 模式下开始输出 0.2 秒后用户跳过
+
+统计首字延迟、总耗时和实际的 write 系统调用次数（输出写入 /dev/null）。
+
+用法：
+    python bench_typewriter.py --chars 2000
+"""
+import argparse
+import os
+import threading
+import time
+
+from run_typewriter import TypewriterRenderer
+
+
+class CountingOutput:
+    """write 只写缓冲区，flush 时调用一次 os.write，并统计系统调用次数"""
+
+    def __init__(self):
+        self.fd = os.open(os.devnull, os.O_WRONLY)
+        self.buffer = []
+        self.syscalls = 0
+        self.first_write_at = None
+
+    def write(self, text: str) -> int:
+        self.buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.first_write_at is None:
+            self.first_write_at = time.perf_counter()
+        os.write(self.fd, "".join(self.buffer).encode("utf-8"))
+        self.buffer.clear()
+        self.syscalls += 1
+
+    def close(self):
+        os.close(self.fd)
+
+
+def fake_tokens(chars: int, token_chars: int, model_cps: float):
+    """以 model_cps 字符/秒的速度产出 token"""
+    text = ("查询结果显示，摇滚类曲目数量最多。" * (chars // 17 + 1))[:chars]
+    interval = token_chars / model_cps
+    for i in range(0, len(text), token_chars):
+        time.sleep(interval)
+        yield text[i:i + token_chars]
+
+
+def run_legacy(args) -> tuple[float, float, int]:
+    out = CountingOutput()
+    start = time.perf_counter()
+    answer = "".join(fake_tokens(args.chars, args.token_chars, args.model_cps))
+    for char in answer:
+        out.write(char)
+        out.flush()
+        time.sleep(args.legacy_delay)
+    out.write("\n")
+    out.flush()
+    elapsed = time.perf_counter() - start
+    out.close()
+    return out.first_write_at - start, elapsed, out.syscalls
+
+
+def run_renderer(args, cps: float | None, skip_after: float | None = None) -> tuple[float, float, int]:
+    out = CountingOutput()
+    start = time.perf_counter()
+    renderer = TypewriterRenderer(fps=args.fps, chars_per_second=cps, out=out, skip_on_enter=False)
+    if skip_after is not None:
+        threading.Timer(skip_after, renderer.skip).start()
+    for token in fake_tokens(args.chars, args.token_chars, args.model_cps):
+        renderer.feed(token)
+    renderer.close()
+    elapsed = time.perf_counter() - start
+    out.close()
+    return out.first_write_at - start, elapsed, out.syscalls
+
+
+def main(args):
+    generation = args.chars / args.model_cps
+    print(f"回答 {args.chars} 字符，模型生成耗时约 {generation:.2f}s，fps={args.fps}")
+    modes = {
+        "frames": lambda: run_renderer(args, cps=None),
+        "paced": lambda: run_renderer(args, cps=args.cps),
+        "skip": lambda: run_renderer(args, cps=args.cps, skip_after=0.2),
+    }
+    if not args.no_legacy:
+        modes = {"legacy": lambda: run_legacy(args), **modes}
+    for name, run in modes.items():
+        first, elapsed, syscalls = run()
+        print(f"{name:<7} first_char={first * 1000:8.1f}ms total={elapsed:7.2f}s write_syscalls={syscalls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=2000, help="回答长度（字符）")
+    parser.add_argument("--token-chars", type=int, default=4, help="每个 token 的字符数")
+    parser.add_argument("--model-cps", type=float, default=800, help="模型输出速度（字符/秒）")
+    parser.add_argument("--fps", type=float, default=30, help="渲染帧率")
+    parser.add_argument("--cps", type=float, default=120, help="paced 模式的目标打字速度（字符/秒）")
+    parser.add_argument("--legacy-delay", type=float, default=0.02, help="legacy 模式每个字符的 sleep 秒数")
+    parser.add_argument("--no-legacy", action="store_true", help="跳过耗时很长的 legacy 模式")
+    main(parser.parse_args())
@@ -0,0 +1,666 @@
+"""
+NL2SQL 使用的 SQLDatabase 扩展
+
+CachedSQLDatabase 在启动时为每张表预先生成表信息（CREATE TABLE + 示例行），
+之后 sql_db_schema / sql_db_list_tables 直接从内存返回，不再重复反射和查询示例行。
+
+缓存通过数据库指纹失效：文件 mtime / 大小变化时再读取 PRAGMA schema_version，
+三者任一变化都会重新生成。缓存同时写入数据库旁的 sidecar 文件（<db>.schema.json），
+冷启动时指纹一致即可跳过反射。
+
+sql_db_query 的结果同样按 (规范化 SQL, 指纹) 缓存在内存中，数据库文件变化后自动失效；
+查询在执行和缓存前都会经过只读检查。
+
+查询结果以 fetchmany 分批读取，按行数 / 字节预算截断，输出为紧凑的列式文本：
+表头只出现一次，其后每行一条记录，超出预算时附带截断说明和总行数。
+
+get_readonly_engine 为同一个 SQLite 文件返回进程内共享的只读 Engine：
+URI mode=ro 打开、连接池大小与并发 worker 数一致、连接时设置 mmap_size / cache_size / query_only，
+并通过 progress handler 取消超过 statement_timeout 的查询。
+
+estimate_query_cost 通过 EXPLAIN QUERY PLAN 粗略估算一条查询要扫描的行数和返回的行数，
+供审批策略（sql_policy.py）判断查询是否足够便宜、可以自动执行。
+
+执行前的代价检查（cost_guard）：估算扫描行数超过 max_scan_rows 时，
+可以流式执行的查询改写为带 LIMIT 的查询，其余直接拒绝；两种情况都把查询计划作为结果返回给 Agent。
+执行超过 slow_query_ms、被改写、被拒绝或超时的查询记录到慢查询日志（默认 <db>.slow.jsonl），
+index_advisor.py 读取该日志给出覆盖索引建议。
+"""
+import re
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Literal, Optional, Sequence, Union
+
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import URL, Engine, Result
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import Executable
+
+from query_cache import (
+    QueryRejected,
+    QueryResultCache,
+    check_read_only,
+    limit_of,
+    normalize_sql,
+    table_aliases,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE_VERSION = 1
+QUERY_CACHE_MAX_BYTES = int(os.getenv("SQL_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESULT_FORMAT = os.getenv("SQL_RESULT_FORMAT", "columnar")
+RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "100"))
+RESULT_MAX_BYTES = int(os.getenv("SQL_RESULT_MAX_BYTES", "8000"))
+FETCH_BATCH_SIZE = int(os.getenv("SQL_FETCH_BATCH_SIZE", "500"))
+COLUMN_SEPARATOR = " | "
+
+POOL_SIZE = int(os.getenv("NL2SQL_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+STATEMENT_TIMEOUT = float(os.getenv("SQL_STATEMENT_TIMEOUT", "10"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+# 代价检查：rewrite（能加 LIMIT 时改写，否则拒绝）/ reject（一律拒绝）/ off
+COST_GUARD = os.getenv("SQL_COST_GUARD", "rewrite")
+MAX_SCAN_ROWS = int(os.getenv("SQL_MAX_SCAN_ROWS", "1000000"))
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SQL_SLOW_QUERY_LOG")
+# progress handler 每执行多少条 SQLite VM 指令检查一次超时
+PROGRESS_HANDLER_STEPS = 10000
+
+# EXPLAIN QUERY PLAN 中的表访问行，例如 "SCAN t" / "SEARCH g USING INTEGER PRIMARY KEY (rowid=?)"
+_PLAN_ACCESS_RE = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)")
+_PLAN_UNIQUE_RE = re.compile(r"INTEGER PRIMARY KEY|USING (?:COVERING )?INDEX sqlite_autoindex|\(rowid=\?\)")
+_AGGREGATE_RE = re.compile(r"^SELECT\s+(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(")
+
+_engines: dict[tuple, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_readonly_engine(
+    db_path: str | os.PathLike,
+    *,
+    pool_size: int = POOL_SIZE,
+    statement_timeout: float | None = STATEMENT_TIMEOUT,
+    mmap_size: int = SQLITE_MMAP_SIZE,
+    cache_size_kb: int = SQLITE_CACHE_SIZE_KB,
+) -> Engine:
+    """
+    获取 SQLite 文件的共享只读 Engine，相同路径与参数只创建一次
+    :param db_path: 数据库文件路径
+    :param pool_size: 连接池大小，应与并发 worker 数一致
+    :param statement_timeout: 单条查询（含读取结果）的超时秒数，None 或 0 表示不限制
+    :param mmap_size: PRAGMA mmap_size（字节）
+    :param cache_size_kb: PRAGMA cache_size（KiB）
+    """
+    path = pathlib.Path(db_path).resolve()
+    key = (str(path), pool_size, statement_timeout, mmap_size, cache_size_kb)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _create_readonly_engine(path, pool_size, statement_timeout, mmap_size, cache_size_kb)
+            _engines[key] = engine
+        return engine
+
+
+def _create_readonly_engine(
+    path: pathlib.Path,
+    pool_size: int,
+    statement_timeout: float | None,
+    mmap_size: int,
+    cache_size_kb: int,
+) -> Engine:
+    if not path.exists():
+        # mode=ro 不会创建文件，提前给出清晰的错误
+        raise FileNotFoundError(f"数据库文件不存在: {path}")
+    url = URL.create("sqlite+pysqlite", database=f"file:{path}", query={"mode": "ro", "uri": "true"})
+    engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=30,
+        connect_args={"check_same_thread": False},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size = {-int(cache_size_kb)}")
+        cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+        if statement_timeout:
+            deadline = connection_record.info["deadline"] = [None]
+
+            def _progress_handler() -> int:
+                # 返回非 0 时 SQLite 中断当前语句，抛出 OperationalError: interrupted
+                return 1 if deadline[0] is not None and time.monotonic() > deadline[0] else 0
+
+            dbapi_connection.set_progress_handler(_progress_handler, PROGRESS_HANDLER_STEPS)
+
+    if statement_timeout:
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _start_timer(conn, cursor, statement, parameters, context, executemany):
+            # 计时覆盖执行与后续的 fetchmany，直到连接归还连接池
+            conn.info["deadline"][0] = time.monotonic() + statement_timeout
+
+        @event.listens_for(engine, "checkin")
+        def _stop_timer(dbapi_connection, connection_record):
+            if "deadline" in connection_record.info:
+                connection_record.info["deadline"][0] = None
+
+    engine.statement_timeout = statement_timeout
+    return engine
+
+
+def _sqlite_file(engine: Engine) -> str | None:
+    """SQLite Engine 对应的文件路径，兼容 file: URI 形式"""
+    if engine.dialect.name != "sqlite" or not engine.url.database:
+        return None
+    database = engine.url.database
+    if engine.url.query.get("uri") == "true" and database.startswith("file:"):
+        database = database.removeprefix("file:")
+    return None if database == ":memory:" else database
+
+
+class QueryTooExpensive(QueryRejected):
+    """估算代价超过上限且无法改写的查询"""
+
+
+def format_query_plan(plan: list[tuple[int, int, str]]) -> str:
+    """把 explain_query_plan 的结果格式化为缩进的树形文本"""
+    depths: dict[int, int] = {}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth = depths.get(parent, -1) + 1
+        depths[node_id] = depth
+        lines.append(f"{'  ' * depth}- {detail}")
+    return "\n".join(lines)
+
+
+def is_statement_timeout(error: BaseException) -> bool:
+    orig = getattr(error, "orig", None)
+    return isinstance(orig, sqlite3.OperationalError) and "interrupted" in str(orig)
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """
+    带表信息缓存的 SQLDatabase
+    :param engine: SQLAlchemy Engine
+    :param schema_cache_path: sidecar 文件路径，默认为 SQLite 文件名加 .schema.json；传入 False 关闭落盘
+    :param query_cache_bytes: 查询结果缓存的字节上限，0 表示关闭结果缓存
+    :param result_format: "columnar" 使用分批读取的列式输出；"repr" 保持 SQLDatabase 原有的元组列表输出
+    :param max_result_rows: 列式输出最多包含的数据行数
+    :param max_result_bytes: 列式输出的字节上限（UTF-8）
+    :param fetch_batch_size: 每次 fetchmany 读取的行数
+    :param cost_guard: 执行前代价检查方式，"rewrite" / "reject" / "off"
+    :param max_scan_rows: 代价检查允许的估算扫描行数上限
+    :param slow_query_ms: 执行时间超过该值（毫秒）的查询记入慢查询日志
+    :param slow_query_log: 慢查询日志路径，默认为 SQLite 文件名加 .slow.jsonl；传入 False 关闭
+    其余参数与 SQLDatabase 相同
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        *,
+        schema_cache_path: Optional[str | bool] = None,
+        query_cache_bytes: int = QUERY_CACHE_MAX_BYTES,
+        result_format: Literal["columnar", "repr"] = RESULT_FORMAT,
+        max_result_rows: int = RESULT_MAX_ROWS,
+        max_result_bytes: int = RESULT_MAX_BYTES,
+        fetch_batch_size: int = FETCH_BATCH_SIZE,
+        cost_guard: Literal["rewrite", "reject", "off"] = COST_GUARD,
+        max_scan_rows: int = MAX_SCAN_ROWS,
+        slow_query_ms: float = SLOW_QUERY_MS,
+        slow_query_log: Optional[str | bool] = SLOW_QUERY_LOG,
+        **kwargs: Any,
+    ):
+        # 反射推迟到确实需要重建缓存时进行
+        kwargs["lazy_table_reflection"] = True
+        super().__init__(engine, **kwargs)
+        self._db_file = _sqlite_file(engine)
+        if schema_cache_path is None and self._db_file:
+            schema_cache_path = f"{self._db_file}.schema.json"
+        self._schema_cache_path = schema_cache_path or None
+        self._schema_lock = threading.RLock()
+        self._building = False
+        self._stat_key: tuple | None = None
+        self._fingerprint: str | None = None
+        self._cached_fingerprint: str | None = None
+        self._table_order: list[str] = []
+        self._table_infos: dict[str, str] = {}
+        self.query_cache = QueryResultCache(query_cache_bytes) if query_cache_bytes > 0 else None
+        self._query_cache_fingerprint: str | None = None
+        self.result_format = result_format
+        self.max_result_rows = max_result_rows
+        self.max_result_bytes = max_result_bytes
+        self.fetch_batch_size = fetch_batch_size
+        self.cost_guard = cost_guard
+        self.max_scan_rows = max_scan_rows
+        self.slow_query_ms = slow_query_ms
+        if slow_query_log is None and self._db_file:
+            slow_query_log = f"{self._db_file}.slow.jsonl"
+        self.slow_query_log = slow_query_log or None
+        self._slow_log_lock = threading.Lock()
+        self._row_counts: dict[str, int] = {}
+        self._row_counts_fingerprint: str | None = None
+        self.refresh_schema_cache()
+
+    # ---- 指纹 ----
+
+    def _stat_signature(self) -> tuple | None:
+        if not self._db_file or not os.path.exists(self._db_file):
+            return None
+        signature = []
+        for path in (self._db_file, f"{self._db_file}-wal"):
+            if os.path.exists(path):
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    @property
+    def fingerprint(self) -> str:
+        """当前数据库指纹；文件状态未变时直接复用上次的结果"""
+        stat_key = self._stat_signature()
+        if self._fingerprint is not None and stat_key is not None and stat_key == self._stat_key:
+            return self._fingerprint
+        with self._engine.connect() as conn:
+            if self.dialect == "sqlite":
+                schema_version = conn.execute(text("PRAGMA schema_version")).scalar()
+            else:
+                schema_version = 0
+        self._stat_key = stat_key
+        self._fingerprint = f"{schema_version}:{stat_key}"
+        return self._fingerprint
+
+    # ---- 表信息缓存 ----
+
+    def refresh_schema_cache(self, force: bool = False) -> None:
+        """指纹变化（或 force）时重建表信息缓存"""
+        with self._schema_lock:
+            fingerprint = self.fingerprint
+            if not force and self._table_infos and fingerprint == self._cached_fingerprint:
+                return
+            if not force and self._load_sidecar(fingerprint):
+                return
+            self._build(fingerprint)
+            self._save_sidecar()
+
+    def _build(self, fingerprint: str) -> None:
+        # Inspector 会缓存查询结果，表结构变化后需要重新创建
+        self._inspector = inspect(self._engine)
+        self._all_tables = set(
+            list(self._inspector.get_table_names(schema=self._schema))
+            + (self._inspector.get_view_names(schema=self._schema) if self._view_support else [])
+        )
+        names = list(SQLDatabase.get_usable_table_names(self))
+        self._metadata.clear()
+        self._metadata.reflect(
+            views=self._view_support,
+            bind=self._engine,
+            only=names,
+            schema=self._schema,
+        )
+        order = [
+            tbl.name
+            for tbl in self._metadata.sorted_tables
+            if tbl.name in names and not (self.dialect == "sqlite" and tbl.name.startswith("sqlite_"))
+        ]
+        self._building = True
+        try:
+            self._table_infos = {name: SQLDatabase.get_table_info(self, [name]) for name in order}
+        finally:
+            self._building = False
+        self._table_order = order
+        self._cached_fingerprint = fingerprint
+        logger.info("已重建表信息缓存：%d 张表", len(order))
+
+    def _load_sidecar(self, fingerprint: str) -> bool:
+        if not self._schema_cache_path or not os.path.exists(self._schema_cache_path):
+            return False
+        try:
+            with open(self._schema_cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != SCHEMA_CACHE_VERSION or data.get("fingerprint") != fingerprint:
+            return False
+        self._table_order = data["order"]
+        self._table_infos = data["tables"]
+        self._cached_fingerprint = fingerprint
+        return True
+
+    def _save_sidecar(self) -> None:
+        if not self._schema_cache_path:
+            return
+        payload = {
+            "version": SCHEMA_CACHE_VERSION,
+            "fingerprint": self._cached_fingerprint,
+            "order": self._table_order,
+            "tables": self._table_infos,
+        }
+        tmp_path = f"{self._schema_cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self._schema_cache_path)
+        except OSError as e:
+            logger.warning("表信息缓存写入失败: %s", e)
+
+    # ---- SQLDatabase 接口 ----
+
+    def get_usable_table_names(self):
+        # 父类 __init__ 以及重建缓存时父类的 get_table_info 会在缓存就绪前调用本方法
+        if not hasattr(self, "_schema_lock") or self._building:
+            return super().get_usable_table_names()
+        self.refresh_schema_cache()
+        return sorted(self._table_infos)
+
+    def get_table_info(self, table_names: Optional[List[str]] = None, get_col_comments: bool = False) -> str:
+        if get_col_comments:
+            return super().get_table_info(table_names, get_col_comments)
+        self.refresh_schema_cache()
+        if table_names is not None:
+            missing_tables = set(table_names).difference(self._table_infos)
+            if missing_tables:
+                raise ValueError(f"table_names {missing_tables} not found in database")
+            wanted = set(table_names)
+            names = [name for name in self._table_order if name in wanted]
+        else:
+            names = self._table_order
+        return "\n\n".join(self._table_infos[name] for name in names)
+
+    def run(
+        self,
+        command: Union[str, Executable],
+        fetch: Literal["all", "one", "cursor"] = "all",
+        include_columns: bool = False,
+        *,
+        parameters: Optional[Dict[str, Any]] = None,
+        execution_options: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Sequence[Dict[str, Any]], Result[Any]]:
+        if not isinstance(command, str):
+            return super().run(
+                command, fetch, include_columns, parameters=parameters, execution_options=execution_options
+            )
+        # 先做只读检查，被拒绝的语句既不执行也不进入缓存
+        check_read_only(command)
+        if fetch == "cursor" or execution_options:
+            return super().run(
+                command, fetch, include_columns, parameters=parameters, execution_options=execution_options
+            )
+        if self.query_cache is None:
+            return self._guarded_execute(command, fetch, include_columns, parameters)
+
+        fingerprint = self.fingerprint
+        if fingerprint != self._query_cache_fingerprint:
+            # 数据库文件变化后旧结果全部作废
+            self.query_cache.clear()
+            self._query_cache_fingerprint = fingerprint
+        key = (
+            normalize_sql(command),
+            fetch,
+            include_columns,
+            tuple(sorted((parameters or {}).items())),
+            fingerprint,
+        )
+        result = self.query_cache.get(key)
+        if result is None:
+            result = self._guarded_execute(command, fetch, include_columns, parameters)
+            self.query_cache.set(key, result)
+        return result
+
+    def _guarded_execute(self, command: str, fetch: str, include_columns: bool, parameters: Optional[Dict[str, Any]]):
+        """代价检查 + 执行 + 慢查询记录；被拒绝的查询抛出 QueryTooExpensive"""
+        executed, cost, note = self._guard_cost(command)
+        start = time.perf_counter()
+        try:
+            result = self._run_uncached(executed, fetch, include_columns, parameters)
+        except OperationalError as e:
+            if is_statement_timeout(e):
+                self._log_slow_query(command, "timeout", (time.perf_counter() - start) * 1000, cost)
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if note:
+            self._log_slow_query(command, "rewritten", elapsed_ms, cost)
+            if isinstance(result, str):
+                result = f"{result}\n{note}" if result else note
+        elif elapsed_ms >= self.slow_query_ms:
+            self._log_slow_query(command, "slow", elapsed_ms, cost)
+        return result
+
+    def _guard_cost(self, command: str) -> tuple[str, Optional[dict[str, Any]], Optional[str]]:
+        """
+        执行前的代价检查
+        :return: (实际执行的 SQL, 代价估算, 附加在结果之后的说明)
+        """
+        if self.cost_guard == "off" or self.dialect != "sqlite":
+            return command, None, None
+        try:
+            cost = self.estimate_query_cost(command)
+        except SQLAlchemyError:
+            # 语法错误等无法生成计划的查询交给真正的执行去报错
+            return command, None, None
+        # 可流式执行且自带较小 LIMIT 的查询读到足够的行就会停止，实际扫描量远小于估算
+        bounded = cost["streaming"] and cost["limit"] is not None and cost["limit"] <= self.max_result_rows
+        if cost["scan_rows"] <= self.max_scan_rows or bounded:
+            return command, cost, None
+
+        plan = format_query_plan(cost["plan"])
+        reason = f"估算扫描 {cost['scan_rows']} 行，超过上限 {self.max_scan_rows} 行"
+        if cost["full_scans"]:
+            reason += f"（全表扫描：{', '.join(dict.fromkeys(cost['full_scans']))}）"
+        if self.cost_guard == "rewrite" and cost["streaming"]:
+            rewritten = f"SELECT * FROM ({command.strip().rstrip(';')}) LIMIT {self.max_result_rows}"
+            note = f"（查询{reason}，已自动添加 LIMIT {self.max_result_rows}，结果可能不完整）\n查询计划：\n{plan}"
+            return rewritten, cost, note
+
+        self._log_slow_query(command, "rejected", None, cost)
+        raise QueryTooExpensive(
+            f"查询代价过高，未执行：{reason}。"
+            f"请添加 WHERE 条件、通过索引列关联，或先聚合再关联以缩小扫描范围。\n查询计划：\n{plan}"
+        )
+
+    def _log_slow_query(
+        self, command: str, action: str, elapsed_ms: Optional[float], cost: Optional[dict[str, Any]]
+    ) -> None:
+        """追加一条慢查询记录（JSONL），写入失败只记录警告"""
+        if not self.slow_query_log:
+            return
+        if cost is None:
+            try:
+                cost = self.estimate_query_cost(command)
+            except SQLAlchemyError:
+                cost = {}
+        record = {
+            "ts": time.time(),
+            "action": action,
+            "sql": command,
+            "elapsed_ms": round(elapsed_ms, 2) if elapsed_ms is not None else None,
+            "scan_rows": cost.get("scan_rows"),
+            "result_rows": cost.get("result_rows"),
+            "plan": [detail for _, _, detail in cost.get("plan", [])],
+        }
+        try:
+            with self._slow_log_lock, open(self.slow_query_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning("慢查询日志写入失败: %s", e)
+
+    def _run_uncached(self, command: str, fetch: str, include_columns: bool, parameters: Optional[Dict[str, Any]]):
+        if fetch == "all" and self.result_format == "columnar" and self._schema is None:
+            return self.run_columnar(command, parameters=parameters)
+        return super().run(command, fetch, include_columns, parameters=parameters)
+
+    def run_columnar(self, command: str, *, parameters: Optional[Dict[str, Any]] = None) -> str:
+        """
+        分批读取查询结果并输出列式文本，超出行数 / 字节预算的部分只计数不保留
+        :param command: 只读 SQL
+        :param parameters: 绑定参数
+        :return: 表头 + 数据行 + 截断说明；语句不返回行时为空字符串
+        """
+        with self._engine.connect() as connection:
+            cursor = connection.execute(text(command), parameters or {})
+            if not cursor.returns_rows:
+                return ""
+            header = COLUMN_SEPARATOR.join(str(key) for key in cursor.keys())
+            lines = [header]
+            used_bytes = len(header.encode("utf-8")) + 1
+            shown = 0
+            total = 0
+            full = False
+            while True:
+                batch = cursor.fetchmany(self.fetch_batch_size)
+                if not batch:
+                    break
+                total += len(batch)
+                if full:
+                    # 预算已满：剩余的行只计数，不做格式化
+                    continue
+                for row in batch:
+                    line = COLUMN_SEPARATOR.join(self._format_value(value) for value in row)
+                    line_bytes = len(line.encode("utf-8")) + 1
+                    if shown >= self.max_result_rows or used_bytes + line_bytes > self.max_result_bytes:
+                        full = True
+                        break
+                    lines.append(line)
+                    used_bytes += line_bytes
+                    shown += 1
+            cursor.close()
+
+        if full:
+            lines.append(
+                f"（结果已截断：共 {total} 行，仅显示前 {shown} 行。"
+                f"请使用 LIMIT、WHERE 或聚合函数缩小结果集）"
+            )
+        else:
+            lines.append(f"（共 {total} 行）")
+        return "\n".join(lines)
+
+    def _format_value(self, value: Any) -> str:
+        if value is None:
+            return "NULL"
+        value = truncate_word(value, length=self._max_string_length)
+        return str(value).replace("\n", " ").replace("|", "/")
+
+    def run_no_throw(
+        self,
+        command: str,
+        fetch: Literal["all", "one"] = "all",
+        include_columns: bool = False,
+        *,
+        parameters: Optional[Dict[str, Any]] = None,
+        execution_options: Optional[Dict[str, Any]] = None,
+    ) -> Union[str, Sequence[Dict[str, Any]], Result[Any]]:
+        try:
+            return self.run(
+                command, fetch, include_columns, parameters=parameters, execution_options=execution_options
+            )
+        except QueryRejected as e:
+            return f"Error: {e}"
+        except OperationalError as e:
+            if is_statement_timeout(e):
+                timeout = getattr(self._engine, "statement_timeout", None)
+                return f"Error: 查询执行超过 {timeout} 秒已被取消，请添加 WHERE / LIMIT 或改用聚合缩小查询范围"
+            return f"Error: {e}"
+        except SQLAlchemyError as e:
+            return f"Error: {e}"
+
+    # ---- 查询计划 ----
+
+    def table_row_counts(self) -> dict[str, int]:
+        """各表的行数，按数据库指纹缓存"""
+        fingerprint = self.fingerprint
+        with self._schema_lock:
+            if fingerprint != self._row_counts_fingerprint:
+                counts = {}
+                with self._engine.connect() as conn:
+                    for name in self.get_usable_table_names():
+                        quoted = self._engine.dialect.identifier_preparer.quote(name)
+                        counts[name] = conn.execute(text(f"SELECT COUNT(*) FROM {quoted}")).scalar() or 0
+                self._row_counts = counts
+                self._row_counts_fingerprint = fingerprint
+            return self._row_counts
+
+    def explain_query_plan(self, command: str) -> list[tuple[int, int, str]]:
+        """
+        返回 SQLite 的查询计划 [(id, parent, detail)]
+        语句先经过只读检查；EXPLAIN QUERY PLAN 只编译不执行
+        """
+        check_read_only(command)
+        with self._engine.connect() as conn:
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {command.strip().rstrip(';')}")).fetchall()
+        return [(row[0], row[1], row[3]) for row in rows]
+
+    def estimate_query_cost(self, command: str) -> dict[str, Any]:
+        """
+        根据查询计划粗略估算查询代价
+        - 同一层级的 SCAN / SEARCH 是嵌套循环，行数相乘；子查询各自一层，结果相加
+        - SCAN 按整表行数计；按主键 / 唯一索引等值查找的 SEARCH 计 1 行，其它 SEARCH 按表行数的 1/10 计
+        - 返回行数：有常量 LIMIT 时取 LIMIT，聚合查询（无 GROUP BY）为 1，
+          GROUP BY 取最外层涉及的最小表的行数（分组通常按维度表），否则等于最外层的扫描行数
+        :return: {
+            "plan": explain_query_plan 的结果, "scan_rows": 估算扫描行数, "result_rows": 估算返回行数,
+            "full_scans": 全表扫描的表, "limit": 顶层 LIMIT, "streaming": 是否无需排序 / 分组 / 聚合即可逐行输出
+        }
+        """
+        plan = self.explain_query_plan(command)
+        counts = self.table_row_counts()
+        aliases = table_aliases(command)
+        default_rows = max(counts.values(), default=0)
+
+        levels: dict[int, int] = {}
+        top_level_tables: list[int] = []
+        full_scans = []
+        for node_id, parent, detail in plan:
+            match = _PLAN_ACCESS_RE.match(detail)
+            if not match:
+                continue
+            access, name = match.group(1), match.group(2)
+            table = aliases.get(name, name)
+            table_rows = counts.get(table, default_rows)
+            if access == "SCAN":
+                rows = table_rows
+                full_scans.append(table)
+            elif _PLAN_UNIQUE_RE.search(detail):
+                rows = 1
+            else:
+                rows = max(1, table_rows // 10)
+            levels[parent] = levels.get(parent, 1) * max(rows, 1)
+            if parent == 0:
+                top_level_tables.append(table_rows)
+
+        scan_rows = sum(levels.values())
+        upper = f" {normalize_sql(command)} "
+        top_rows = levels.get(0, scan_rows)
+        aggregate = False
+        if " GROUP BY " in upper:
+            top_rows = min(top_level_tables + [top_rows])
+            aggregate = True
+        elif _AGGREGATE_RE.search(upper.strip()):
+            top_rows = 1
+            aggregate = True
+        limit = limit_of(command)
+        result_rows = min(limit, top_rows) if limit is not None else top_rows
+        return {
+            "plan": plan,
+            "scan_rows": scan_rows,
+            "result_rows": result_rows,
+            "full_scans": full_scans,
+            "limit": limit,
+            "streaming": not aggregate and not any("USE TEMP B-TREE" in detail for _, _, detail in plan),
+        }
+
+    def query_cache_stats(self) -> dict[str, Any]:
+        """查询结果缓存的命中/未命中/淘汰统计"""
+        return self.query_cache.stats() if self.query_cache else {}
@@ -0,0 +1,258 @@
+"""
+离线索引建议
+
+读取 CachedSQLDatabase 记录的慢查询日志（默认 Chinook.db.slow.jsonl，包括执行慢、被改写、被拒绝和超时的查询），
+对查询计划中的全表扫描（不含 COVERING INDEX 的 SCAN）给出覆盖索引建议：
+- 索引前缀：WHERE / ON 中引用的列，其后依次是 GROUP BY、ORDER BY 的列
+- 其余在查询中引用到的该表的列追加在后面，使查询只读索引即可完成（SELECT t.* 的表只建前缀）
+- INTEGER PRIMARY KEY 是 rowid，所有索引都隐含，不放进索引
+- 已有索引的列以建议的列开头时不再重复建议
+
+每条建议都在数据库的内存副本上实际创建索引，对比建索引前后的查询计划与执行耗时，
+没有让查询变快的建议不会采纳；采纳的建议按节省的总耗时（单次节省 × 出现次数）排序。
+本工具只输出 DDL，不修改数据库文件（Agent 以只读方式打开数据库）。
+
+用法：
+    python index_advisor.py                       # 使用默认数据库与慢查询日志
+    python index_advisor.py --log Chinook.db.slow.jsonl -o indexes.sql
+"""
+import argparse
+import collections
+import json
+import sqlite3
+import time
+from typing import Any
+
+import nl2sql
+from database import CachedSQLDatabase, get_readonly_engine
+from query_cache import column_references, normalize_sql, table_aliases
+
+KEY_CLAUSES = ("WHERE", "ON", "GROUP BY", "ORDER BY")
+
+
+def load_slow_queries(path: str) -> list[dict[str, Any]]:
+    """读取慢查询日志，按规范化 SQL 去重，按出现次数降序返回"""
+    queries: dict[str, dict[str, Any]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = normalize_sql(record["sql"])
+            item = queries.setdefault(key, {"sql": record["sql"], "count": 0, "actions": collections.Counter()})
+            item["count"] += 1
+            item["actions"][record["action"]] += 1
+    return sorted(queries.values(), key=lambda item: -item["count"])
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> tuple[list[str], str | None]:
+    """返回 (列名列表, INTEGER PRIMARY KEY 列名)"""
+    rows = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+    columns = [row[1] for row in rows]
+    primary = [row for row in rows if row[5]]
+    rowid_alias = primary[0][1] if len(primary) == 1 and primary[0][2].upper() == "INTEGER" else None
+    return columns, rowid_alias
+
+
+def existing_indexes(conn: sqlite3.Connection, table: str) -> list[list[str]]:
+    indexes = []
+    for row in conn.execute(f"PRAGMA index_list({_quote(table)})").fetchall():
+        indexes.append([info[2] for info in conn.execute(f"PRAGMA index_info({_quote(row[1])})").fetchall()])
+    return indexes
+
+
+def suggest_indexes(conn: sqlite3.Connection, sql: str, plan: list[tuple[int, int, str]]) -> list[tuple[str, list[str]]]:
+    """
+    为查询计划中的全表扫描给出覆盖索引建议
+    :return: [(表名, 索引列)]
+    """
+    # SQL 中的表名不区分大小写，统一为 sqlite_master 中的写法
+    canonical = {row[0].lower(): row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = {
+        alias: canonical[table.lower()]
+        for alias, table in table_aliases(sql).items()
+        if table.lower() in canonical
+    }
+    tables = set(aliases.values())
+    schema = {table: table_columns(conn, table) for table in tables}
+    lower_columns = {table: {c.lower(): c for c in columns} for table, (columns, _) in schema.items()}
+
+    keys: dict[str, list[str]] = collections.defaultdict(list)
+    others: dict[str, list[str]] = collections.defaultdict(list)
+    star: set[str] = set()
+    for qualifier, column, clause in column_references(sql):
+        if qualifier is not None:
+            owners = [aliases[qualifier]] if qualifier in aliases else []
+        elif column == "*":
+            owners = list(tables)
+        else:
+            owners = [t for t in tables if column.lower() in lower_columns[t]]
+            if len(owners) != 1:
+                # 不是列（关键字、别名）或有歧义
+                continue
+        for table in owners:
+            if column == "*":
+                star.add(table)
+                continue
+            name = lower_columns[table].get(column.lower())
+            if name is None:
+                continue
+            target = keys if clause in KEY_CLAUSES else others
+            if name not in target[table]:
+                target[table].append(name)
+
+    suggestions = []
+    for _, _, detail in plan:
+        if not detail.startswith("SCAN ") or "COVERING INDEX" in detail:
+            continue
+        table = aliases.get(detail.split()[1])
+        if table is None:
+            continue
+        _, rowid_alias = schema[table]
+        prefix = [c for c in keys[table] if c != rowid_alias]
+        if not prefix:
+            # 没有过滤、关联或排序列的全表扫描，索引帮不上忙
+            continue
+        columns = list(prefix)
+        if table not in star:
+            columns += [c for c in others[table] if c not in columns and c != rowid_alias]
+        if any(index[: len(columns)] == columns for index in existing_indexes(conn, table)):
+            continue
+        if (table, columns) not in suggestions:
+            suggestions.append((table, columns))
+    return suggestions
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def index_name(table: str, columns: list[str]) -> str:
+    return f"idx_{table}_{'_'.join(columns)}".lower()
+
+
+def index_ddl(table: str, columns: list[str]) -> str:
+    return (
+        f"CREATE INDEX IF NOT EXISTS {_quote(index_name(table, columns))} "
+        f"ON {_quote(table)} ({', '.join(_quote(c) for c in columns)});"
+    )
+
+
+def time_query(conn: sqlite3.Connection, sql: str, timeout: float, repeat: int = 3) -> float | None:
+    """执行查询的最短耗时（毫秒）；超过 timeout 秒返回 None"""
+    best = None
+    for _ in range(repeat):
+        deadline = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        start = time.perf_counter()
+        try:
+            conn.execute(sql).fetchall()
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                return None
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> list[tuple[int, int, str]]:
+    return [(row[0], row[1], row[3]) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}")]
+
+
+def _format_ms(value: float | None, timeout: float) -> str:
+    return f">{timeout * 1000:.0f}ms" if value is None else f"{value:.1f}ms"
+
+
+def advise(db_path: str, log_path: str, timeout: float) -> list[dict[str, Any]]:
+    db = CachedSQLDatabase(
+        get_readonly_engine(db_path), query_cache_bytes=0, cost_guard="off", slow_query_log=False
+    )
+    queries = load_slow_queries(log_path)
+    # 在内存副本上试建索引，不修改数据库文件
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    memory = sqlite3.connect(":memory:")
+    source.backup(memory)
+    source.close()
+
+    advice: dict[str, dict[str, Any]] = {}
+    for item in queries:
+        sql = item["sql"]
+        try:
+            plan = db.explain_query_plan(sql)
+        except Exception as e:
+            print(f"跳过无法生成计划的查询：{sql}（{e}）")
+            continue
+        suggestions = suggest_indexes(memory, sql, plan)
+        if not suggestions:
+            continue
+        before_ms = time_query(memory, sql, timeout)
+        ddls = [index_ddl(table, columns) for table, columns in suggestions]
+        for ddl in ddls:
+            memory.execute(ddl)
+        after_plan = explain(memory, sql)
+        after_ms = time_query(memory, sql, timeout)
+        for table, columns in suggestions:
+            memory.execute(f"DROP INDEX {_quote(index_name(table, columns))}")
+        if after_ms is None or (before_ms is not None and after_ms >= before_ms):
+            print(f"未采纳（建索引后没有变快）：{' '.join(ddls)}\n  查询：{sql}")
+            continue
+        # 超时的查询按 timeout 计算节省的时间
+        saved_ms = (before_ms if before_ms is not None else timeout * 1000) - after_ms
+        for ddl in ddls:
+            entry = advice.setdefault(ddl, {"ddl": ddl, "queries": [], "count": 0, "saved_ms": 0.0})
+            entry["count"] += item["count"]
+            entry["saved_ms"] += saved_ms * item["count"]
+            entry["queries"].append(
+                {
+                    "sql": sql,
+                    "count": item["count"],
+                    "actions": dict(item["actions"]),
+                    "plan_before": [detail for _, _, detail in plan],
+                    "plan_after": [detail for _, _, detail in after_plan],
+                    "before_ms": before_ms,
+                    "after_ms": after_ms,
+                }
+            )
+    memory.close()
+    return sorted(advice.values(), key=lambda entry: -entry["saved_ms"])
+
+
+def print_report(advice: list[dict[str, Any]], timeout: float) -> None:
+    if not advice:
+        print("没有需要建议的索引。")
+        return
+    for number, entry in enumerate(advice, start=1):
+        print(f"\n建议 {number}：{entry['ddl']}")
+        print(
+            f"  受益查询 {len(entry['queries'])} 条，共出现 {entry['count']} 次，"
+            f"累计节省约 {entry['saved_ms']:.1f}ms"
+        )
+        for query in entry["queries"]:
+            actions = ", ".join(f"{k}×{v}" for k, v in query["actions"].items())
+            print(f"  - {query['sql']}（{actions}）")
+            print(f"    计划：{' / '.join(query['plan_before'])}")
+            print(f"       → {' / '.join(query['plan_after'])}")
+            print(
+                f"    耗时：{_format_ms(query['before_ms'], timeout)} → {_format_ms(query['after_ms'], timeout)}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(nl2sql.DEFAULT_DB_PATH), help="SQLite 数据库路径")
+    parser.add_argument("--log", help="慢查询日志路径，默认为 <db>.slow.jsonl")
+    parser.add_argument("--timeout", type=float, default=10.0, help="测量单条查询耗时的上限（秒）")
+    parser.add_argument("-o", "--output", help="把建议的 DDL 写入该文件")
+    args = parser.parse_args()
+
+    log_path = args.log or f"{args.db}.slow.jsonl"
+    print(f"慢查询日志：{log_path}")
+    result = advise(args.db, log_path, args.timeout)
+    print_report(result, args.timeout)
+    if args.output and result:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write("\n".join(entry["ddl"] for entry in result) + "\n")
+        print(f"\nDDL 已写入 {args.output}")
@@ -1,94 +1,219 @@
+import hashlib
 import os
 import pathlib
+import threading
 import warnings
+import weakref
+from collections import OrderedDict
 warnings.filterwarnings("ignore", category=UserWarning)
 
 from langchain.agents import create_agent
-from langchain.agents.middleware import HumanInTheLoopMiddleware
-from langchain_openai import ChatOpenAI
 
-from langgraph.checkpoint.memory import InMemorySaver
 # from langgraph.types import Command
 
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
-
 from dotenv import load_dotenv
 
-def create_nl2sql_agent(verbose=False):
-    """创建并返回配置好的 NL2SQL Agent"""
-    load_dotenv(override=True)
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME", "gpt-5-mini")
+from approval_policy import PolicyHumanInTheLoopMiddleware
+from database import CachedSQLDatabase, get_readonly_engine
+from history_middleware import HistoryBudgetMiddleware
+from sql_policy import AUTO_APPROVE_MAX_COST, AUTO_APPROVE_MAX_ROWS, ReadOnlySQLPolicy
+from sqlite_checkpointer import get_checkpointer
+
+BASE_DIR = pathlib.Path(__file__).parent
+DEFAULT_DB_PATH = BASE_DIR / "Chinook.db"
+DEFAULT_PROMPT_PATH = BASE_DIR / "prompt.txt"
+
+# HITL 配置：需要人工审批的工具
+INTERRUPT_ON = {"sql_db_query": True}
+
+# 最多缓存的 Agent 数：每个缓存项都持有模型实例与编译后的图，超出时淘汰最久未使用的
+MAX_CACHED_AGENTS = int(os.getenv("NL2SQL_MAX_CACHED_AGENTS", "8"))
+
+# 已构建的 Agent 及其工具，按 (模型, 数据库路径, 提示词哈希, checkpoint 文件, 中间件配置) 缓存；
+# 编译后的图可在线程间共享
+_agents: OrderedDict[tuple, tuple[object, list]] = OrderedDict()
+# agent -> 该 Agent 的 HITL 中间件，用于读取自动审批统计；Agent 被释放后自动移除
+_approvals: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_databases: dict[str, CachedSQLDatabase] = {}
+_build_lock = threading.RLock()
+_env_loaded = False
+
+
+def _load_env():
+    """只在第一次创建 Agent 时读取 .env"""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv(override=True)
+        _env_loaded = True
+
+
+def _create_model(model_name: str):
+    # langchain_openai 导入较慢，只在真正需要 OpenAI 模型时导入
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model_name=model_name,
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+
+def get_database(db_path: str | os.PathLike = DEFAULT_DB_PATH) -> CachedSQLDatabase:
+    """同一个数据库文件只创建一次 CachedSQLDatabase，所有会话共享同一个只读 Engine"""
+    key = str(pathlib.Path(db_path).resolve())
+    with _build_lock:
+        db = _databases.get(key)
+        if db is None:
+            # 表信息在启动时预先生成（或从 Chinook.db.schema.json 加载），之后直接从内存返回
+            db = _databases[key] = CachedSQLDatabase(get_readonly_engine(key))
+        return db
+
+
+def _read_prompt(prompt_path: pathlib.Path) -> str | None:
+    if not prompt_path.exists():
+        return None
+    with open(prompt_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _render_prompt(prompt_content: str | None, db: CachedSQLDatabase) -> str:
+    """把 prompt.txt 中的占位符替换为数据库信息"""
+    if prompt_content is None:
+        # 如果文件不存在，使用默认提示
+        return "你是一个专业的SQL数据分析Agent。"
+    # 移除开头的 "system_prompt = f""" 和结尾的 """（如果存在）
+    if prompt_content.startswith('system_prompt = f"""'):
+        prompt_content = prompt_content[18:]  # 移除 "system_prompt = f"""
+    if prompt_content.endswith('"""'):
+        prompt_content = prompt_content[:-3]  # 移除结尾的 """
+    prompt_content = prompt_content.strip()
+    # 替换占位符
+    system_prompt = prompt_content.replace("{db.dialect}", db.dialect)
+    system_prompt = system_prompt.replace(
+        "{', '.join(db.get_usable_table_names())}",
+        "', '".join(db.get_usable_table_names())
+        )
+    system_prompt = system_prompt.replace("{5}", "5")
+    return system_prompt
+
 
-    model = ChatOpenAI(
-        model_name="gpt-5-mini",
-        openai_api_key=OPENAI_API_KEY
+def create_nl2sql_agent(verbose=False, *, model=None, db_path=None, prompt_path=None):
+    """
+    创建并返回配置好的 NL2SQL Agent
+    相同的 (模型, 数据库路径, 提示词内容, checkpoint 文件, 中间件配置) 只构建一次，之后直接返回已编译的图；
+    最多缓存 MAX_CACHED_AGENTS 个，缓存项持有模型实例的引用，直到被淘汰
+    :param verbose: 是否打印数据库与工具信息（命中缓存时同样打印）
+    :param model: 模型名称或 BaseChatModel 实例，默认使用环境变量 OPENAI_MODEL_NAME
+    :param db_path: SQLite 数据库路径，默认为本目录下的 Chinook.db
+    :param prompt_path: 提示词文件路径，默认为本目录下的 prompt.txt
+    """
+    _load_env()
+    if model is None:
+        model = os.getenv("OPENAI_MODEL_NAME", "gpt-5-mini")
+    db_path = pathlib.Path(db_path or DEFAULT_DB_PATH).resolve()
+    prompt_path = pathlib.Path(prompt_path or DEFAULT_PROMPT_PATH)
+    prompt_content = _read_prompt(prompt_path)
+    prompt_hash = hashlib.sha256((prompt_content or "").encode("utf-8")).hexdigest()
+    history_max_tokens = int(os.getenv("HISTORY_MAX_TOKENS", "6000"))
+    history_keep_turns = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+    # SQL_AUTO_APPROVE=0 时每条 SQL 都交给人工审批
+    auto_approve = os.getenv("SQL_AUTO_APPROVE", "1") != "0"
+    checkpoint_path = os.path.abspath(os.getenv("CHECKPOINT_DB", "checkpoints.db"))
+
+    key = (
+        # 缓存项持有模型实例，淘汰之前 id 不会被复用
+        model if isinstance(model, str) else id(model),
+        str(db_path),
+        prompt_hash,
+        checkpoint_path,
+        (
+            history_max_tokens,
+            history_keep_turns,
+            tuple(sorted(INTERRUPT_ON.items())),
+            auto_approve,
+            AUTO_APPROVE_MAX_ROWS,
+            AUTO_APPROVE_MAX_COST,
+        ),
     )
-    
-    local_db_path = pathlib.Path("Chinook.db") 
-    db = SQLDatabase.from_uri(f"sqlite:///{local_db_path}")
-    
+    db = get_database(db_path)
+    with _build_lock:
+        entry = _agents.get(key)
+        if entry is None:
+            entry = _agents[key] = _build_agent(
+                _create_model(model) if isinstance(model, str) else model,
+                db,
+                _render_prompt(prompt_content, db),
+                history_max_tokens,
+                history_keep_turns,
+                auto_approve,
+                checkpoint_path,
+            )
+            while len(_agents) > MAX_CACHED_AGENTS:
+                _agents.popitem(last=False)
+        else:
+            _agents.move_to_end(key)
+    agent, tools = entry
     if verbose:
-        print(f"数据库连接成功")
-        print(f"\n数据库方言: {db.dialect}\n")
-        print(f"数据库表: {db.get_usable_table_names()}\n")
-        print("\n" + "="*60)
-        print("数据库Schema（前500字符）：")
-        print("="*60)
-        print(db.get_table_info()[:500]+ "...")
+        _print_agent_info(db, tools)
+    return agent
+
+
+def get_approval_stats(agent) -> dict:
+    """返回 Agent 的自动审批统计（中断率、节省的延迟等），参见 PolicyHumanInTheLoopMiddleware.stats"""
+    hitl = _approvals.get(agent)
+    return hitl.stats() if hitl else {}
+
+
+def _print_agent_info(db, tools):
+    print(f"数据库连接成功")
+    print(f"\n数据库方言: {db.dialect}\n")
+    print(f"数据库表: {db.get_usable_table_names()}\n")
+    print("\n" + "="*60)
+    print("数据库Schema（前500字符）：")
+    print("="*60)
+    print(db.get_table_info()[:500]+ "...")
+
+    print(f"SQL工具包创建成功，共{len(tools)}个工具：\n")
+    for tool in tools:
+        print(f"{tool.name}")
+        print(f"  |- 功能：{tool.description}")
+        print()
+
+
+def _build_agent(model, db, system_prompt, history_max_tokens, history_keep_turns, auto_approve, checkpoint_path):
+    """构建 Agent，返回 (agent, tools)"""
+    from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
 
     toolkit = SQLDatabaseToolkit(db=db, llm=model)
     tools = toolkit.get_tools()
 
-    if verbose:
-        print(f"SQL工具包创建成功，共{len(tools)}个工具：\n")
-        for tool in tools:
-            print(f"{tool.name}")
-            print(f"  |- 功能：{tool.description}")
-            print()
-
-    # 从 prompt.txt 读取 system_prompt
-    prompt_file_path = pathlib.Path("prompt.txt")
-    if prompt_file_path.exists():
-        with open(prompt_file_path, "r", encoding="utf-8") as f:
-            prompt_content = f.read()
-        # 移除开头的 "system_prompt = f""" 和结尾的 """（如果存在）
-        if prompt_content.startswith('system_prompt = f"""'):
-            prompt_content = prompt_content[18:]  # 移除 "system_prompt = f"""
-        if prompt_content.endswith('"""'):
-            prompt_content = prompt_content[:-3]  # 移除结尾的 """
-        prompt_content = prompt_content.strip()
-        # 替换占位符
-        system_prompt = prompt_content.replace("{db.dialect}", db.dialect)
-        system_prompt = system_prompt.replace(
-            "{', '.join(db.get_usable_table_names())}", 
-            "', '".join(db.get_usable_table_names())
-            )
-        system_prompt = system_prompt.replace("{5}", "5")
-    else:
-        # 如果文件不存在，使用默认提示
-        system_prompt = "你是一个专业的SQL数据分析Agent。"
-
-    # HITL 中间件
-    hitl = HumanInTheLoopMiddleware(
-        interrupt_on={"sql_db_query": True},
+    # HITL 中间件：只读且代价在预算内的 SQL 自动执行，其余交给人工审批
+    hitl = PolicyHumanInTheLoopMiddleware(
+        interrupt_on=INTERRUPT_ON,
+        policies={"sql_db_query": ReadOnlySQLPolicy(db)} if auto_approve else {},
         description_prefix="⚠️ SQL执行需要人工审批"
     )
 
+    # 历史预算中间件：超出 token 预算时保留最近几轮，更早的轮次折叠为摘要
+    history = HistoryBudgetMiddleware(
+        model=model,
+        max_tokens=history_max_tokens,
+        keep_last_turns=history_keep_turns,
+    )
+
     # 创建 Agent（控制台环境，自动执行 SQL，不需要人工审批）
     agent = create_agent(
         model=model,
         tools=tools,
         system_prompt=system_prompt,
         # 注释掉 HumanInTheLoopMiddleware，让 SQL 自动执行
-        middleware=[hitl],
-        checkpointer=InMemorySaver(), 
+        middleware=[history, hitl],
+        checkpointer=get_checkpointer(checkpoint_path),
     )
-    
-    return agent
+    _approvals[agent] = hitl
+
+    return agent, tools
 
 if __name__ == "__main__":
     # 如果直接运行此文件，执行初始化并显示信息
     agent = create_nl2sql_agent(verbose=True)
-    print("\nAgent 创建成功！")
\ No newline at end of file
+    print("\nAgent 创建成功！")
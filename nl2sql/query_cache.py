@@ -0,0 +1,329 @@
+"""
+sql_db_query 的结果缓存
+
+- normalize_sql：去掉注释、合并空白、关键字与未加引号的标识符统一大写、数字字面量规范化，
+  字符串字面量与加引号的标识符保持原样（大小写敏感），使只在格式上不同的 SQL 得到同一个 key
+- is_read_only：只允许单条 SELECT / VALUES 语句（可带 WITH、EXPLAIN 前缀），按首个关键字拒绝写操作与 PRAGMA/ATTACH 等
+- QueryResultCache：按结果字节数限制容量的 LRU 缓存，统计命中/未命中/淘汰
+- table_aliases / limit_of：从 SQL 中提取表别名与顶层 LIMIT，供查询计划估算使用
+- column_references：列出 SQL 中引用的列及其所在子句，供索引建议（index_advisor.py）使用
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+    |(?P<string>'(?:[^']|'')*'?)
+    |(?P<quoted>"(?:[^"]|"")*"?|`[^`]*`?|\[[^\]]*\]?)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<param>[?:@$][A-Za-z0-9_]*)
+    |(?P<op><>|<=|>=|!=|==|\|\||<<|>>|[^\sA-Za-z0-9_])
+    |(?P<space>\s+)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# 语句的首个关键字（跳过 WITH 公共表表达式之后）必须是其中之一；
+# 真正的写保护由只读 Engine（mode=ro + query_only，见 database.get_readonly_engine）负责，
+# 这里只做语句级别的快速拒绝，不在语句中间查找关键字，避免把 AS Release 这类别名误判为写操作
+READ_ONLY_LEADING = {"SELECT", "VALUES"}
+
+
+class QueryRejected(ValueError):
+    """SQL 未通过只读检查"""
+
+
+def _tokens(sql: str):
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        yield kind, match.group()
+
+
+def _canonical_number(token: str) -> str:
+    try:
+        if any(c in token for c in ".eE"):
+            return repr(float(token))
+        return str(int(token))
+    except ValueError:
+        return token
+
+
+def normalize_sql(sql: str) -> str:
+    """把 SQL 规范化为缓存 key：格式、大小写、数字写法的差异不会影响结果"""
+    parts = []
+    for kind, token in _tokens(sql):
+        if kind in ("string", "quoted"):
+            # 没有同名列时 SQLite 把 "Queen" 当作字符串字面量，大小写不能折叠
+            parts.append(token)
+        elif kind == "number":
+            parts.append(_canonical_number(token))
+        elif kind in ("word", "param"):
+            parts.append(token.upper())
+        else:
+            parts.append(token)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def _skip_parentheses(tokens: list[tuple[str, str]], index: int) -> int:
+    """tokens[index] 为 "("，返回与之匹配的 ")" 之后的位置"""
+    depth = 0
+    while index < len(tokens):
+        token = tokens[index][1]
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    raise QueryRejected("括号不匹配")
+
+
+def _statement_start(tokens: list[tuple[str, str]]) -> int:
+    """跳过 EXPLAIN [QUERY PLAN] 与 WITH [RECURSIVE] name [(columns)] AS [[NOT] MATERIALIZED] (...), ... 前缀"""
+    index = 0
+
+    def word(position: int) -> str:
+        if position < len(tokens) and tokens[position][0] == "word":
+            return tokens[position][1].upper()
+        return ""
+
+    if word(index) == "EXPLAIN":
+        index += 1
+        if word(index) == "QUERY" and word(index + 1) == "PLAN":
+            index += 2
+    if word(index) != "WITH":
+        return index
+    index += 1
+    if word(index) == "RECURSIVE":
+        index += 1
+    while True:
+        if index >= len(tokens) or tokens[index][0] not in ("word", "quoted"):
+            raise QueryRejected("WITH 子句格式不正确")
+        index += 1
+        if index < len(tokens) and tokens[index][1] == "(":
+            index = _skip_parentheses(tokens, index)
+        if word(index) != "AS":
+            raise QueryRejected("WITH 子句格式不正确")
+        index += 1
+        if word(index) == "NOT":
+            index += 1
+        if word(index) == "MATERIALIZED":
+            index += 1
+        if index >= len(tokens) or tokens[index][1] != "(":
+            raise QueryRejected("WITH 子句格式不正确")
+        index = _skip_parentheses(tokens, index)
+        if index < len(tokens) and tokens[index][1] == ",":
+            index += 1
+            continue
+        return index
+
+
+def check_read_only(sql: str) -> None:
+    """不是单条只读语句时抛出 QueryRejected：只检查语句的首个关键字（WITH / EXPLAIN 前缀之后）"""
+    tokens = list(_tokens(sql))
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+    if not tokens:
+        raise QueryRejected("SQL 为空")
+    if any(token == ";" for _, token in tokens):
+        raise QueryRejected("一次只允许执行一条 SQL 语句")
+    start = _statement_start(tokens)
+    leading = tokens[start][1].upper() if start < len(tokens) and tokens[start][0] == "word" else ""
+    if leading not in READ_ONLY_LEADING:
+        raise QueryRejected("只允许执行只读查询（SELECT），禁止 INSERT/UPDATE/DELETE/DROP 等语句")
+
+
+def is_read_only(sql: str) -> bool:
+    try:
+        check_read_only(sql)
+    except QueryRejected:
+        return False
+    return True
+
+
+_CLAUSE_KEYWORDS = {
+    "WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT",
+    "FULL", "CROSS", "NATURAL", "OUTER", "UNION", "EXCEPT", "INTERSECT", "WINDOW", "SELECT", "AS",
+}
+
+
+def _identifier(kind: str, token: str) -> str:
+    return token[1:-1] if kind == "quoted" else token
+
+
+def table_aliases(sql: str) -> dict[str, str]:
+    """
+    提取 FROM / JOIN 子句中的 表别名 -> 表名 映射（表名本身也映射到自己）
+    只做词法层面的识别，无法识别的部分直接忽略
+    """
+    tokens = list(_tokens(sql))
+    aliases: dict[str, str] = {}
+    index = 0
+    while index < len(tokens):
+        kind, token = tokens[index]
+        index += 1
+        if kind != "word" or token.upper() not in ("FROM", "JOIN"):
+            continue
+        while index < len(tokens) and tokens[index][0] in ("word", "quoted"):
+            table = _identifier(*tokens[index])
+            if table.upper() in _CLAUSE_KEYWORDS:
+                break
+            index += 1
+            # schema.table
+            if index + 1 < len(tokens) and tokens[index][1] == "." and tokens[index + 1][0] in ("word", "quoted"):
+                table = _identifier(*tokens[index + 1])
+                index += 2
+            aliases[table] = table
+            if index < len(tokens) and tokens[index][0] == "word" and tokens[index][1].upper() == "AS":
+                index += 1
+            if (
+                index < len(tokens)
+                and tokens[index][0] in ("word", "quoted")
+                and _identifier(*tokens[index]).upper() not in _CLAUSE_KEYWORDS
+            ):
+                aliases[_identifier(*tokens[index])] = table
+                index += 1
+            # FROM a x, b y
+            if index < len(tokens) and tokens[index][1] == ",":
+                index += 1
+                continue
+            break
+    return aliases
+
+
+def limit_of(sql: str) -> int | None:
+    """顶层（不在括号内）LIMIT 的行数；没有或不是常量时返回 None"""
+    depth = 0
+    limit = None
+    tokens = list(_tokens(sql))
+    for index, (kind, token) in enumerate(tokens):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and token.upper() == "LIMIT":
+            if index + 1 < len(tokens) and tokens[index + 1][0] == "number":
+                try:
+                    limit = int(float(tokens[index + 1][1]))
+                except ValueError:
+                    limit = None
+            else:
+                limit = None
+    return limit
+
+
+_REFERENCE_CLAUSES = {
+    "SELECT": "SELECT", "FROM": "FROM", "JOIN": "FROM", "WHERE": "WHERE", "ON": "ON",
+    "GROUP": "GROUP BY", "ORDER": "ORDER BY", "HAVING": "HAVING", "LIMIT": "LIMIT",
+}
+
+
+def column_references(sql: str) -> list[tuple[str | None, str, str]]:
+    """
+    列出 SQL 中可能是列引用的标识符
+    :return: [(限定名（表名或别名，没有时为 None）, 列名, 所在子句)]；
+             子句为 SELECT / FROM / WHERE / ON / GROUP BY / ORDER BY / HAVING / LIMIT，
+             t.* 记为列名 "*"；未限定的标识符是否真的是列需要调用方按表结构判断
+    """
+    tokens = list(_tokens(sql))
+    references = []
+    clause = "SELECT"
+    index = 0
+    while index < len(tokens):
+        kind, token = tokens[index]
+        index += 1
+        if kind == "op" and token == "*" and clause == "SELECT":
+            previous = tokens[index - 2][1] if index >= 2 else ""
+            if previous.upper() in ("SELECT", "DISTINCT", ","):
+                references.append((None, "*", clause))
+            continue
+        if kind not in ("word", "quoted"):
+            continue
+        upper = token.upper()
+        if kind == "word" and upper in _REFERENCE_CLAUSES:
+            clause = _REFERENCE_CLAUSES[upper]
+            continue
+        following = tokens[index][1] if index < len(tokens) else ""
+        if following == "(" or (kind == "word" and upper == "AS"):
+            # 函数名；AS 之后的别名同样跳过
+            index += kind == "word" and upper == "AS"
+            continue
+        name = _identifier(kind, token)
+        if following == "." and index + 1 < len(tokens):
+            column_kind, column = tokens[index + 1]
+            if column_kind in ("word", "quoted") or column == "*":
+                references.append((name, _identifier(column_kind, column) if column != "*" else "*", clause))
+                index += 2
+                continue
+        references.append((None, name, clause))
+    return references
+
+
+class QueryResultCache:
+    """
+    按结果字节数限制容量的线程安全 LRU 缓存
+    :param max_bytes: 所有缓存结果的 UTF-8 字节数上限
+    :param max_entry_bytes: 单条结果超过该字节数时不缓存，默认为 max_bytes 的 1/4
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, max_entry_bytes: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = len(str(value).encode("utf-8"))
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,91 @@
+"""
+离线回放模型，用于批量评测（run_batch.py）在没有网络 / API Key 时运行
+
+按问题文本选择回复，因此多个并发会话可以共用同一个模型实例：
+- 录制模式：问题在录制文件中时，按本轮已有的 AI 消息数依次返回录制的回复（含工具调用）
+- 参考 SQL 模式：问题带参考 SQL 时，先调用 sql_db_query 执行该 SQL，再把查询结果作为答案
+- 其它问题返回固定的提示文本
+
+token 用量按近似计数填写，便于离线检查统计链路。
+"""
+import itertools
+import json
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+from history_middleware import SUMMARY_MESSAGE_ID
+
+NO_RECORDING_REPLY = "（离线模式下没有该问题的录制回复）"
+
+_call_ids = itertools.count(1)
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    按问题回放回复的假模型
+    :param recordings: 问题 -> 回复列表，回复格式为 {"content": str, "tool_calls": [{"name", "args"}]}
+    :param reference_sql: 问题 -> 参考 SQL
+    """
+
+    recordings: dict[str, list[dict[str, Any]]] = Field(default_factory=dict)
+    reference_sql: dict[str, str] = Field(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    @classmethod
+    def from_recording_file(cls, path: str, reference_sql: dict[str, str] | None = None) -> "ReplayChatModel":
+        recordings = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    recordings[item["question"]] = item["replies"]
+        return cls(recordings=recordings, reference_sql=reference_sql or {})
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        question = next(
+            (m.text for m in messages if isinstance(m, HumanMessage) and m.id != SUMMARY_MESSAGE_ID),
+            "",
+        )
+        step = sum(1 for m in messages if isinstance(m, AIMessage))
+        message = self._reply(question, step, messages)
+        input_tokens = count_tokens_approximately(messages)
+        output_tokens = count_tokens_approximately([message])
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _reply(self, question: str, step: int, messages: list[BaseMessage]) -> AIMessage:
+        replies = self.recordings.get(question)
+        if replies:
+            reply = replies[min(step, len(replies) - 1)]
+            return AIMessage(
+                content=reply.get("content", ""),
+                tool_calls=[
+                    {"name": call["name"], "args": call["args"], "id": f"call_replay_{next(_call_ids)}"}
+                    for call in reply.get("tool_calls", [])
+                ],
+            )
+        sql = self.reference_sql.get(question)
+        if sql:
+            if step == 0:
+                return AIMessage(
+                    content="",
+                    tool_calls=[{"name": "sql_db_query", "args": {"query": sql}, "id": f"call_replay_{next(_call_ids)}"}],
+                )
+            observation = next((m.text for m in reversed(messages) if isinstance(m, ToolMessage)), "")
+            return AIMessage(content=f"查询结果：\n{observation}")
+        return AIMessage(content=NO_RECORDING_REPLY)
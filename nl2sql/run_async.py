@@ -0,0 +1,270 @@
+"""
+NL2SQL 异步控制台
+
+- 基于 agent.astream，模型/工具执行期间事件循环仍可读取输入
+- stdin 以非阻塞方式读取：回答还在流式输出时就可以输入下一个问题（预输入），本轮结束后依次处理
+- 回答过程中按 Ctrl-C 只取消当前这一轮，会话保持；空闲时按 Ctrl-C 或 Ctrl-D 退出
+- HITL 审批复用 run_stream.collect_decisions（与 handle_hitl_once 相同的决策流程）
+"""
+import asyncio
+import codecs
+import collections
+import os
+import signal
+import sys
+import threading
+import uuid
+from typing import Any, Dict
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.types import Command
+
+from nl2sql import create_nl2sql_agent
+from run_stream import StreamPrinter, collect_decisions
+from terminal import terminal
+
+CANCELLED_TOOL_RESULT = "用户取消了本轮对话，该工具调用没有执行。"
+
+
+class LineReader:
+    """
+    非阻塞读取 stdin 的行队列
+    POSIX 下使用 loop.add_reader，其它平台（或 stdin 不支持 select）时退回后台线程
+    add_reader 模式下直接用 os.read 读取文件描述符并自行按行切分：
+    一次粘贴多行时，剩余的行不会停留在 sys.stdin 的缓冲区里等到下一次按键才被读到
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self._lines: collections.deque[str | None] = collections.deque()
+        self._available = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._fd: int | None = None
+        self._decoder = codecs.getincrementaldecoder(getattr(self.stream, "encoding", None) or "utf-8")(
+            errors="replace"
+        )
+        self._partial = ""
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._fd = self.stream.fileno()
+            self._loop.add_reader(self._fd, self._on_readable)
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            self._fd = None
+            threading.Thread(target=self._read_forever, daemon=True).start()
+
+    def close(self):
+        if self._fd is not None and self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        if not data:
+            # EOF：不再监听，没有换行结尾的最后一行照常交出
+            self.close()
+            text = self._partial + self._decoder.decode(b"", final=True)
+            self._partial = ""
+            if text:
+                self._push(text.rstrip("\r"))
+            self._push(None)
+            return
+        *lines, self._partial = (self._partial + self._decoder.decode(data)).split("\n")
+        for line in lines:
+            self._push(line.rstrip("\r"))
+
+    def _read_forever(self):
+        while True:
+            line = self.stream.readline()
+            self._loop.call_soon_threadsafe(self._push, line.rstrip("\n") if line else None)
+            if not line:
+                return
+
+    def _push(self, line: str | None):
+        self._lines.append(line)
+        self._available.set()
+
+    def has_pending(self) -> bool:
+        return bool(self._lines)
+
+    async def readline(self) -> str | None:
+        """读取下一行，EOF 时返回 None"""
+        while not self._lines:
+            self._available.clear()
+            await self._available.wait()
+        return self._lines.popleft()
+
+    def stash(self) -> list[str | None]:
+        """取出已预输入但尚未处理的行，避免被 HITL 审批当成回答"""
+        pending = list(self._lines)
+        self._lines.clear()
+        return pending
+
+    def restore(self, lines: list[str | None]):
+        self._lines.extendleft(reversed(lines))
+        if self._lines:
+            self._available.set()
+
+
+async def astream_once(agent, inputs, config, label: str = "AI") -> Dict[str, Any]:
+    """stream_once 的异步版本，基于 agent.astream"""
+    await terminal.astart_spinner("AI 正在思考")
+    printer = StreamPrinter(label)
+    try:
+        async for mode, payload in agent.astream(
+            inputs,
+            config=config,
+            stream_mode=["messages", "updates"],
+        ):
+            if printer.handle(mode, payload):
+                break
+    finally:
+        result = printer.finish()
+    return result
+
+
+async def acollect_decisions(interrupt_list, reader: LineReader) -> list[Dict[str, Any]]:
+    """在线程中运行同步的 collect_decisions，用户输入从 reader 读取"""
+    loop = asyncio.get_running_loop()
+    typed_ahead = reader.stash()
+    pending_reads = []
+
+    def ask(prompt: str) -> str:
+        terminal.write(prompt)
+        terminal.flush()
+        future = asyncio.run_coroutine_threadsafe(reader.readline(), loop)
+        pending_reads.append(future)
+        line = future.result()
+        if line is None:
+            raise EOFError
+        return line
+
+    try:
+        return await asyncio.to_thread(collect_decisions, interrupt_list, ask)
+    finally:
+        # 本轮被取消时，正在等待的读取也要取消，否则下一个问题会被当成审批回答
+        for future in pending_reads:
+            future.cancel()
+        reader.restore(typed_ahead)
+
+
+async def run_turn(agent, user_input: str, config, reader: LineReader):
+    result = await astream_once(agent, {"messages": [HumanMessage(content=user_input)]}, config)
+    # 如果有 __interrupt__，就循环：人工审批 + resume + 再流式
+    while "__interrupt__" in result:
+        decisions = await acollect_decisions(result["__interrupt__"], reader)
+        result = await astream_once(
+            agent,
+            Command(resume={"decisions": decisions}),
+            config,
+            label="AI(继续)",
+        )
+
+
+async def repair_cancelled_turn(agent, config):
+    """
+    被取消的一轮可能停在工具调用之前（包括等待审批时），
+    为没有结果的 tool_call 补上 ToolMessage，保证下一轮的消息序列合法
+    """
+    snapshot = await agent.aget_state(config)
+    messages = snapshot.values.get("messages", [])
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    last_ai = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+    if last_ai is None:
+        return
+    missing = [call for call in last_ai.tool_calls if call["id"] not in answered]
+    if missing:
+        await agent.aupdate_state(
+            config,
+            {
+                "messages": [
+                    ToolMessage(content=CANCELLED_TOOL_RESULT, tool_call_id=call["id"], name=call["name"])
+                    for call in missing
+                ]
+            },
+            as_node="tools",
+        )
+
+
+async def main():
+    """异步控制台多轮对话主函数"""
+    terminal.print("=" * 60)
+    terminal.print("NL2SQL Chatbot（异步）- 自然语言查询 Chinook 数据库")
+    terminal.print("=" * 60)
+    terminal.print("输入 'exit' 或 'quit' 退出对话；回答过程中按 Ctrl-C 取消当前这一轮\n")
+
+    terminal.print("正在初始化 Agent...")
+    agent = await asyncio.to_thread(create_nl2sql_agent, verbose=False)
+    terminal.print("Agent 初始化完成！\n")
+
+    session_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": session_id}}
+    terminal.print(f"会话ID: {session_id[:8]}...")
+    terminal.print("-" * 60 + "\n")
+
+    reader = LineReader()
+    reader.start()
+    loop = asyncio.get_running_loop()
+    current_turn: asyncio.Task | None = None
+    main_task = asyncio.current_task()
+
+    def on_sigint():
+        if current_turn is not None and not current_turn.done():
+            current_turn.cancel()
+        else:
+            main_task.cancel()
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_sigint)
+    except (NotImplementedError, RuntimeError):
+        # Windows 不支持 add_signal_handler，Ctrl-C 会直接结束程序
+        pass
+
+    try:
+        while True:
+            if reader.has_pending():
+                user_input = await reader.readline()
+                if user_input is not None and user_input.strip():
+                    # 预输入的问题：回显出来，便于对照
+                    terminal.print(f"你: {user_input.strip()}")
+            else:
+                terminal.write("你: ")
+                terminal.flush()
+                user_input = await reader.readline()
+
+            if user_input is None:
+                terminal.print("\n\n检测到输入结束，对话结束，再见！")
+                break
+            user_input = user_input.strip()
+            if not user_input:
+                continue
+            if user_input.lower() in ["exit", "quit", "bye", "退出"]:
+                terminal.print("\n对话结束，再见！")
+                break
+
+            current_turn = asyncio.create_task(run_turn(agent, user_input, config, reader))
+            await asyncio.wait({current_turn})
+            if current_turn.cancelled():
+                terminal.stop_spinner()
+                terminal.print("\n[系统] 已取消本轮对话。")
+                await repair_cancelled_turn(agent, config)
+            elif current_turn.exception() is not None:
+                terminal.print(f"\n发生错误: {current_turn.exception()}")
+            current_turn = None
+
+            terminal.print("\n" + "-" * 60 + "\n")
+    except asyncio.CancelledError:
+        terminal.print("\n\n对话结束，再见！")
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,221 @@
+"""
+NL2SQL 批量评测（无交互）
+
+从 JSONL 问题文件读取问题（每行 {"id": ..., "question": ..., "sql": 可选的参考 SQL}），
+以 --workers 个并发会话运行 Agent，每个问题使用独立的 thread_id。
+HITL 审批由策略自动完成：
+- read-only：只读 SELECT 自动批准，其余拒绝（默认）
+- all：全部批准
+- none：全部拒绝
+
+每个问题输出一行 JSON：最终答案、执行过的 SQL、工具调用次数、重试次数（失败的 SQL 执行）、
+审批结果、token 用量以及各阶段耗时（model / tools / middleware）。
+
+--model replay 使用离线回放模型（replay_model.py），配合 --recording 或问题中的参考 SQL 即可在离线环境中运行；
+--save-recording 可以把真实模型的回复保存为录制文件供之后回放。
+
+用法：
+    python run_batch.py eval_questions.jsonl -o results.jsonl --workers 8 --model replay
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.types import Command
+
+from nl2sql import create_nl2sql_agent
+from query_cache import is_read_only
+from replay_model import ReplayChatModel
+
+SQL_TOOL = "sql_db_query"
+
+
+def load_questions(path: str) -> list[dict[str, Any]]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(index))
+            questions.append(item)
+    return questions
+
+
+def decide(action: dict[str, Any], policy: str) -> dict[str, str]:
+    """按审批策略对一次工具调用做出决策"""
+    if policy == "all":
+        return {"type": "approve"}
+    if policy == "read-only" and action["name"] == SQL_TOOL and is_read_only(action["args"].get("query", "")):
+        return {"type": "approve"}
+    return {"type": "reject", "message": f"批量评测的审批策略（{policy}）拒绝了该调用"}
+
+
+def _stage(node: str) -> str:
+    if node in ("model", "tools"):
+        return node
+    return "middleware"
+
+
+async def run_question(agent, item: dict[str, Any], policy: str, run_id: str) -> dict[str, Any]:
+    config = {"configurable": {"thread_id": f"batch-{run_id}-{item['id']}"}}
+    latency = {"model": 0.0, "tools": 0.0, "middleware": 0.0}
+    approvals = {"approve": 0, "reject": 0}
+    interrupts = 0
+    error = None
+
+    start = time.perf_counter()
+    last_event = start
+    inputs: Any = {"messages": [HumanMessage(content=item["question"])]}
+    try:
+        while inputs is not None:
+            pending = None
+            async for mode, payload in agent.astream(inputs, config=config, stream_mode=["tasks", "updates"]):
+                if mode == "updates":
+                    if "__interrupt__" in payload:
+                        pending = payload["__interrupt__"]
+                    continue
+                # tasks 模式：节点按顺序执行，两个节点结束事件之间的时间记为后一个节点的耗时
+                if "result" in payload:
+                    now = time.perf_counter()
+                    latency[_stage(payload["name"])] += now - last_event
+                    last_event = now
+            inputs = None
+            if pending:
+                interrupts += 1
+                value = getattr(pending[0], "value", pending[0])
+                decisions = [decide(action, policy) for action in value.get("action_requests", [])]
+                for decision in decisions:
+                    approvals[decision["type"]] += 1
+                inputs = Command(resume={"decisions": decisions})
+                last_event = time.perf_counter()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    total = time.perf_counter() - start
+
+    snapshot = await agent.aget_state(config)
+    messages = snapshot.values.get("messages", [])
+    return {
+        "id": item["id"],
+        "question": item["question"],
+        **summarize_messages(messages),
+        "interrupts": interrupts,
+        "approved": approvals["approve"],
+        "rejected": approvals["reject"],
+        "latency": {"total": round(total, 4), **{k: round(v, 4) for k, v in latency.items()}},
+        "error": error,
+    }
+
+
+def summarize_messages(messages: list) -> dict[str, Any]:
+    """从一个问题的完整消息列表中提取答案、SQL、工具调用与 token 统计"""
+    tool_results = {m.tool_call_id: m for m in messages if isinstance(m, ToolMessage)}
+    ai_messages = [m for m in messages if isinstance(m, AIMessage)]
+    tool_calls = [call for m in ai_messages for call in m.tool_calls]
+
+    executed_sql, retries = [], 0
+    for call in tool_calls:
+        if call["name"] != SQL_TOOL:
+            continue
+        result = tool_results.get(call["id"])
+        # 被审批拒绝的调用 status 为 error，不算执行过
+        if result is None or result.status == "error":
+            continue
+        executed_sql.append(call["args"].get("query", ""))
+        if result.text.startswith("Error"):
+            retries += 1
+
+    tokens = {"input": 0, "output": 0, "total": 0}
+    for m in ai_messages:
+        usage = m.usage_metadata or {}
+        tokens["input"] += usage.get("input_tokens", 0)
+        tokens["output"] += usage.get("output_tokens", 0)
+        tokens["total"] += usage.get("total_tokens", 0)
+
+    answer = next((m.text for m in reversed(ai_messages) if m.text and not m.tool_calls), "")
+    return {
+        "answer": answer,
+        "sql": executed_sql,
+        "tool_calls": len(tool_calls),
+        "retries": retries,
+        "tokens": tokens,
+    }
+
+
+def recording_of(messages: list, question: str) -> dict[str, Any]:
+    replies = [
+        {"content": m.text, "tool_calls": [{"name": c["name"], "args": c["args"]} for c in m.tool_calls]}
+        for m in messages
+        if isinstance(m, AIMessage)
+    ]
+    return {"question": question, "replies": replies}
+
+
+async def run_batch(args) -> list[dict[str, Any]]:
+    questions = load_questions(args.questions)
+    if args.model == "replay":
+        reference_sql = {q["question"]: q["sql"] for q in questions if q.get("sql")}
+        if args.recording:
+            model = ReplayChatModel.from_recording_file(args.recording, reference_sql)
+        else:
+            model = ReplayChatModel(reference_sql=reference_sql)
+        agent = create_nl2sql_agent(model=model)
+    else:
+        agent = create_nl2sql_agent(model=args.model)
+
+    run_id = uuid.uuid4().hex[:8]
+    semaphore = asyncio.Semaphore(args.workers)
+    results: list[dict[str, Any] | None] = [None] * len(questions)
+    recordings: list[dict[str, Any] | None] = [None] * len(questions)
+
+    async def worker(index: int, item: dict[str, Any]):
+        async with semaphore:
+            results[index] = await run_question(agent, item, args.approve, run_id)
+            if args.save_recording:
+                snapshot = await agent.aget_state({"configurable": {"thread_id": f"batch-{run_id}-{item['id']}"}})
+                recordings[index] = recording_of(snapshot.values.get("messages", []), item["question"])
+            print(
+                f"[{item['id']}] {results[index]['latency']['total']:.2f}s "
+                f"tool_calls={results[index]['tool_calls']} error={results[index]['error']}",
+                file=sys.stderr,
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i, item) for i, item in enumerate(questions)))
+    elapsed = time.perf_counter() - start
+
+    # 输出顺序与问题文件一致
+    with open(args.output, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    if args.save_recording:
+        with open(args.save_recording, "w", encoding="utf-8") as f:
+            for recording in recordings:
+                f.write(json.dumps(recording, ensure_ascii=False) + "\n")
+
+    totals = [r["latency"]["total"] for r in results]
+    errors = sum(1 for r in results if r["error"])
+    print(
+        f"完成 {len(results)} 个问题，失败 {errors} 个，耗时 {elapsed:.2f}s（{len(results) / elapsed:.1f} 题/秒），"
+        f"单题 p50={statistics.median(totals):.3f}s max={max(totals):.3f}s，"
+        f"tokens={sum(r['tokens']['total'] for r in results)}"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSONL 问题文件")
+    parser.add_argument("-o", "--output", required=True, help="结果 JSONL 文件")
+    parser.add_argument("--workers", type=int, default=4, help="并发会话数")
+    parser.add_argument("--approve", choices=["read-only", "all", "none"], default="read-only", help="HITL 审批策略")
+    parser.add_argument("--model", default=None, help="模型名称；replay 表示使用离线回放模型；默认读取 OPENAI_MODEL_NAME")
+    parser.add_argument("--recording", help="replay 模式使用的录制文件（JSONL）")
+    parser.add_argument("--save-recording", help="把本次运行的模型回复保存为录制文件")
+    asyncio.run(run_batch(parser.parse_args()))
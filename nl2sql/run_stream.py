@@ -1,157 +1,102 @@
 import uuid
-import sys
-import threading
-import time
-from typing import Dict, Any
+from typing import Any, Callable, Dict
 
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessageChunk, HumanMessage
 from langgraph.types import Command
 
 from nl2sql import create_nl2sql_agent
+from terminal import terminal
 
 
-class LoadingIndicator:
-    """简单的控制台 Loading 动画（独立线程）"""
-    def __init__(self, message: str = "AI 正在思考"):
-        self.message = message
-        self.spinner_chars = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
-        self.running = False
-        self.thread: threading.Thread | None = None
-
-    def _animate(self):
-        i = 0
-        while self.running:
-            char = self.spinner_chars[i % len(self.spinner_chars)]
-            sys.stdout.write(f"\r{char} {self.message}...")
-            sys.stdout.flush()
-            i += 1
-            time.sleep(0.1)
-
-    def start(self):
-        if self.running:
-            return
-        self.running = True
-        self.thread = threading.Thread(target=self._animate, daemon=True)
-        self.thread.start()
-
-    def stop(self):
-        if not self.running:
-            return
-        self.running = False
-        if self.thread:
-            self.thread.join(timeout=0.5)
-        # 清掉一行 spinner
-        sys.stdout.write("\r" + " " * (len(self.message) + 10) + "\r")
-        sys.stdout.flush()
-
-
-def stream_once(agent, inputs, config, label: str = "AI") -> Dict[str, Any]:
+class StreamPrinter:
     """
-    对 agent 执行一次流式调用（values 模式）：
+    处理 stream_mode=["messages", "updates"] 的输出，同步 stream 与异步 astream 共用：
 
-    - 使用 stream_mode="values"
-    - 遇到 messages 就增量输出最后一条消息内容（token-style 流式）
-    - 遇到 __interrupt__ 就返回 {"__interrupt__": ...}
+    - messages 模式：模型每产生一个 token 就立即输出（只输出 model 节点的 AI 消息，
+      跳过工具结果和历史摘要等内部模型调用），每个 chunk 只做 O(chunk) 的工作
+    - updates 模式：遇到 __interrupt__ 时记录下来，handle() 返回 True 表示应停止读取
     """
-    loader = LoadingIndicator("AI 正在思考")
-    loader.start()
 
-    printed_anything = False
-    label_printed = False
-    interrupt_list = None
+    def __init__(self, label: str = "AI"):
+        self.label = label
+        self.printed_anything = False
+        self.interrupt_list = None
+        # 同一轮中模型可能多次发言（先说明再调用工具，最后给出答案），不同消息之间换行
+        self.last_message_id = None
+
+    def handle(self, mode: str, payload) -> bool:
+        # 1) HITL 中断通过 updates 模式返回
+        if mode == "updates":
+            if "__interrupt__" in payload:
+                self.interrupt_list = payload["__interrupt__"]
+                terminal.print("\n[系统] 检测到需要人工审批的工具调用。\n")
+                return True
+            return False
+
+        # 2) messages 模式：payload 是 (消息 chunk, 元数据)
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") != "model" or not isinstance(chunk, AIMessageChunk):
+            return False
+        delta = chunk.text
+        if not delta:
+            return False
+
+        # 第一次真正有输出内容 → 打印 label（输出文本时 spinner 会自动清掉）
+        if not self.printed_anything:
+            terminal.write(f"\n{self.label}: ")
+        elif chunk.id != self.last_message_id:
+            terminal.write("\n")
+        self.last_message_id = chunk.id
+
+        self.printed_anything = True
+        terminal.write(delta)
+        terminal.flush()
+        return False
+
+    def finish(self) -> Dict[str, Any]:
+        terminal.stop_spinner()
+
+        # 如果这轮有输出内容，再补一个换行
+        if self.printed_anything:
+            terminal.write("\n")
+            terminal.flush()
+        elif self.interrupt_list is None:
+            # 没输出、也没中断
+            terminal.print(f"\n{self.label}: （没有输出内容）")
+
+        # 如果有中断，返回给外层处理；这一轮没有 HITL，就返回空 dict
+        if self.interrupt_list is not None:
+            return {"__interrupt__": self.interrupt_list}
+        return {}
 
-    # 用来记录“已经打印到哪”，实现增量输出
-    last_text = ""
 
+def stream_once(agent, inputs, config, label: str = "AI") -> Dict[str, Any]:
+    """
+    对 agent 执行一次流式调用（messages + updates 模式），token 到达即输出
+    遇到 __interrupt__ 就返回 {"__interrupt__": ...}
+    """
+    terminal.start_spinner("AI 正在思考")
+    printer = StreamPrinter(label)
     try:
-        for step in agent.stream(
+        for mode, payload in agent.stream(
             inputs,
             config=config,
-            stream_mode="values",   # ✅ 继续用 values，才能看到 __interrupt__
+            stream_mode=["messages", "updates"],
         ):
-            # 1) 先处理 HITL 中断：step 中直接带 __interrupt__
-            if "__interrupt__" in step:
-                interrupt_list = step["__interrupt__"]
-                if loader.running:
-                    loader.stop()
-                print("\n[系统] 检测到需要人工审批的工具调用。\n")
+            if printer.handle(mode, payload):
                 break
-
-            # 2) 正常消息：step 中有 messages
-            if "messages" in step:
-                messages = step["messages"]
-                if not messages:
-                    continue
-                last_msg = messages[-1]
-                content = getattr(last_msg, "content", "")
-                if not content:
-                    continue
-
-                # content 统一转成字符串 full_text
-                if isinstance(content, str):
-                    full_text = content
-                elif isinstance(content, list):
-                    parts = []
-                    for item in content:
-                        if isinstance(item, dict):
-                            parts.append(str(item.get("text", "")))
-                        else:
-                            parts.append(str(item))
-                    full_text = "".join(parts)
-                else:
-                    full_text = str(content)
-
-                # 第一次真正有输出内容 → 停掉 loader，打印 label
-                if not label_printed and full_text:
-                    label_printed = True
-                    if loader.running:
-                        loader.stop()
-                    print(f"\n{label}: ", end="", flush=True)
-
-                # 增量输出：只把“新追加的部分”打印出来
-                if len(full_text) > len(last_text):
-                    delta = full_text[len(last_text):]
-                    last_text = full_text
-
-                    if delta:
-                        printed_anything = True
-                        sys.stdout.write(delta)
-                        sys.stdout.flush()
-
     finally:
-        if loader.running:
-            loader.stop()
-
-        # 如果这轮有输出内容，再补一个换行
-        if printed_anything:
-            sys.stdout.write("\n")
-            sys.stdout.flush()
-        elif interrupt_list is None:
-            # 没输出、也没中断
-            print(f"\n{label}: （没有输出内容）")
-
-    # 如果有中断，返回给外层处理
-    if interrupt_list is not None:
-        return {"__interrupt__": interrupt_list}
-    else:
-        # 这一轮没有 HITL，就返回空 dict
-        return {}
+        result = printer.finish()
+    return result
 
 
-def handle_hitl_once(agent, state_values: Dict[str, Any], config) -> Dict[str, Any]:
+def collect_decisions(interrupt_list, ask: Callable[[str], str] = terminal.prompt) -> list[Dict[str, Any]]:
     """
-    处理一次 HITL 中断：
-    - state_values 现在就是 {"__interrupt__": [...]} 这种形态
-    - 在 console 里让用户 approve/reject
-    - 用 Command(resume=...) 再流式一次
+    在 console 里逐个展示待审批的工具调用，让用户 approve/reject
+    :param interrupt_list: __interrupt__ 的内容
+    :param ask: 读取一行用户输入的函数
+    :return: HumanInTheLoopMiddleware 需要的 decisions 列表
     """
-    if "__interrupt__" not in state_values:
-        return state_values
-
-    interrupt_list = state_values["__interrupt__"]
-    if not interrupt_list:
-        return state_values
-
     first_interrupt = interrupt_list[0]
     interrupt_value = getattr(first_interrupt, "value", first_interrupt)
 
@@ -162,30 +107,48 @@ def handle_hitl_once(agent, state_values: Dict[str, Any], config) -> Dict[str, A
 
     decisions = []
 
-    print("\n=== 检测到需要人工审批的 SQL 调用 ===")
+    terminal.print("\n=== 检测到需要人工审批的 SQL 调用 ===")
     for idx, action in enumerate(action_requests, start=1):
         name = action["name"]
         args = action["args"]
         review_cfg = config_map.get(name, {})
         allowed = review_cfg.get("allowed_decisions", ["approve", "reject", "edit"])
 
-        print(f"\n[{idx}] 工具: {name}")
-        print(f"     参数: {args}")
-        print(f"     允许决策: {', '.join(allowed)}")
+        terminal.print(f"\n[{idx}] 工具: {name}")
+        terminal.print(f"     参数: {args}")
+        terminal.print(f"     允许决策: {', '.join(allowed)}")
 
         # 简化：目前只支持 approve / reject
         while True:
-            choice = input("     是否执行该 SQL? (a=执行, r=拒绝) ").strip().lower()
+            choice = ask("     是否执行该 SQL? (a=执行, r=拒绝) ").strip().lower()
             if choice in ("a", "r"):
                 break
-            print("     请输入 a 或 r。")
+            terminal.print("     请输入 a 或 r。")
 
         if choice == "a":
             decisions.append({"type": "approve"})
         else:
             decisions.append({"type": "reject"})
 
-    print("\n已记录人工决策，正在继续执行...\n")
+    terminal.print("\n已记录人工决策，正在继续执行...\n")
+    return decisions
+
+
+def handle_hitl_once(agent, state_values: Dict[str, Any], config) -> Dict[str, Any]:
+    """
+    处理一次 HITL 中断：
+    - state_values 现在就是 {"__interrupt__": [...]} 这种形态
+    - 在 console 里让用户 approve/reject
+    - 用 Command(resume=...) 再流式一次
+    """
+    if "__interrupt__" not in state_values:
+        return state_values
+
+    interrupt_list = state_values["__interrupt__"]
+    if not interrupt_list:
+        return state_values
+
+    decisions = collect_decisions(interrupt_list)
 
     # 用 Command(resume=...) + 同一个 thread_id 继续执行
     resumed_values = stream_once(
@@ -198,7 +161,7 @@ def handle_hitl_once(agent, state_values: Dict[str, Any], config) -> Dict[str, A
 
 
 def main():
-    """控制台多轮对话主函数（HITL + 流式输出 + LoadingIndicator）"""
+    """控制台多轮对话主函数（HITL + 流式输出 + spinner）"""
     print("=" * 60)
     print("NL2SQL Chatbot - 自然语言查询 Chinook 数据库")
     print("=" * 60)
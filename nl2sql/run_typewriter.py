@@ -1,104 +1,231 @@
+import collections
+import os
 import uuid
 import threading
 import sys
 import time
 
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import AIMessageChunk, HumanMessage
 from langgraph.types import Command
 
 from nl2sql import create_nl2sql_agent
+from run_stream import collect_decisions
+from terminal import terminal
 
 
-def typewriter_print(text: str, delay: float = 0.02):
-    for char in text:
-        sys.stdout.write(char)
-        sys.stdout.flush()
-        time.sleep(delay)
-    sys.stdout.write('\n')
-    sys.stdout.flush()
+# 打字机效果配置
+TYPEWRITER_FPS = float(os.getenv("TYPEWRITER_FPS", "30"))
+# 每秒输出的字符数；设为 0 关闭节奏控制，token 到达后在下一帧直接输出
+TYPEWRITER_CPS = float(os.getenv("TYPEWRITER_CPS", "120"))
+# 允许落后模型输出的最长时间（秒），积压超过该值时自动加速追赶
+TYPEWRITER_MAX_LAG = float(os.getenv("TYPEWRITER_MAX_LAG", "0.5"))
+# 配置错误在启动时报告，而不是等到第一次输出回答时
+if TYPEWRITER_FPS <= 0:
+    raise ValueError(f"TYPEWRITER_FPS 必须大于 0，当前为 {TYPEWRITER_FPS}")
+if TYPEWRITER_CPS < 0:
+    raise ValueError(f"TYPEWRITER_CPS 不能为负数，当前为 {TYPEWRITER_CPS}")
 
 
-class LoadingIndicator:
-    """加载指示器类，显示旋转动画"""
-    def __init__(self, message="思考中"):
-        self.message = message
-        self.spinner_chars = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
-        self.running = False
-        self.thread = None
-    
-    def _animate(self):
-        """动画循环"""
-        i = 0
-        while self.running:
-            char = self.spinner_chars[i % len(self.spinner_chars)]
-            sys.stdout.write(f'\r{char} {self.message}...')
-            sys.stdout.flush()
-            i += 1
-            import time
-            time.sleep(0.1)
-    
-    def start(self):
-        """开始显示动画"""
-        self.running = True
-        self.thread = threading.Thread(target=self._animate, daemon=True)
-        self.thread.start()
-    
-    def stop(self):
-        """停止显示动画"""
-        self.running = False
-        if self.thread:
-            self.thread.join(timeout=0.5)
-        sys.stdout.write('\r' + ' ' * (len(self.message) + 10) + '\r')
-        sys.stdout.flush()
+class TypewriterRenderer:
+    """
+    按固定帧率批量输出的打字机渲染器（独立线程）
 
+    - feed() 只把文本追加到缓冲区，渲染线程每帧最多调用一次 write + flush
+    - 开启节奏控制时每帧输出 cps / fps 个字符；到达超过 max_lag 秒的文本会在当前帧全部输出，
+      因此任何字符最多比模型晚 max_lag 秒出现
+    - skip() 立即输出全部已收到的文本，本次回答余下部分不再做打字效果；
+      在终端中按回车也会触发 skip
 
-def handle_hitl_if_needed(agent, result, config):
+    :param fps: 每秒最多输出的帧数，必须大于 0
+    :param chars_per_second: 每秒输出的字符数，None 或 0 表示不做节奏控制
+    :param max_lag: 允许落后模型输出的最长时间（秒）
+    :param out: 输出对象，默认为 terminal
+    :param skip_on_enter: 是否在终端中按回车时跳过打字效果
     """
-    如果 result 中包含 HITL 中断 (__interrupt__),
-    则在 console 中交互式让用户 approve/reject, 并返回 resume 后的最终 result
-    """
-    if not (isinstance(result, dict) and result.get("__interrupt__")):
-        return result 
-    
-    interrupt = result["__interrupt__"][0].value
-    action_requests = interrupt["action_requests"]
-    review_configs = interrupt["review_configs"]
-
-    config_map = {cfg["action_name"]: cfg for cfg in review_configs}
-    decisions = []
-
-    print(f"\n\n=== 检测到需要人工审批的 SQL 查询，请选择操作: ===")
-    for idx, action in enumerate(action_requests, start=1):
-        name = action["name"]
-        args = action["args"]
-        review_cfg = config_map.get(name, {})
-        allowed = review_cfg.get("allowed_decisions", ["approve", "reject", "edit"])
-
-        print(f"\n[{idx}] 工具: {name}")
-        print(f"  参数: {args}")
-        print(f"  允许的操作: {', '.join(allowed)}")
-        
 
+    def __init__(
+        self,
+        fps: float = TYPEWRITER_FPS,
+        chars_per_second: float | None = TYPEWRITER_CPS,
+        max_lag: float = TYPEWRITER_MAX_LAG,
+        out=None,
+        skip_on_enter: bool = True,
+    ):
+        if fps <= 0:
+            raise ValueError(f"fps 必须大于 0，当前为 {fps}")
+        if chars_per_second is not None and chars_per_second < 0:
+            raise ValueError(f"chars_per_second 不能为负数，当前为 {chars_per_second}")
+        self.frame_interval = 1.0 / fps
+        self.chars_per_frame = chars_per_second / fps if chars_per_second else None
+        self.max_lag = max_lag
+        self.out = out or terminal
+        self.skip_on_enter = skip_on_enter and _stdin_is_tty()
+        self._pending = ""
+        self._credit = 0.0
+        # (到达时间, 累计已收到字符数)，用于计算必须输出到哪里
+        self._arrivals: collections.deque[tuple[float, int]] = collections.deque()
+        self._received = 0
+        self._emitted = 0
+        self._lock = threading.Lock()
+        self._skipped = False
+        self._closed = False
+        self._wake = threading.Event()
+        self._done = threading.Event()
+        self.frames_written = 0
+        self.chars_written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, text: str):
+        if not text:
+            return
+        with self._lock:
+            self._pending += text
+            self._received += len(text)
+            self._arrivals.append((time.monotonic(), self._received))
+
+    def skip(self):
+        self._skipped = True
+        self._wake.set()
+
+    def close(self, newline: bool = True):
+        """标记输入结束并等待缓冲区输出完毕"""
+        with self._lock:
+            if newline:
+                self._pending += "\n"
+                self._received += 1
+            self._closed = True
+        self._wake.set()
+        self._done.wait()
+        self._thread.join()
+
+    def _take_frame(self) -> str:
+        with self._lock:
+            if not self._pending:
+                return ""
+            if self._skipped or self.chars_per_frame is None:
+                count = len(self._pending)
+            else:
+                self._credit += self.chars_per_frame
+                count = int(self._credit)
+                self._credit -= count
+                # 自适应：已经落后超过 max_lag 的文本必须在本帧输出
+                deadline = time.monotonic() - self.max_lag
+                overdue = self._emitted
+                while self._arrivals and self._arrivals[0][0] <= deadline:
+                    overdue = max(overdue, self._arrivals.popleft()[1])
+                if overdue - self._emitted > count:
+                    count = overdue - self._emitted
+                    self._credit = 0.0
+            text, self._pending = self._pending[:count], self._pending[count:]
+            self._emitted += len(text)
+            return text
+
+    def _run(self):
         while True:
-            choice = input(f"    是否执行该 SQL? (a=执行， r=拒绝) ").strip().lower()
-            if choice in ("a", "r"):
-                break
-            print("    无效输入，请输入 a 或 r")
+            self._wake.wait(self.frame_interval)
+            self._wake.clear()
+            if self.skip_on_enter and not self._skipped and _enter_pressed():
+                self._skipped = True
+            text = self._take_frame()
+            if text:
+                self.out.write(text)
+                self.out.flush()
+                self.frames_written += 1
+                self.chars_written += len(text)
+            with self._lock:
+                if self._closed and not self._pending:
+                    break
+        self._done.set()
+
+
+def _stdin_is_tty() -> bool:
+    try:
+        return sys.stdin.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def _enter_pressed() -> bool:
+    """非阻塞检查终端是否按下回车（仅 POSIX，其它平台始终返回 False）"""
+    try:
+        import select
+
+        readable, _, _ = select.select([sys.stdin], [], [], 0)
+    except (ImportError, OSError, ValueError):
+        return False
+    if readable:
+        sys.stdin.readline()
+        return True
+    return False
 
-        if choice == "a":
-            decisions.append({"type": "approve"})
-        else:
-            decisions.append({"type": "reject"})
 
-    print(f"\n\n=== 人工审批完成，开始执行 SQL 查询: ===")
+def typewriter_print(text: str, renderer: TypewriterRenderer | None = None):
+    renderer = renderer or TypewriterRenderer()
+    renderer.feed(text)
+    renderer.close()
 
-    resumed_result = agent.invoke(
+
+def stream_typewriter(agent, inputs, config, label="AI"):
+    """
+    流式调用 agent，模型 token 一到达就交给打字机渲染器输出
+    返回 {"__interrupt__": [...]}（需要人工审批）或 {}
+    """
+    terminal.start_spinner("AI正在思考")
+    renderer = None
+    last_message_id = None
+    interrupt_list = None
+
+    try:
+        for mode, payload in agent.stream(inputs, config=config, stream_mode=["messages", "updates"]):
+            if mode == "updates":
+                if "__interrupt__" in payload:
+                    interrupt_list = payload["__interrupt__"]
+                    break
+                continue
+
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") != "model" or not isinstance(chunk, AIMessageChunk):
+                continue
+            delta = chunk.text
+            if not delta:
+                continue
+            if renderer is None:
+                terminal.write(f"\n{label}: ")
+                terminal.flush()
+                renderer = TypewriterRenderer()
+            elif chunk.id != last_message_id:
+                renderer.feed("\n")
+            last_message_id = chunk.id
+            renderer.feed(delta)
+    finally:
+        terminal.stop_spinner()
+        if renderer is not None:
+            renderer.close()
+
+    if interrupt_list is not None:
+        return {"__interrupt__": interrupt_list}
+    if renderer is None:
+        terminal.print(f"\n{label}: 抱歉，没有收到有效响应。")
+    return {}
+
+
+def handle_hitl_if_needed(agent, result, config):
+    """
+    如果 result 中包含 HITL 中断 (__interrupt__),
+    则用 run_stream.collect_decisions 在 console 中让用户 approve/reject, 并以流式方式 resume，返回 stream_typewriter 的结果
+    """
+    if not (isinstance(result, dict) and result.get("__interrupt__")):
+        return result
+
+    decisions = collect_decisions(result["__interrupt__"])
+    return stream_typewriter(
+        agent,
         Command(resume={"decisions": decisions}),
-        config=config
+        config,
+        label="AI(继续)",
     )
 
-    return resumed_result
-
 def main():
     """控制台多轮对话主函数"""
     print("=" * 60)
@@ -134,60 +261,16 @@ def main():
             print("\n对话结束，再见！")
             break
         
-        # 调用 agent 处理用户输入
+        # 调用 agent 处理用户输入：token 到达即开始打字输出，按回车可跳过打字效果
         try:
-            # 显示加载指示器
-            loader = LoadingIndicator("AI正在思考")
-            loader.start()
-            
-            try:
-                # 使用 agent.invoke() 一次性获取完整响应
-                result = agent.invoke(
-                    {"messages": [HumanMessage(content=user_input)]},
-                    config
-                )
-            finally:
-                # 停止加载指示器
-                loader.stop()
-
-            result = handle_hitl_if_needed(agent, result, config)
-            
-            print("\nAI: ", end="", flush=True)
-            
-            # 获取最新的 AI 消息
-            if result and "messages" in result and len(result["messages"]) > 0:
-                # 从后往前找最后一条有内容的 AI 消息
-                last_message = None
-                for msg in reversed(result["messages"]):
-                    if isinstance(msg, AIMessage):
-                        content = getattr(msg, "content", None)
-                        # 如果有内容就使用这条消息
-                        if content:
-                            last_message = msg
-                            break
-                
-                if last_message:
-                    content = last_message.content
-                    # 处理不同类型的 content
-                    if isinstance(content, str):
-                        final_text = content
-                    elif isinstance(content, list):
-                        # 处理内容块列表
-                        text_parts = []
-                        for item in content:
-                            if isinstance(item, dict):
-                                text_parts.append(str(item.get("text", "")))
-                            else:
-                                text_parts.append(str(item))
-                        final_text = "".join(text_parts)
-                    else:
-                        final_text = str(content)
-                    typewriter_print(final_text)
-                else:
-                    print("抱歉，没有收到有效响应。")
-            else:
-                print("抱歉，没有收到响应。")
-                
+            result = stream_typewriter(
+                agent,
+                {"messages": [HumanMessage(content=user_input)]},
+                config,
+            )
+            while "__interrupt__" in result:
+                result = handle_hitl_if_needed(agent, result, config)
+
         except Exception as e:
             print(f"\n发生错误: {str(e)}")
             import traceback
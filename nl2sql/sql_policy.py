@@ -0,0 +1,55 @@
+"""
+sql_db_query 的自动审批策略
+
+只有同时满足以下条件的查询才会自动执行，其余交给人工审批：
+- 通过只读检查（query_cache.check_read_only）：单条语句，跳过 EXPLAIN [QUERY PLAN] 与
+  WITH 公共表表达式之后的首个关键字是 SELECT 或 VALUES；字符串、标识符中出现的 DELETE 等词不影响判断，
+  真正的写保护由只读 Engine（mode=ro + query_only）负责
+- EXPLAIN QUERY PLAN 估算的返回行数不超过 max_rows
+- 估算的扫描行数不超过 max_cost
+"""
+import os
+
+from langchain_core.messages import ToolCall
+
+from database import CachedSQLDatabase
+from query_cache import QueryRejected, check_read_only
+
+AUTO_APPROVE_MAX_ROWS = int(os.getenv("SQL_AUTO_APPROVE_MAX_ROWS", "1000"))
+AUTO_APPROVE_MAX_COST = int(os.getenv("SQL_AUTO_APPROVE_MAX_COST", "200000"))
+
+
+class ReadOnlySQLPolicy:
+    """
+    首个关键字为 SELECT / VALUES（见 check_read_only）且估算代价在预算内的 SQL 自动批准
+    :param db: 用于生成查询计划的数据库
+    :param max_rows: 估算返回行数上限
+    :param max_cost: 估算扫描行数上限
+    """
+
+    def __init__(
+        self,
+        db: CachedSQLDatabase,
+        max_rows: int = AUTO_APPROVE_MAX_ROWS,
+        max_cost: int = AUTO_APPROVE_MAX_COST,
+    ):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+
+    def __call__(self, tool_call: ToolCall) -> tuple[bool, str]:
+        query = tool_call["args"].get("query", "")
+        try:
+            check_read_only(query)
+        except QueryRejected as e:
+            return False, str(e)
+        try:
+            cost = self.db.estimate_query_cost(query)
+        except Exception as e:
+            # 语法错误等无法生成计划的查询交给人工，执行时的报错会原样返回给模型
+            return False, f"无法生成查询计划：{e}"
+        if cost["result_rows"] > self.max_rows:
+            return False, f"估算返回 {cost['result_rows']} 行，超过自动执行上限 {self.max_rows} 行"
+        if cost["scan_rows"] > self.max_cost:
+            return False, f"估算扫描 {cost['scan_rows']} 行，超过自动执行上限 {self.max_cost} 行"
+        return True, f"只读查询，估算扫描 {cost['scan_rows']} 行、返回 {cost['result_rows']} 行"
@@ -0,0 +1,150 @@
+"""
+控制台输出组件
+
+Terminal 独占 stdout：spinner、流式文本、HITL 提示都经过同一把锁输出，不会互相穿插。
+
+- spinner 通过 Event 等待下一帧，stop 时只需 set 事件并在锁内清掉 spinner 行，无需等待线程退出
+- 任何文本输出都会先清掉 spinner，spinner 不会在文本之后再次绘制
+- start_spinner 使用线程，astart_spinner 使用 asyncio 任务，stop_spinner 对两者通用
+"""
+import asyncio
+import itertools
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+SPINNER_FRAMES = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+
+
+class Terminal:
+    """
+    独占 stdout 的终端渲染器
+    :param out: 输出流，默认每次使用当前的 sys.stdout
+    :param spinner_interval: spinner 帧间隔（秒）
+    """
+
+    def __init__(self, out=None, spinner_interval: float = 0.1):
+        self._out = out
+        self.spinner_interval = spinner_interval
+        self._lock = threading.RLock()
+        self._spinner_ids = itertools.count(1)
+        # 当前 spinner: (编号, 提示文字, 停止回调)；None 表示未显示
+        self._spinner: tuple[int, str, Callable[[], None]] | None = None
+
+    @property
+    def out(self):
+        return self._out or sys.stdout
+
+    # ---- spinner ----
+
+    def start_spinner(self, message: str = "AI 正在思考"):
+        """在后台线程中显示 spinner，第一帧立即绘制"""
+        stop = threading.Event()
+        spinner_id = self._begin_spinner(message, stop.set)
+        threading.Thread(target=self._spin, args=(spinner_id, stop), daemon=True).start()
+
+    async def astart_spinner(self, message: str = "AI 正在思考"):
+        """在当前事件循环中显示 spinner，第一帧立即绘制"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # stop_spinner 可能在其它线程中调用，asyncio.Event 只能在所属事件循环中 set
+        spinner_id = self._begin_spinner(message, lambda: loop.call_soon_threadsafe(stop.set))
+        asyncio.create_task(self._aspin(spinner_id, stop))
+
+    def stop_spinner(self):
+        """停止 spinner 并清掉 spinner 行，立即返回"""
+        with self._lock:
+            self._clear_spinner()
+
+    @contextmanager
+    def spinner(self, message: str = "AI 正在思考"):
+        self.start_spinner(message)
+        try:
+            yield self
+        finally:
+            self.stop_spinner()
+
+    @property
+    def spinning(self) -> bool:
+        return self._spinner is not None
+
+    def _begin_spinner(self, message: str, stop: Callable[[], None]) -> int:
+        with self._lock:
+            self._clear_spinner()
+            spinner_id = next(self._spinner_ids)
+            self._spinner = (spinner_id, message, stop)
+            self._draw_spinner(spinner_id, 0)
+            return spinner_id
+
+    def _spin(self, spinner_id: int, stop: threading.Event):
+        frame = 1
+        while not stop.wait(self.spinner_interval):
+            if not self._draw_spinner(spinner_id, frame):
+                return
+            frame += 1
+
+    async def _aspin(self, spinner_id: int, stop: asyncio.Event):
+        frame = 1
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), self.spinner_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if not self._draw_spinner(spinner_id, frame):
+                return
+            frame += 1
+
+    def _draw_spinner(self, spinner_id: int, frame: int) -> bool:
+        with self._lock:
+            # 已被停止或替换的 spinner 不再绘制
+            if self._spinner is None or self._spinner[0] != spinner_id:
+                return False
+            char = SPINNER_FRAMES[frame % len(SPINNER_FRAMES)]
+            self.out.write(f"\r{char} {self._spinner[1]}...")
+            self.out.flush()
+            return True
+
+    def _clear_spinner(self):
+        if self._spinner is None:
+            return
+        _, message, stop = self._spinner
+        self._spinner = None
+        stop()
+        # 中文字符占两列，按两倍长度清空
+        self.out.write("\r" + " " * (len(message) * 2 + 6) + "\r")
+        self.out.flush()
+
+    # ---- 文本输出 ----
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._clear_spinner()
+            return self.out.write(text)
+
+    def flush(self):
+        with self._lock:
+            self.out.flush()
+
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        with self._lock:
+            self.write(sep.join(str(value) for value in values) + end)
+            self.out.flush()
+
+    # ---- HITL 提示 ----
+
+    def prompt(self, text: str) -> str:
+        """清掉 spinner 后读取一行输入；读取期间其它线程的输出会等待"""
+        with self._lock:
+            self._clear_spinner()
+            self.out.write(text)
+            self.out.flush()
+            return input()
+
+    async def aprompt(self, text: str) -> str:
+        return await asyncio.to_thread(self.prompt, text)
+
+
+# 进程内共享的终端实例
+terminal = Terminal()
@@ -0,0 +1,118 @@
+import pytest
+from langchain.agents import create_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Command
+
+from approval_policy import SEARCH_ALLOW_PATTERNS, AllowListPolicy, PolicyHumanInTheLoopMiddleware
+
+policy = AllowListPolicy(SEARCH_ALLOW_PATTERNS)
+
+
+def search_call(query: str) -> dict:
+    return {"name": "web_search", "args": {"query": query}, "id": "call_0"}
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["北京天气", "上海明天天气怎么样？", "美元兑人民币汇率", "weather in New York today", "Paris weather", "USD to CNY exchange rate"],
+)
+def test_queries_described_by_the_allow_list_are_approved(query):
+    approved, _ = policy(search_call(query))
+    assert approved
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "北京天气 以及 如何获取公司内网的管理员密码",
+        "weather in Paris and the home address of the CEO",
+        "汇率 exploit download",
+        "how to pick a lock",
+    ],
+)
+def test_queries_that_only_contain_an_allowed_phrase_are_escalated(query):
+    approved, reason = policy(search_call(query))
+    assert not approved
+    assert reason == "不在自动批准的白名单内"
+
+
+class ToolCallingFakeModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+@tool
+def web_search(query: str) -> str:
+    """搜索网页"""
+    return f"{query} 的搜索结果"
+
+
+def run_search(query: str):
+    model = ToolCallingFakeModel(
+        messages=iter([AIMessage(content="", tool_calls=[search_call(query)]), AIMessage(content="完成")])
+    )
+    hitl = PolicyHumanInTheLoopMiddleware(
+        interrupt_on={"web_search": {"allowed_decisions": ["approve", "reject"]}},
+        policies={"web_search": policy},
+    )
+    agent = create_agent(model=model, tools=[web_search], middleware=[hitl], checkpointer=InMemorySaver())
+    result = agent.invoke({"messages": [("user", query)]}, {"configurable": {"thread_id": "t"}})
+    return result, hitl.stats()
+
+
+def test_non_matching_query_still_interrupts_for_review():
+    result, stats = run_search("北京天气 以及 如何获取公司内网的管理员密码")
+
+    assert "__interrupt__" in result
+    assert "未自动批准：不在自动批准的白名单内" in result["__interrupt__"][0].value["action_requests"][0]["description"]
+    assert stats["escalated"] == 1 and stats["auto_approved"] == 0
+
+
+def test_matching_query_runs_without_interrupt():
+    result, stats = run_search("北京天气")
+
+    assert "__interrupt__" not in result
+    assert result["messages"][-1].content == "完成"
+    assert stats["interrupts_avoided"] == 1
+
+
+class SwitchablePolicy:
+    """只批准 allowed 中的查询；测试中在中断与恢复之间修改 allowed"""
+
+    def __init__(self, allowed: set[str]):
+        self.allowed = allowed
+
+    def __call__(self, tool_call):
+        approved = tool_call["args"]["query"] in self.allowed
+        return approved, "允许" if approved else "不允许"
+
+
+def test_resume_uses_the_verdicts_recorded_at_interrupt_time():
+    calls = [
+        {"name": "web_search", "args": {"query": "内网密码"}, "id": "call_0"},
+        {"name": "web_search", "args": {"query": "北京天气"}, "id": "call_1"},
+    ]
+    model = ToolCallingFakeModel(messages=iter([AIMessage(content="", tool_calls=calls), AIMessage(content="完成")]))
+    switchable = SwitchablePolicy({"北京天气"})
+    hitl = PolicyHumanInTheLoopMiddleware(
+        interrupt_on={"web_search": {"allowed_decisions": ["approve", "reject"]}},
+        policies={"web_search": switchable},
+    )
+    agent = create_agent(model=model, tools=[web_search], middleware=[hitl], checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "t"}}
+
+    result = agent.invoke({"messages": [("user", "搜索")]}, config)
+    assert [r["args"]["query"] for r in result["__interrupt__"][0].value["action_requests"]] == ["内网密码"]
+
+    # 中断期间策略的判断变了：恢复时如果重新评估，会有两个调用等待审批而只有一个回答
+    switchable.allowed = set()
+    result = agent.invoke(Command(resume={"decisions": [{"type": "reject", "message": "不允许"}]}), config)
+
+    tool_messages = {m.tool_call_id: m for m in result["messages"] if isinstance(m, ToolMessage)}
+    assert tool_messages["call_0"].status == "error"
+    assert tool_messages["call_1"].content == "北京天气 的搜索结果"
+    assert result["messages"][-1].content == "完成"
+    assert hitl.stats()["escalated"] == 1
@@ -0,0 +1,312 @@
+import json
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import (
+    SCHEMA_CACHE_VERSION,
+    CachedSQLDatabase,
+    QueryTooExpensive,
+    get_readonly_engine,
+    is_statement_timeout,
+)
+from nl2sql import DEFAULT_DB_PATH
+
+# InvoiceLine × Track 的笛卡尔积约 780 万行
+CROSS_JOIN = "SELECT il.InvoiceLineId, t.Name FROM InvoiceLine il, Track t"
+
+
+@pytest.fixture
+def slow_log(tmp_path):
+    return tmp_path / "slow.jsonl"
+
+
+def _db(slow_log, **kwargs) -> CachedSQLDatabase:
+    return CachedSQLDatabase(
+        get_readonly_engine(str(DEFAULT_DB_PATH)),
+        schema_cache_path=False,
+        query_cache_bytes=0,
+        slow_query_log=str(slow_log),
+        **kwargs,
+    )
+
+
+def _records(slow_log) -> list[dict]:
+    return [json.loads(line) for line in slow_log.read_text(encoding="utf-8").splitlines()]
+
+
+def test_streaming_query_over_budget_is_rewritten_with_limit(slow_log):
+    db = _db(slow_log, max_result_rows=10)
+
+    result = db.run(CROSS_JOIN)
+
+    assert "（共 10 行）" in result
+    assert "已自动添加 LIMIT 10" in result
+    assert "- SCAN" in result  # 查询计划随结果返回
+    assert [r["action"] for r in _records(slow_log)] == ["rewritten"]
+
+
+def test_blocking_query_over_budget_is_rejected_with_plan(slow_log):
+    db = _db(slow_log)
+    query = "SELECT t.Name, COUNT(*) FROM InvoiceLine il, Track t GROUP BY t.Name"
+
+    with pytest.raises(QueryTooExpensive):
+        db.run(query)
+    observation = db.run_no_throw(query)
+
+    assert observation.startswith("Error: 查询代价过高")
+    assert "USE TEMP B-TREE FOR GROUP BY" in observation
+    assert {r["action"] for r in _records(slow_log)} == {"rejected"}
+
+
+def test_cheap_query_is_not_guarded(slow_log):
+    db = _db(slow_log, cost_guard="reject", slow_query_ms=10_000)
+
+    assert db.run("SELECT COUNT(*) FROM Track") == "COUNT(*)\n3503\n（共 1 行）"
+    # 流式查询自带的小 LIMIT 已经限定了实际扫描量
+    assert "（共 5 行）" in db.run(f"{CROSS_JOIN} LIMIT 5")
+    assert not slow_log.exists()
+
+
+def test_fetch_one_and_repr_format_use_sql_database_paths(slow_log):
+    # 这两条路径走 SQLDatabase.run / _execute，不能被子类的同名方法覆盖
+    db = _db(slow_log, result_format="repr")
+
+    assert db.run("SELECT 1", fetch="one") == "[(1,)]"
+    assert db.run("SELECT GenreId, Name FROM Genre ORDER BY GenreId LIMIT 2") == "[(1, 'Rock'), (2, 'Jazz')]"
+    assert db.run("SELECT Name FROM Genre WHERE GenreId = 1", include_columns=True) == "[{'Name': 'Rock'}]"
+
+
+def test_fetch_one_with_columnar_format_and_cursor(slow_log):
+    db = _db(slow_log)
+
+    assert db.run("SELECT Name FROM Genre ORDER BY GenreId", fetch="one") == "[('Rock',)]"
+    cursor = db.run("SELECT Name FROM Genre ORDER BY GenreId", fetch="cursor")
+    assert cursor.fetchone()[0] == "Rock"
+    cursor.close()
+
+
+def _data_lines(result: str) -> list[str]:
+    """去掉表头和最后一行的行数 / 截断说明"""
+    return result.split("\n")[1:-1]
+
+
+def test_columnar_output_stops_at_the_row_cap_and_counts_the_rest(slow_log):
+    # 批大小不整除总行数：预算用满后剩余的批次仍然计入总行数
+    db = _db(slow_log, max_result_rows=10, fetch_batch_size=7)
+
+    result = db.run("SELECT TrackId FROM Track ORDER BY TrackId")
+
+    assert result.split("\n")[0] == "TrackId"
+    assert _data_lines(result) == [str(i) for i in range(1, 11)]
+    assert result.endswith("（结果已截断：共 3503 行，仅显示前 10 行。请使用 LIMIT、WHERE 或聚合函数缩小结果集）")
+
+
+def test_columnar_output_stops_at_the_byte_cap(slow_log):
+    db = _db(slow_log, max_result_rows=1000, max_result_bytes=300)
+
+    result = db.run("SELECT TrackId, Name FROM Track ORDER BY TrackId")
+    body = "\n".join(result.split("\n")[:-1]) + "\n"
+
+    assert len(body.encode("utf-8")) <= 300
+    shown = len(_data_lines(result))
+    assert 0 < shown < 1000
+    assert f"共 3503 行，仅显示前 {shown} 行" in result.split("\n")[-1]
+
+
+def test_byte_cap_counts_utf8_bytes(slow_log):
+    db = _db(slow_log, max_result_bytes=len("v\n".encode("utf-8")) + 2 * len("天气\n".encode("utf-8")))
+
+    result = db.run("SELECT column1 AS v FROM (VALUES ('天气'), ('天气'), ('天气'))")
+
+    assert _data_lines(result) == ["天气", "天气"]
+    assert "共 3 行，仅显示前 2 行" in result
+
+
+def test_result_exactly_at_the_row_cap_is_not_truncated(slow_log):
+    db = _db(slow_log, max_result_rows=25)
+
+    result = db.run("SELECT GenreId FROM Genre ORDER BY GenreId")
+
+    assert len(_data_lines(result)) == 25
+    assert result.endswith("（共 25 行）")
+    assert "截断" not in result
+
+
+def test_columnar_values_cannot_break_the_layout(slow_log):
+    db = _db(slow_log)
+
+    result = db.run("SELECT 'a|b' || char(10) || 'c' AS v, NULL AS n")
+
+    assert result == "v | n\na/b c | NULL\n（共 1 行）"
+
+
+def _music_db(tmp_path):
+    path = tmp_path / "music.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Genre (GenreId INTEGER PRIMARY KEY, Name TEXT)")
+        conn.execute("INSERT INTO Genre (Name) VALUES ('Rock')")
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """记录表信息缓存的重建次数（即真正做反射的次数）"""
+    calls = []
+    original = CachedSQLDatabase._build
+
+    def _build(self, fingerprint):
+        calls.append(fingerprint)
+        return original(self, fingerprint)
+
+    monkeypatch.setattr(CachedSQLDatabase, "_build", _build)
+    return calls
+
+
+def _schema_db(path) -> CachedSQLDatabase:
+    return CachedSQLDatabase(get_readonly_engine(str(path)), query_cache_bytes=0, slow_query_log=False)
+
+
+def test_schema_sidecar_is_written_and_reused_on_cold_start(tmp_path, builds):
+    path = _music_db(tmp_path)
+    first = _schema_db(path)
+    sidecar = json.loads((tmp_path / "music.db.schema.json").read_text(encoding="utf-8"))
+
+    assert sidecar["version"] == SCHEMA_CACHE_VERSION
+    assert sidecar["fingerprint"] == first.fingerprint
+    assert sidecar["order"] == ["Genre"]
+
+    second = _schema_db(path)
+
+    assert len(builds) == 1
+    assert second.get_table_info() == first.get_table_info()
+    assert second.get_usable_table_names() == ["Genre"]
+
+
+def test_schema_change_invalidates_memory_cache_and_sidecar(tmp_path, builds):
+    path = _music_db(tmp_path)
+    db = _schema_db(path)
+    assert "Year" not in db.get_table_info()
+
+    with sqlite3.connect(path) as conn:
+        conn.execute("ALTER TABLE Genre ADD COLUMN Year INTEGER")
+        conn.execute("CREATE TABLE Artist (ArtistId INTEGER PRIMARY KEY, Name TEXT)")
+    conn.close()
+
+    assert "Year" in db.get_table_info(["Genre"])
+    assert db.get_usable_table_names() == ["Artist", "Genre"]
+    assert len(builds) == 2
+    sidecar = json.loads((tmp_path / "music.db.schema.json").read_text(encoding="utf-8"))
+    assert sidecar["fingerprint"] == db.fingerprint
+    # 新进程直接使用更新后的 sidecar
+    assert "Year" in _schema_db(path).get_table_info(["Genre"])
+    assert len(builds) == 2
+
+
+@pytest.mark.parametrize(
+    "sidecar",
+    [
+        "not json",
+        json.dumps({"version": SCHEMA_CACHE_VERSION, "fingerprint": "stale", "order": [], "tables": {}}),
+        json.dumps({"version": SCHEMA_CACHE_VERSION + 1, "fingerprint": None, "order": [], "tables": {}}),
+    ],
+)
+def test_unusable_sidecar_is_ignored_and_rewritten(tmp_path, builds, sidecar):
+    path = _music_db(tmp_path)
+    (tmp_path / "music.db.schema.json").write_text(sidecar, encoding="utf-8")
+
+    db = _schema_db(path)
+
+    assert len(builds) == 1
+    assert db.get_usable_table_names() == ["Genre"]
+    rewritten = json.loads((tmp_path / "music.db.schema.json").read_text(encoding="utf-8"))
+    assert rewritten["fingerprint"] == db.fingerprint
+
+
+def test_forced_refresh_rebuilds_even_when_fingerprint_matches(tmp_path, builds):
+    db = _schema_db(_music_db(tmp_path))
+
+    db.refresh_schema_cache()
+    assert len(builds) == 1
+    db.refresh_schema_cache(force=True)
+    assert len(builds) == 2
+
+
+# 有上限的递归计数：超时失效时测试最多慢几秒，而不是一直挂起
+LONG_QUERY = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 50000000) SELECT COUNT(*) FROM c"
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "INSERT INTO Genre (Name) VALUES ('Jazz')",
+        "UPDATE Genre SET Name = 'Jazz'",
+        "CREATE TABLE Artist (ArtistId INTEGER PRIMARY KEY)",
+        "PRAGMA query_only = OFF",
+    ],
+)
+def test_readonly_engine_refuses_writes_that_bypass_the_sql_check(tmp_path, statement):
+    path = _music_db(tmp_path)
+    engine = get_readonly_engine(str(path), statement_timeout=None)
+
+    with engine.connect() as conn:
+        try:
+            conn.execute(text(statement))
+            conn.execute(text("INSERT INTO Genre (Name) VALUES ('Jazz')"))
+            conn.commit()
+        except OperationalError as e:
+            assert "readonly" in str(e) or "attempt to write" in str(e)
+        else:
+            pytest.fail("只读 Engine 执行了写入")
+
+    with sqlite3.connect(path) as check:
+        assert check.execute("SELECT Name FROM Genre").fetchall() == [("Rock",)]
+    check.close()
+
+
+def test_readonly_engine_is_shared_and_requires_an_existing_file(tmp_path):
+    path = _music_db(tmp_path)
+
+    assert get_readonly_engine(str(path)) is get_readonly_engine(path)
+    assert get_readonly_engine(str(path)) is not get_readonly_engine(str(path), statement_timeout=1)
+    with pytest.raises(FileNotFoundError):
+        get_readonly_engine(str(tmp_path / "missing.db"))
+    assert not (tmp_path / "missing.db").exists()
+
+
+def test_statement_timeout_interrupts_long_queries(tmp_path, slow_log):
+    engine = get_readonly_engine(str(_music_db(tmp_path)), statement_timeout=0.2)
+    db = CachedSQLDatabase(
+        engine, schema_cache_path=False, query_cache_bytes=0, cost_guard="off", slow_query_log=str(slow_log)
+    )
+
+    with pytest.raises(OperationalError) as excinfo:
+        db.run(LONG_QUERY)
+    assert is_statement_timeout(excinfo.value)
+    assert db.run_no_throw(LONG_QUERY).startswith("Error: 查询执行超过 0.2 秒已被取消")
+    assert [r["action"] for r in _records(slow_log)] == ["timeout", "timeout"]
+    # 超时的连接归还连接池后计时清零，之后的查询不受影响
+    assert db.run("SELECT COUNT(*) FROM Genre") == "COUNT(*)\n1\n（共 1 行）"
+
+
+def test_statement_timeout_starts_when_a_statement_executes(tmp_path):
+    engine = get_readonly_engine(str(_music_db(tmp_path)), statement_timeout=0.2)
+
+    with engine.connect() as conn:
+        # 连接空闲的时间不计入超时
+        time.sleep(0.3)
+        assert conn.execute(text("SELECT COUNT(*) FROM Genre")).scalar() == 1
+        time.sleep(0.3)
+        assert conn.execute(text("SELECT Name FROM Genre")).scalar() == "Rock"
+
+
+def test_statement_timeout_can_be_disabled(tmp_path):
+    engine = get_readonly_engine(str(_music_db(tmp_path)), statement_timeout=None)
+    short = LONG_QUERY.replace("50000000", "300000")
+
+    with engine.connect() as conn:
+        assert conn.execute(text(short)).scalar() == 300000
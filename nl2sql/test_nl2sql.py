@@ -0,0 +1,50 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+import nl2sql
+
+
+def _model() -> GenericFakeChatModel:
+    return GenericFakeChatModel(messages=iter([]))
+
+
+def test_verbose_info_is_printed_on_cache_hits(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    model = _model()
+
+    first = nl2sql.create_nl2sql_agent(verbose=True, model=model)
+    built = capsys.readouterr().out
+    second = nl2sql.create_nl2sql_agent(verbose=True, model=model)
+    cached = capsys.readouterr().out
+    nl2sql.create_nl2sql_agent(model=model)
+
+    assert first is second
+    assert "sql_db_query" in built
+    assert cached == built
+    assert capsys.readouterr().out == ""
+
+
+def test_checkpoint_db_is_part_of_the_cache_key(monkeypatch, tmp_path):
+    model = _model()
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "a.db"))
+    first = nl2sql.create_nl2sql_agent(model=model)
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "b.db"))
+    second = nl2sql.create_nl2sql_agent(model=model)
+
+    assert first is not second
+    assert first.checkpointer.path == str(tmp_path / "a.db")
+    assert second.checkpointer.path == str(tmp_path / "b.db")
+
+
+def test_agent_cache_is_bounded(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(nl2sql, "MAX_CACHED_AGENTS", 2)
+    models = [_model() for _ in range(3)]
+
+    first = nl2sql.create_nl2sql_agent(model=models[0])
+    nl2sql.create_nl2sql_agent(model=models[1])
+    nl2sql.create_nl2sql_agent(model=models[2])
+
+    assert len(nl2sql._agents) == 2
+    # 调用方仍持有已淘汰的 Agent 时可以继续读取其审批统计
+    assert nl2sql.get_approval_stats(first)["tool_calls"] == 0
+    assert nl2sql.create_nl2sql_agent(model=models[0]) is not first
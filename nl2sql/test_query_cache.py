@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from database import CachedSQLDatabase, get_readonly_engine
+from nl2sql import DEFAULT_DB_PATH
+from query_cache import QueryRejected, QueryResultCache, check_read_only, is_read_only, normalize_sql
+
+
+def test_normalize_sql_ignores_formatting_case_and_number_spelling():
+    a = "select  Name from Genre\n where GenreId = 1.0 -- 摇滚\n;"
+    b = "SELECT name FROM genre WHERE genreid = 1.00"
+
+    assert normalize_sql(a) == normalize_sql(b) == "SELECT NAME FROM GENRE WHERE GENREID = 1.0"
+    # 字符串字面量与加引号的标识符大小写敏感
+    assert normalize_sql("SELECT 'Rock'") != normalize_sql("SELECT 'rock'")
+    assert normalize_sql('SELECT "Rock"') != normalize_sql('SELECT "rock"')
+
+
+def test_double_quoted_strings_do_not_share_a_cache_entry():
+    db = CachedSQLDatabase(get_readonly_engine(str(DEFAULT_DB_PATH)), schema_cache_path=False, slow_query_log=False)
+    # Artist 表没有名为 Queen 的列，SQLite 把 "Queen" 当作字符串字面量
+    upper = db.run('SELECT ArtistId FROM Artist WHERE Name = "Queen"')
+    lower = db.run('SELECT ArtistId FROM Artist WHERE Name = "queen"')
+
+    assert upper == "ArtistId\n51\n（共 1 行）"
+    assert lower == "ArtistId\n（共 0 行）"
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT Name AS Release FROM Genre",
+        "SELECT Name FROM Genre WHERE Name = 'DELETE FROM Genre'",
+        "SELECT replace(Name, 'a', 'b') AS Update_Time FROM Genre;",
+        "WITH g(id, name) AS (SELECT GenreId, Name FROM Genre), t AS MATERIALIZED (SELECT 1) SELECT * FROM g, t",
+        "WITH RECURSIVE n(x) AS (VALUES(1) UNION ALL SELECT x + 1 FROM n WHERE x < 3) SELECT x FROM n",
+        "EXPLAIN QUERY PLAN SELECT * FROM Track",
+        "VALUES (1), (2)",
+    ],
+)
+def test_read_only_statements_with_write_words_are_accepted(sql):
+    check_read_only(sql)
+    assert is_read_only(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "",
+        "DELETE FROM Genre",
+        "PRAGMA writable_schema = 1",
+        "ATTACH DATABASE 'x.db' AS x",
+        "SELECT 1; DROP TABLE Genre",
+        "WITH g AS (SELECT 1) DELETE FROM Genre",
+        "WITH g AS (SELECT 1) INSERT INTO Genre (Name) SELECT * FROM g",
+        "EXPLAIN UPDATE Genre SET Name = 'x'",
+        "WITH g AS (SELECT 1 SELECT * FROM g",
+    ],
+)
+def test_writes_and_malformed_statements_are_rejected(sql):
+    with pytest.raises(QueryRejected):
+        check_read_only(sql)
+    assert not is_read_only(sql)
+
+
+def test_result_cache_evicts_least_recently_used_by_bytes():
+    cache = QueryResultCache(max_bytes=10, max_entry_bytes=10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.set("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("c") == "cccc"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_query_cache_is_invalidated_when_database_changes(tmp_path):
+    path = tmp_path / "music.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE Genre (GenreId INTEGER PRIMARY KEY, Name TEXT)")
+        conn.execute("INSERT INTO Genre (Name) VALUES ('Rock')")
+    db = CachedSQLDatabase(get_readonly_engine(str(path)), schema_cache_path=False, slow_query_log=False)
+    query = "SELECT COUNT(*) FROM Genre"
+
+    assert db.run(query) == db.run(query.lower())
+    assert db.query_cache_stats()["hits"] == 1
+    first_fingerprint = db.fingerprint
+
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO Genre (Name) VALUES ('Jazz')")
+    conn.close()
+
+    assert db.fingerprint != first_fingerprint
+    assert db.run(query).startswith("COUNT(*)\n2")
+    stats = db.query_cache_stats()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 1
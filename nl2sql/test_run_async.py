@@ -0,0 +1,203 @@
+import asyncio
+import os
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import nl2sql
+import run_async
+from run_async import CANCELLED_TOOL_RESULT, LineReader, repair_cancelled_turn, run_turn
+from test_run_stream import FakeStreamingModel
+
+# 返回 3503 行，超过自动执行的行数上限，需要人工审批
+SLOW_QUERY = {"name": "sql_db_query", "args": {"query": "SELECT TrackId FROM Track"}, "id": "call-1"}
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_db(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+
+
+def _agent(replies: list[AIMessage], token_delay: float = 0.0):
+    model = FakeStreamingModel(messages=iter(replies), token_delay=token_delay)
+    model.events = []
+    return nl2sql.create_nl2sql_agent(model=model)
+
+
+class PipeInput:
+    """模拟终端输入：写入管道的每一行都会被 LineReader 读到"""
+
+    def __init__(self):
+        read_fd, self._write_fd = os.pipe()
+        self.stream = os.fdopen(read_fd, "r", encoding="utf-8")
+
+    def type(self, line: str):
+        os.write(self._write_fd, (line + "\n").encode("utf-8"))
+
+    def paste(self, data: bytes):
+        # 一次写入多行，模拟粘贴
+        os.write(self._write_fd, data)
+
+    def close_input(self):
+        os.close(self._write_fd)
+        self._write_fd = None
+
+    def close(self):
+        if self._write_fd is not None:
+            os.close(self._write_fd)
+        self.stream.close()
+
+
+@pytest.fixture
+def keyboard():
+    pipe = PipeInput()
+    yield pipe
+    pipe.close()
+
+
+async def _wait_until(predicate, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+def test_cancelling_a_streaming_turn_keeps_the_session_usable(keyboard):
+    agent = _agent(
+        [
+            AIMessage(content="这是 一段 很长 很长 的 回答 " * 5, id="slow"),
+            AIMessage(content="好的", id="next"),
+        ],
+        token_delay=0.05,
+    )
+    config = {"configurable": {"thread_id": "cancel-stream"}}
+
+    async def main():
+        reader = LineReader(keyboard.stream)
+        reader.start()
+        try:
+            turn = asyncio.create_task(run_turn(agent, "讲个长故事", config, reader))
+            await asyncio.sleep(0.2)
+            turn.cancel()
+            await asyncio.wait({turn})
+            assert turn.cancelled()
+            await repair_cancelled_turn(agent, config)
+            await run_turn(agent, "那就简单说", config, reader)
+        finally:
+            reader.close()
+
+    asyncio.run(main())
+
+    messages = agent.get_state(config).values["messages"]
+    assert [m.content for m in messages if isinstance(m, HumanMessage)] == ["讲个长故事", "那就简单说"]
+    assert messages[-1].content == "好的"
+
+
+def test_turn_cancelled_while_awaiting_approval_is_repaired(keyboard):
+    agent = _agent(
+        [
+            AIMessage(content="", tool_calls=[SLOW_QUERY], id="plan"),
+            AIMessage(content="好的，换个问题", id="next"),
+        ]
+    )
+    config = {"configurable": {"thread_id": "cancel-hitl"}}
+
+    async def main():
+        reader = LineReader(keyboard.stream)
+        reader.start()
+        try:
+            turn = asyncio.create_task(run_turn(agent, "列出全部曲目", config, reader))
+            # 停在审批提示处时取消
+            await _wait_until(lambda: _awaiting_approval(agent, config))
+            await asyncio.sleep(0.05)
+            turn.cancel()
+            await asyncio.wait({turn})
+            await repair_cancelled_turn(agent, config)
+            # 取消后的输入属于下一个问题，不会被已经取消的审批读走
+            keyboard.type("换个问题")
+            line = await asyncio.wait_for(reader.readline(), 5)
+            await run_turn(agent, line, config, reader)
+        finally:
+            reader.close()
+
+    asyncio.run(main())
+
+    messages = agent.get_state(config).values["messages"]
+    tool_messages = [m for m in messages if isinstance(m, ToolMessage)]
+    assert [(m.tool_call_id, m.content) for m in tool_messages] == [("call-1", CANCELLED_TOOL_RESULT)]
+    assert [m.content for m in messages if isinstance(m, HumanMessage)] == ["列出全部曲目", "换个问题"]
+    assert messages[-1].content == "好的，换个问题"
+
+
+def test_repair_is_a_no_op_when_every_call_has_a_result():
+    agent = _agent([AIMessage(content="你好", id="hello")])
+    config = {"configurable": {"thread_id": "no-op"}}
+
+    async def main():
+        await run_async.astream_once(agent, {"messages": [HumanMessage(content="你好")]}, config)
+        before = (await agent.aget_state(config)).values["messages"]
+        await repair_cancelled_turn(agent, config)
+        return before, (await agent.aget_state(config)).values["messages"]
+
+    before, after = asyncio.run(main())
+
+    assert [m.id for m in after] == [m.id for m in before]
+
+
+def test_type_ahead_lines_are_not_used_as_approval_answers(keyboard):
+    agent = _agent(
+        [
+            AIMessage(content="", tool_calls=[SLOW_QUERY], id="plan"),
+            AIMessage(content="共有 3503 首", id="answer"),
+        ]
+    )
+    config = {"configurable": {"thread_id": "type-ahead"}}
+
+    async def main():
+        reader = LineReader(keyboard.stream)
+        reader.start()
+        try:
+            # 回答还在生成时用户已经输入了下一个问题（恰好是 "r"）
+            keyboard.type("r")
+            await _wait_until(reader.has_pending)
+            turn = asyncio.create_task(run_turn(agent, "列出全部曲目", config, reader))
+            await _wait_until(lambda: _awaiting_approval(agent, config))
+            await asyncio.sleep(0.05)
+            keyboard.type("a")
+            await asyncio.wait_for(turn, 5)
+            return await asyncio.wait_for(reader.readline(), 1)
+        finally:
+            reader.close()
+
+    typed_ahead = asyncio.run(main())
+
+    assert typed_ahead == "r"
+    messages = agent.get_state(config).values["messages"]
+    result = next(m for m in messages if isinstance(m, ToolMessage))
+    assert result.status != "error"
+    assert "3503" in messages[-1].content
+
+
+def test_pasted_lines_are_all_delivered_without_another_keypress(keyboard):
+    async def main():
+        reader = LineReader(keyboard.stream)
+        reader.start()
+        try:
+            data = "第一个问题\r\n第二个问题\n第三个问题\n没有换行的最后一行".encode("utf-8")
+            # 第二次写入从"三"字的中间开始：多字节字符被拆开也能正确解码
+            split = data.index("三".encode("utf-8")) + 1
+            keyboard.paste(data[:split])
+            keyboard.paste(data[split:])
+            lines = [await asyncio.wait_for(reader.readline(), 2) for _ in range(3)]
+            keyboard.close_input()
+            lines += [await asyncio.wait_for(reader.readline(), 2) for _ in range(2)]
+            return lines
+        finally:
+            reader.close()
+
+    assert asyncio.run(main()) == ["第一个问题", "第二个问题", "第三个问题", "没有换行的最后一行", None]
+
+
+def _awaiting_approval(agent, config) -> bool:
+    return bool(agent.get_state(config).interrupts)
@@ -0,0 +1,184 @@
+import json
+import re
+import sys
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+import nl2sql
+import run_stream
+
+
+class FakeStreamingModel(GenericFakeChatModel):
+    """按空白切分逐个 token 流式输出的假模型，工具调用放在最后一个 chunk 中；每个 token 产出时记录到 events"""
+
+    events: list = []
+    token_delay: float = 0.0
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = next(self.messages)
+        for token in re.split(r"(\s)", message.content) if message.content else []:
+            time.sleep(self.token_delay)
+            self.events.append(("emit", token))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, id=message.id))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if message.tool_calls:
+            tool_call_chunks = [
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ]
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content="", id=message.id, tool_call_chunks=tool_call_chunks)
+            )
+
+
+class RecordingStdout:
+    """记录每次 write 的 stdout 替身"""
+
+    def __init__(self, events: list):
+        self.events = events
+
+    def write(self, text: str) -> int:
+        self.events.append(("write", text))
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def events(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    recorded: list = []
+    # spinner 线程的输出与本测试无关
+    monkeypatch.setattr(run_stream.terminal, "start_spinner", lambda message="": None)
+    return recorded
+
+
+def _agent(replies: list[AIMessage], events: list, monkeypatch, token_delay: float = 0.0):
+    # pytest 在测试开始时才切换输出捕获，因此在测试函数内替换 stdout
+    monkeypatch.setattr(sys, "stdout", RecordingStdout(events))
+    model = FakeStreamingModel(messages=iter(replies), token_delay=token_delay)
+    model.events = events
+    return nl2sql.create_nl2sql_agent(model=model)
+
+
+def _tokens_written(events: list) -> list[str]:
+    return [text for kind, text in events if kind == "write" and text.strip() and not text.startswith("\n")]
+
+
+def test_tokens_are_written_as_they_are_produced(events, monkeypatch):
+    # 模拟真实模型的 token 间隔，模型在后台线程生成，主线程边收边写
+    agent = _agent(
+        [AIMessage(content="Chinook 中共有 3503 首曲目。", id="answer")], events, monkeypatch, token_delay=0.05
+    )
+
+    result = run_stream.stream_once(
+        agent,
+        {"messages": [HumanMessage(content="一共有多少首曲目？")]},
+        {"configurable": {"thread_id": "order"}},
+    )
+
+    assert result == {}
+    assert _tokens_written(events) == ["Chinook", "中共有", "3503", "首曲目。"]
+    # 每个 token 都在下一个 token 产出之前写出，而不是等整条消息生成完
+    sequence = [(kind, text) for kind, text in events if text.strip() and not text.startswith("\n")]
+    assert sequence == [
+        ("emit", "Chinook"), ("write", "Chinook"),
+        ("emit", "中共有"), ("write", "中共有"),
+        ("emit", "3503"), ("write", "3503"),
+        ("emit", "首曲目。"), ("write", "首曲目。"),
+    ]
+
+
+def test_interrupt_is_returned_and_resume_streams_answer(events, monkeypatch):
+    # 返回 3503 行，超过自动执行的行数上限，需要人工审批
+    tool_call = {"name": "sql_db_query", "args": {"query": "SELECT TrackId FROM Track"}, "id": "call-1"}
+    agent = _agent(
+        [
+            AIMessage(content="先 查询 数据库", tool_calls=[tool_call], id="plan"),
+            AIMessage(content="共有 3503 首", id="answer"),
+        ],
+        events,
+        monkeypatch,
+    )
+    config = {"configurable": {"thread_id": "interrupt"}}
+
+    result = run_stream.stream_once(agent, {"messages": [HumanMessage(content="一共有多少首曲目？")]}, config)
+
+    assert "__interrupt__" in result
+    action = result["__interrupt__"][0].value["action_requests"][0]
+    assert action["name"] == "sql_db_query"
+    assert action["args"] == tool_call["args"]
+    assert "超过自动执行上限" in action["description"]
+    assert _tokens_written(events) == ["先", "查询", "数据库"]
+
+    events.clear()
+    monkeypatch.setattr("builtins.input", lambda prompt="": "a")
+    result = run_stream.handle_hitl_once(agent, result, config)
+
+    assert result == {}
+    assert _tokens_written(events)[-3:] == ["共有", "3503", "首"]
+    messages = agent.get_state(config).values["messages"]
+    assert "3503" in messages[-2].content  # 审批后 SQL 真正执行，ToolMessage 中是查询结果
+
+
+def test_cheap_read_only_query_is_auto_approved(events, monkeypatch):
+    tool_call = {"name": "sql_db_query", "args": {"query": "SELECT COUNT(*) FROM Track"}, "id": "call-1"}
+    agent = _agent(
+        [
+            AIMessage(content="", tool_calls=[tool_call], id="plan"),
+            AIMessage(content="共有 3503 首", id="answer"),
+        ],
+        events,
+        monkeypatch,
+    )
+    config = {"configurable": {"thread_id": "auto"}}
+
+    result = run_stream.stream_once(agent, {"messages": [HumanMessage(content="一共有多少首曲目？")]}, config)
+
+    assert result == {}
+    messages = agent.get_state(config).values["messages"]
+    assert "3503" in messages[-2].content
+    stats = nl2sql.get_approval_stats(agent)
+    assert (stats["auto_approved"], stats["interrupts"], stats["interrupts_avoided"]) == (1, 0, 1)
+
+
+def test_only_unsafe_calls_are_escalated(events, monkeypatch):
+    cheap = {"name": "sql_db_query", "args": {"query": "SELECT COUNT(*) FROM Genre"}, "id": "call-cheap"}
+    write = {"name": "sql_db_query", "args": {"query": "DELETE FROM Genre"}, "id": "call-write"}
+    agent = _agent(
+        [
+            AIMessage(content="", tool_calls=[cheap, write], id="plan"),
+            AIMessage(content="完成", id="answer"),
+        ],
+        events,
+        monkeypatch,
+    )
+    config = {"configurable": {"thread_id": "mixed"}}
+
+    result = run_stream.stream_once(agent, {"messages": [HumanMessage(content="统计并清空流派")]}, config)
+
+    actions = result["__interrupt__"][0].value["action_requests"]
+    assert [action["args"]["query"] for action in actions] == ["DELETE FROM Genre"]
+
+    monkeypatch.setattr("builtins.input", lambda prompt="": "r")
+    assert run_stream.handle_hitl_once(agent, result, config) == {}
+
+    messages = agent.get_state(config).values["messages"]
+    results = {m.tool_call_id: m for m in messages if m.type == "tool"}
+    assert "25" in results["call-cheap"].content
+    assert results["call-write"].status == "error"
+    # 调用顺序与模型输出一致
+    plan = next(m for m in messages if m.id == "plan")
+    assert [call["id"] for call in plan.tool_calls] == ["call-cheap", "call-write"]
+    stats = nl2sql.get_approval_stats(agent)
+    assert (stats["auto_approved"], stats["escalated"], stats["interrupts"], stats["human_reviews"]) == (1, 1, 1, 1)
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+import run_typewriter
+from run_typewriter import TypewriterRenderer
+
+
+class RecordingOut:
+    """记录每次 write 的时间与内容"""
+
+    def __init__(self):
+        self.writes: list[tuple[float, str]] = []
+
+    def write(self, text: str) -> int:
+        self.writes.append((time.monotonic(), text))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    @property
+    def text(self) -> str:
+        return "".join(text for _, text in self.writes)
+
+
+def _renderer(out: RecordingOut, **kwargs) -> TypewriterRenderer:
+    return TypewriterRenderer(out=out, skip_on_enter=False, **kwargs)
+
+
+def test_output_is_paced_at_chars_per_frame():
+    out = RecordingOut()
+    renderer = _renderer(out, fps=100, chars_per_second=200, max_lag=5)
+
+    renderer.feed("abcdefghij" * 2)
+    renderer.close(newline=False)
+
+    assert out.text == "abcdefghij" * 2
+    assert all(len(text) <= 2 for _, text in out.writes)
+    assert renderer.frames_written == 10
+
+
+def test_backlog_older_than_max_lag_is_flushed_in_one_frame():
+    out = RecordingOut()
+    # 每秒 10 个字符：不追赶的话 100 个字符需要 10 秒
+    renderer = _renderer(out, fps=50, chars_per_second=10, max_lag=0.1)
+
+    start = time.monotonic()
+    renderer.feed("x" * 100)
+    renderer.close(newline=False)
+    elapsed = time.monotonic() - start
+
+    assert out.text == "x" * 100
+    assert elapsed < 1.0
+    assert max(len(text) for _, text in out.writes) >= 90
+
+
+def test_skip_writes_everything_received_immediately():
+    out = RecordingOut()
+    renderer = _renderer(out, fps=50, chars_per_second=1, max_lag=60)
+
+    renderer.feed("y" * 50)
+    time.sleep(0.05)
+    skipped_at = time.monotonic()
+    renderer.skip()
+    renderer.feed("z" * 10)
+    renderer.close(newline=True)
+
+    assert out.text == "y" * 50 + "z" * 10 + "\n"
+    assert out.writes[-1][0] - skipped_at < 0.5
+
+
+def test_without_pacing_each_frame_writes_the_whole_buffer():
+    out = RecordingOut()
+    renderer = _renderer(out, fps=20, chars_per_second=0)
+
+    renderer.feed("hello ")
+    renderer.feed("world")
+    renderer.close(newline=False)
+
+    assert [text for _, text in out.writes] == ["hello world"]
+
+
+@pytest.mark.parametrize("kwargs", [{"fps": 0}, {"fps": -30}, {"chars_per_second": -1}])
+def test_invalid_rates_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        _renderer(RecordingOut(), **kwargs)
+
+
+def test_hitl_uses_the_shared_decision_prompt(monkeypatch):
+    asked, resumed = [], []
+
+    def collect_decisions(interrupt_list):
+        asked.append(interrupt_list)
+        return [{"type": "reject"}]
+
+    def stream_typewriter(agent, inputs, config, label):
+        resumed.append(inputs.resume)
+        return {}
+
+    monkeypatch.setattr(run_typewriter, "collect_decisions", collect_decisions)
+    monkeypatch.setattr(run_typewriter, "stream_typewriter", stream_typewriter)
+    interrupt_list = ["待审批的 SQL"]
+
+    assert run_typewriter.handle_hitl_if_needed(None, {"__interrupt__": interrupt_list}, {}) == {}
+    assert asked == [interrupt_list]
+    assert resumed == [{"decisions": [{"type": "reject"}]}]
+    assert run_typewriter.handle_hitl_if_needed(None, {"messages": []}, {}) == {"messages": []}
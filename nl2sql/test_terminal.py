@@ -0,0 +1,118 @@
+import asyncio
+import io
+import threading
+import time
+
+from terminal import Terminal
+
+
+class LockedBuffer(io.StringIO):
+    """记录每次 write 的输出流"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes: list[str] = []
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self.writes.append(text)
+        return super().write(text)
+
+
+def _spinner_frames(writes: list[str]) -> int:
+    return sum(1 for text in writes if text.startswith("\r") and text.strip())
+
+
+def test_spinner_starts_and_stops_without_waiting_for_a_frame():
+    out = LockedBuffer()
+    terminal = Terminal(out=out, spinner_interval=0.5)
+
+    start = time.perf_counter()
+    terminal.start_spinner("思考中")
+    started = time.perf_counter() - start
+    assert _spinner_frames(out.writes) == 1  # 第一帧立即绘制
+
+    start = time.perf_counter()
+    terminal.stop_spinner()
+    stopped = time.perf_counter() - start
+
+    assert started < 0.05
+    assert stopped < 0.05  # 不再等待 sleep / join
+    assert not terminal.spinning
+    assert out.writes[-1].startswith("\r") and not out.writes[-1].strip()
+
+
+def test_no_spinner_frame_after_text_output():
+    out = LockedBuffer()
+    terminal = Terminal(out=out, spinner_interval=0.01)
+
+    terminal.start_spinner("思考中")
+    time.sleep(0.05)
+    terminal.write("答案")
+    frames = _spinner_frames(out.writes)
+    time.sleep(0.05)
+
+    assert _spinner_frames(out.writes) == frames
+    assert out.writes[-1] == "答案"
+
+
+def test_concurrent_writers_do_not_interleave_with_spinner():
+    out = LockedBuffer()
+    terminal = Terminal(out=out, spinner_interval=0.001)
+
+    def writer(tag: str):
+        for i in range(200):
+            terminal.start_spinner("思考中")
+            terminal.write(f"<{tag}{i}>")
+
+    threads = [threading.Thread(target=writer, args=(tag,)) for tag in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    terminal.stop_spinner()
+
+    # 文本永远不会紧跟在一帧可见的 spinner 后面（中间一定有清除行）
+    for index, text in enumerate(out.writes):
+        if text.startswith("<") and index > 0:
+            previous = out.writes[index - 1]
+            assert not (previous.startswith("\r") and previous.strip())
+
+
+def test_prompt_clears_spinner_before_reading(monkeypatch):
+    out = LockedBuffer()
+    terminal = Terminal(out=out, spinner_interval=0.01)
+    monkeypatch.setattr("builtins.input", lambda prompt="": "a")
+
+    terminal.start_spinner("思考中")
+    answer = terminal.prompt("是否执行? ")
+
+    assert answer == "a"
+    assert not terminal.spinning
+    assert out.writes[-1] == "是否执行? "
+
+
+def test_async_spinner_starts_and_stops_immediately():
+    out = LockedBuffer()
+    terminal = Terminal(out=out, spinner_interval=0.5)
+
+    async def run():
+        start = time.perf_counter()
+        await terminal.astart_spinner("思考中")
+        started = time.perf_counter() - start
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        terminal.stop_spinner()
+        stopped = time.perf_counter() - start
+        # spinner 任务收到停止事件后立即退出，而不是等到下一帧
+        await asyncio.sleep(0.01)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return started, stopped, pending
+
+    started, stopped, pending = asyncio.run(run())
+
+    assert started < 0.05
+    assert stopped < 0.05
+    assert pending == []
+    assert _spinner_frames(out.writes) == 1